@@ -7,6 +7,9 @@ from mnelab import MainWindow, Model
 
 
 def main():
+    if sys.argv[1:2] == ["batch"]:  # headless mode
+        from mnelab.batch import main as batch
+        sys.exit(batch(sys.argv[2:]))
     mp.set_start_method("spawn")  # required for Linux/macOS
     matplotlib.use("Qt5Agg")
     app = QApplication(sys.argv)
@@ -16,8 +19,7 @@ def main():
     view = MainWindow(model)
     model.view = view
     if len(sys.argv) > 1:  # open files from command line arguments
-        for f in sys.argv[1:]:
-            model.load(f)
+        view.load_files(sys.argv[1:])
     view.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,145 @@
+"""Apply a pipeline exported from MNELAB to many files (without a GUI).
+
+Usage: python -m mnelab batch pipeline.json file1 file2 ... [options]
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import multiprocessing as mp
+from os import makedirs
+from os.path import join, split, splitext
+import sys
+
+import mne
+
+from .model import Model
+
+
+# model methods which can be part of a pipeline (in addition to "load" as
+# the first step, which contains arguments needed to load the data)
+PIPELINE_OPS = ["drop_channels", "set_channel_properties", "filter",
+                "set_reference", "find_events"]
+
+
+def read_pipeline(fname):
+    """Read pipeline from JSON file.
+
+    Parameters
+    ----------
+    fname : str
+        File name.
+
+    Returns
+    -------
+    steps : list of dict
+        Pipeline steps (each with keys "op" and "kwargs").
+    """
+    with open(fname) as f:
+        steps = json.load(f)["steps"]
+    for i, step in enumerate(steps):
+        if step["op"] == "load" and i == 0:
+            continue
+        if step["op"] not in PIPELINE_OPS:
+            raise ValueError(f"Unknown pipeline operation {step['op']}.")
+    return steps
+
+
+def run_pipeline(steps, fname, output_dir, fmt=".fif"):
+    """Apply pipeline to a file and export the result.
+
+    XDF files can only be processed if the pipeline starts with a "load" step
+    containing the stream ID (like pipelines exported from XDF data).
+
+    Parameters
+    ----------
+    steps : list of dict
+        Pipeline steps (see `read_pipeline`).
+    fname : str
+        File name.
+    output_dir : str
+        Directory where the result is saved.
+    fmt : str
+        Export format (file extension).
+
+    Returns
+    -------
+    fname : str
+        Name of the exported file.
+    """
+    mne.set_log_level("WARNING")
+    load = {}
+    if steps and steps[0]["op"] == "load":
+        load, steps = steps[0]["kwargs"], steps[1:]
+    if splitext(fname)[1].lower() == ".xdf" and "stream_id" not in load:
+        raise ValueError("XDF files can only be processed with pipelines "
+                         "exported from XDF data (which contain the stream "
+                         "ID).")
+    model = Model()  # no view
+    model.load(fname, **load)
+    for step in steps:
+        getattr(model, step["op"])(**step["kwargs"])
+    name = splitext(split(fname)[-1])[0]
+    out = join(output_dir, name + fmt)
+    model.export_raw(out)
+    if model.current["events"] is not None:
+        model.export_events(join(output_dir, name + "_events.csv"))
+    return out
+
+
+def run_batch(steps, fnames, output_dir, fmt=".fif", n_jobs=None):
+    """Apply pipeline to several files in parallel.
+
+    Each file is processed in a separate process.
+
+    Parameters
+    ----------
+    steps : list of dict
+        Pipeline steps (see `read_pipeline`).
+    fnames : list of str
+        File names.
+    output_dir : str
+        Directory where the results are saved.
+    fmt : str
+        Export format (file extension).
+    n_jobs : int | None
+        Number of processes (None uses the number of CPUs).
+
+    Returns
+    -------
+    errors : dict
+        Error messages of files which could not be processed.
+    """
+    makedirs(output_dir, exist_ok=True)
+    errors = {}
+    context = mp.get_context("spawn")
+    with ProcessPoolExecutor(n_jobs, mp_context=context) as executor:
+        futures = {executor.submit(run_pipeline, steps, fname, output_dir,
+                                   fmt): fname for fname in fnames}
+        for future in as_completed(futures):
+            fname = futures[future]
+            try:
+                print(f"{fname} -> {future.result()}")
+            except Exception as e:
+                errors[fname] = str(e)
+                print(f"{fname} failed: {e}", file=sys.stderr)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m mnelab batch",
+        description="Apply a pipeline exported from MNELAB to files.")
+    parser.add_argument("pipeline", help="pipeline file (JSON)")
+    parser.add_argument("files", nargs="+", help="files to process")
+    parser.add_argument("-o", "--output-dir", default=".",
+                        help="output directory (default: current directory)")
+    parser.add_argument("-f", "--format", default=".fif",
+                        choices=[".fif", ".set", ".edf", ".bdf"],
+                        help="export format (default: .fif)")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of processes (default: number of CPUs)")
+    args = parser.parse_args(argv)
+    steps = read_pipeline(args.pipeline)
+    errors = run_batch(steps, args.files, args.output_dir, args.format,
+                       args.jobs)
+    return 1 if errors else 0
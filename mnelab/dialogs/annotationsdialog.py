@@ -1,24 +1,182 @@
+import numpy as np
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout,
-                             QDialogButtonBox, QTableWidget, QTableWidgetItem,
-                             QAbstractItemView, QPushButton)
-from PyQt5.QtCore import Qt, pyqtSlot
+                             QDialogButtonBox, QTableView, QHeaderView,
+                             QAbstractItemView, QPushButton, QComboBox,
+                             QLabel, QInputDialog)
+from PyQt5.QtCore import Qt, pyqtSlot, QAbstractTableModel, QModelIndex
 
 
-class IntTableWidgetItem(QTableWidgetItem):
-    def __init__(self, value):
-        super().__init__(str(value))
+class AnnotationsModel(QAbstractTableModel):
+    """Table model of annotations backed by arrays.
 
-    def __lt__(self, other):
-        return int(self.data(Qt.EditRole)) < int(other.data(Qt.EditRole))
+    Onsets and durations are shown in samples. Annotations can be filtered by
+    description, in which case only the matching rows are shown. Sorting and
+    bulk edits operate on the arrays.
 
-    def setData(self, role, value):
-        try:
-            value = int(value)
-        except ValueError:
-            return
+    Parameters
+    ----------
+    onset, duration : array-like
+        Onsets and durations (in samples).
+    description : array-like
+        Descriptions.
+    """
+    columns = ["onset", "duration", "description"]
+    headers = ["Onset", "Duration", "Type"]
+
+    def __init__(self, onset, duration, description, parent=None):
+        super().__init__(parent)
+        self.onset = np.array(onset, dtype=np.int64).reshape(-1)
+        self.duration = np.array(duration, dtype=np.int64).reshape(-1)
+        # object array, so descriptions can be renamed to longer strings
+        self.description = np.array(description, dtype=object).reshape(-1)
+        self.filter = None  # description of shown annotations (None for all)
+        self._update_rows()
+
+    def _update_rows(self):
+        """Update indices of shown annotations."""
+        if self.filter is None:
+            self.rows = np.arange(len(self.onset))
+        else:
+            self.rows = np.flatnonzero(self.description == self.filter)
+
+    def _select(self, idx):
+        """Keep (or reorder) annotations."""
+        for name in self.columns:
+            setattr(self, name, getattr(self, name)[idx])
+        self._update_rows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.EditRole) and index.isValid():
+            values = getattr(self, self.columns[index.column()])
+            value = values[self.rows[index.row()]]
+            return value if index.column() == 2 else int(value)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return super().flags(index)
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole:
+            return False
+        if index.column() == 2:
+            value = str(value).strip()
+            if not value:
+                return False
+        else:
+            try:
+                value = int(value)
+            except ValueError:
+                return False
+            if value < 0:  # onset and duration must not be negative
+                return False
+        getattr(self, self.columns[index.column()])[self.rows[index.row()]] = \
+            value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort annotations by a column (stable, selected rows are kept)."""
+        idx = np.argsort(getattr(self, self.columns[column]), kind="stable")
+        if order == Qt.DescendingOrder:
+            idx = idx[::-1]
+        self.layoutAboutToBeChanged.emit()
+        old_rows = self.rows
+        self._select(idx)
+        positions = np.empty_like(idx)
+        positions[idx] = np.arange(len(idx))  # new index of each annotation
+        rows = np.searchsorted(self.rows, positions[old_rows])
+        old = self.persistentIndexList()
+        new = []
+        for index in old:
+            row = rows[index.row()]
+            if row < len(self.rows) and \
+                    self.rows[row] == positions[old_rows[index.row()]]:
+                new.append(self.index(int(row), index.column()))
+            else:  # description was edited and does not match the filter
+                new.append(QModelIndex())
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def set_filter(self, description=None):
+        """Show only annotations with a description (None shows all)."""
+        self.beginResetModel()
+        self.filter = description
+        self._update_rows()
+        self.endResetModel()
+
+    def descriptions(self):
+        """Return unique descriptions."""
+        return np.unique(self.description.astype(str)).tolist()
+
+    def insert_annotation(self, row, onset, duration, description):
+        """Insert an annotation before a row."""
+        if row < len(self.rows):
+            pos = self.rows[row]
         else:
-            if value >= 0:  # event position and type must not be negative
-                super().setData(role, str(value))
+            pos = len(self.onset)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.onset = np.insert(self.onset, pos, onset)
+        self.duration = np.insert(self.duration, pos, duration)
+        self.description = np.insert(self.description, pos, description)
+        self._update_rows()
+        self.endInsertRows()
+
+    def remove_annotations(self, rows):
+        """Remove annotations in rows."""
+        rows = np.unique(rows)
+        if len(rows) == 0:
+            return
+        # consecutive rows are removed at once
+        starts = rows[np.r_[True, np.diff(rows) > 1]]
+        stops = rows[np.r_[np.diff(rows) > 1, True]]
+        if len(starts) > 100:  # many separate blocks
+            self.beginResetModel()
+            self._select(np.delete(np.arange(len(self.onset)),
+                                   self.rows[rows]))
+            self.endResetModel()
+            return
+        for start, stop in zip(starts[::-1], stops[::-1]):
+            self.beginRemoveRows(QModelIndex(), int(start), int(stop))
+            self._select(np.delete(np.arange(len(self.onset)),
+                                   self.rows[start:stop + 1]))
+            self.endRemoveRows()
+
+    def remove_description(self, description):
+        """Remove all annotations with a description."""
+        self.beginResetModel()
+        self._select(self.description != description)
+        self.endResetModel()
+
+    def rename_description(self, old, new):
+        """Rename a description of all annotations."""
+        self.description[self.description == old] = new
+        if self.filter == old:
+            self.filter = new
+        self._columns_changed(2, 2)
+
+    def shift_onsets(self, offset):
+        """Shift onsets of all shown annotations (in samples)."""
+        self.onset[self.rows] += offset
+        self._columns_changed(0, 0)
+
+    def _columns_changed(self, first, last):
+        """Notify views that columns of all rows have changed."""
+        if len(self.rows) > 0:
+            self.dataChanged.emit(self.index(0, first),
+                                  self.index(len(self.rows) - 1, last))
 
 
 class AnnotationsDialog(QDialog):
@@ -26,22 +184,30 @@ class AnnotationsDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("Edit Annotations")
 
-        self.table = QTableWidget(len(onset), 3)
-
-        for row, annotation in enumerate(zip(onset, duration, description)):
-            self.table.setItem(row, 0, IntTableWidgetItem(annotation[0]))
-            self.table.setItem(row, 1, IntTableWidgetItem(annotation[1]))
-            self.table.setItem(row, 2, QTableWidgetItem(annotation[2]))
-
-        self.table.setHorizontalHeaderLabels(["Onset", "Duration", "Type"])
+        self.model = AnnotationsModel(onset, duration, description, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.verticalHeader().setVisible(False)
+        # fixed row heights (no need to measure rows)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.setShowGrid(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setSortingEnabled(True)
         self.table.sortByColumn(0, Qt.AscendingOrder)
 
         vbox = QVBoxLayout(self)
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("Type:"))
+        self.types = QComboBox()
+        hbox.addWidget(self.types, stretch=1)
+        self.rename_button = QPushButton("Rename...")
+        self.delete_button = QPushButton("Delete all")
+        self.shift_button = QPushButton("Shift...")
+        hbox.addWidget(self.rename_button)
+        hbox.addWidget(self.delete_button)
+        hbox.addWidget(self.shift_button)
+        vbox.addLayout(hbox)
         vbox.addWidget(self.table)
         hbox = QHBoxLayout()
         self.add_button = QPushButton("+")
@@ -55,36 +221,97 @@ class AnnotationsDialog(QDialog):
         vbox.addLayout(hbox)
         buttonbox.accepted.connect(self.accept)
         buttonbox.rejected.connect(self.reject)
-        self.table.itemSelectionChanged.connect(self.toggle_buttons)
+        self.update_types()
+        self.types.currentIndexChanged.connect(self.filter_type)
+        self.table.selectionModel().selectionChanged.connect(
+            self.toggle_buttons)
+        self.model.modelReset.connect(self.toggle_buttons)
+        self.model.dataChanged.connect(self.data_changed)
         self.remove_button.clicked.connect(self.remove_event)
         self.add_button.clicked.connect(self.add_event)
+        self.rename_button.clicked.connect(self.rename_type)
+        self.delete_button.clicked.connect(self.delete_type)
+        self.shift_button.clicked.connect(self.shift_onsets)
         self.toggle_buttons()
         self.resize(500, 500)
 
+    @property
+    def onset(self):
+        """Edited onsets (in samples)."""
+        return self.model.onset
+
+    @property
+    def duration(self):
+        """Edited durations (in samples)."""
+        return self.model.duration
+
+    @property
+    def description(self):
+        """Edited descriptions."""
+        return self.model.description.astype(str)
+
+    def update_types(self):
+        """Update list of descriptions (keeps the current one if possible)."""
+        self.types.blockSignals(True)
+        self.types.clear()
+        self.types.addItem("All types", None)
+        for description in self.model.descriptions():
+            self.types.addItem(description, description)
+        index = self.types.findData(self.model.filter)
+        self.types.setCurrentIndex(max(index, 0))
+        self.types.blockSignals(False)
+        if index < 0:  # filtered description does not exist anymore
+            self.model.set_filter(None)
+
+    @pyqtSlot()
+    def filter_type(self):
+        self.model.set_filter(self.types.currentData())
+        self.toggle_buttons()
+
+    @pyqtSlot(QModelIndex, QModelIndex)
+    def data_changed(self, first, last):
+        if last.column() == 2:  # descriptions changed
+            self.update_types()
+
     @pyqtSlot()
     def toggle_buttons(self):
-        """Toggle + and - buttons."""
-        if len(self.table.selectedItems()) == 3:  # one row (3 items) selected
-            self.add_button.setEnabled(True)
-            self.remove_button.setEnabled(True)
-        elif len(self.table.selectedItems()) > 3:  # more than one row selected
-            self.add_button.setEnabled(False)
-            self.remove_button.setEnabled(True)
-        else:  # no rows selected
-            self.add_button.setEnabled(False)
-            self.remove_button.setEnabled(False)
+        """Toggle + and - buttons and buttons for bulk edits."""
+        n_rows = len(self.table.selectionModel().selectedRows())
+        self.add_button.setEnabled(n_rows == 1)
+        self.remove_button.setEnabled(n_rows > 0)
+        filtered = self.model.filter is not None
+        self.rename_button.setEnabled(filtered)
+        self.delete_button.setEnabled(filtered)
+        self.shift_button.setEnabled(self.model.rowCount() > 0)
 
     def add_event(self):
-        current_row = self.table.selectedIndexes()[0].row()
-        pos = int(self.table.item(current_row, 0).data(Qt.DisplayRole))
-        self.table.setSortingEnabled(False)
-        self.table.insertRow(current_row)
-        self.table.setItem(current_row, 0, IntTableWidgetItem(pos))
-        self.table.setItem(current_row, 1, IntTableWidgetItem(0))
-        self.table.setItem(current_row, 2, QTableWidgetItem("New Annotation"))
-        self.table.setSortingEnabled(True)
+        current_row = self.table.selectionModel().selectedRows()[0].row()
+        pos = self.model.data(self.model.index(current_row, 0))
+        description = self.model.filter or "New Annotation"
+        self.model.insert_annotation(current_row, pos, 0, description)
 
     def remove_event(self):
-        rows = {index.row() for index in self.table.selectedIndexes()}
-        for row in sorted(rows, reverse=True):
-            self.table.removeRow(row)
+        rows = [index.row() for index in
+                self.table.selectionModel().selectedRows()]
+        self.model.remove_annotations(rows)
+
+    def rename_type(self):
+        old = self.model.filter
+        new, ok = QInputDialog.getText(self, "Rename type", "New type:",
+                                       text=old)
+        new = new.strip()
+        if ok and new and new != old:
+            self.model.rename_description(old, new)
+
+    def delete_type(self):
+        self.model.remove_description(self.model.filter)
+        self.update_types()
+
+    def shift_onsets(self):
+        # onsets must not become negative
+        minimum = -int(self.model.onset[self.model.rows].min())
+        offset, ok = QInputDialog.getInt(self, "Shift onsets",
+                                         "Offset (samples):", 0, minimum,
+                                         2 ** 31 - 1)
+        if ok and offset != 0:
+            self.model.shift_onsets(offset)
@@ -1,13 +1,54 @@
-from PyQt5.QtWidgets import QDialog, QLabel, QVBoxLayout, QDialogButtonBox
+from PyQt5.QtCore import pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import (QDialog, QLabel, QVBoxLayout, QDialogButtonBox,
+                             QProgressBar)
 
 
 class CalcDialog(QDialog):
-    def __init__(self, parent, title, message):
+    """Show a message while a calculation is running.
+
+    If the dialog shows progress, it stays open until the calculation is
+    done. Cancelling only emits the cancel_requested signal, and the dialog
+    is accepted once the calculation_finished signal is emitted. Signals can
+    be emitted from any thread.
+    """
+    cancel_requested = pyqtSignal()
+    progress_changed = pyqtSignal(float)
+    calculation_finished = pyqtSignal()
+
+    def __init__(self, parent, title, message, progress=False):
         super().__init__(parent)
         self.setWindowTitle(title)
         vbox = QVBoxLayout(self)
-        label = QLabel(message)
-        button = QDialogButtonBox(QDialogButtonBox.Cancel)
-        button.rejected.connect(self.close)
-        vbox.addWidget(label)
-        vbox.addWidget(button)
+        self.label = QLabel(message)
+        vbox.addWidget(self.label)
+        if progress:
+            self.progressbar = QProgressBar()
+            self.progressbar.setRange(0, 0)  # busy until progress is known
+            vbox.addWidget(self.progressbar)
+            self.progress_changed.connect(self._set_progress)
+            self.calculation_finished.connect(self.accept)
+        else:
+            self.progressbar = None
+        self.button = QDialogButtonBox(QDialogButtonBox.Cancel)
+        self.button.rejected.connect(self.close)
+        vbox.addWidget(self.button)
+
+    def reject(self):
+        if self.progressbar is None:
+            super().reject()
+        elif self.button.isEnabled():
+            self.label.setText("Cancelling...")
+            self.button.setEnabled(False)
+            self.cancel_requested.emit()
+
+    def closeEvent(self, event):
+        if self.progressbar is None:
+            super().closeEvent(event)
+        else:  # wait until calculation is done
+            event.ignore()
+            self.reject()
+
+    @pyqtSlot(float)
+    def _set_progress(self, value):
+        self.progressbar.setRange(0, 100)
+        self.progressbar.setValue(int(value * 100))
@@ -1,40 +1,113 @@
+import numpy as np
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout,
-                             QDialogButtonBox, QTableWidget, QTableWidgetItem,
+                             QDialogButtonBox, QTableView, QHeaderView,
                              QAbstractItemView, QPushButton)
-from PyQt5.QtCore import Qt, pyqtSlot
+from PyQt5.QtCore import Qt, pyqtSlot, QAbstractTableModel, QModelIndex
 
 
-class IntTableWidgetItem(QTableWidgetItem):
-    def __init__(self, value):
-        super().__init__(str(value))
+class EventsModel(QAbstractTableModel):
+    """Table model of events (position and type) backed by an array.
 
-    def __lt__(self, other):
-        return int(self.data(Qt.EditRole)) < int(other.data(Qt.EditRole))
+    Views only request data of visible rows, so the model does not create
+    any objects per event. Sorting and bulk edits operate on the array.
 
-    def setData(self, role, value):
+    Parameters
+    ----------
+    events : numpy.ndarray, shape (n_events, 3)
+        Events (the array is copied).
+    """
+    columns = [0, 2]  # event array columns shown in the table
+    headers = ["Position", "Type"]
+
+    def __init__(self, events, parent=None):
+        super().__init__(parent)
+        self.events = np.array(events, dtype=np.int64).reshape(-1, 3)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.events)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.EditRole) and index.isValid():
+            return int(self.events[index.row(), self.columns[index.column()]])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return super().flags(index)
+        return super().flags(index) | Qt.ItemIsEditable
+
+    def setData(self, index, value, role=Qt.EditRole):
         try:
             value = int(value)
         except ValueError:
+            return False
+        if role != Qt.EditRole or value < 0:  # must not be negative
+            return False
+        self.events[index.row(), self.columns[index.column()]] = value
+        self.dataChanged.emit(index, index)
+        return True
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Sort events by a column (stable, selected rows are kept)."""
+        idx = np.argsort(self.events[:, self.columns[column]], kind="stable")
+        if order == Qt.DescendingOrder:
+            idx = idx[::-1]
+        self.layoutAboutToBeChanged.emit()
+        self.events = self.events[idx]
+        rows = np.empty_like(idx)
+        rows[idx] = np.arange(len(idx))  # new row of each old row
+        old = self.persistentIndexList()
+        new = [self.index(int(rows[index.row()]), index.column())
+               for index in old]
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    def insert_event(self, row, pos, desc):
+        """Insert an event (position and type) before a row."""
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.events = np.insert(self.events, row, [pos, 0, desc], axis=0)
+        self.endInsertRows()
+
+    def remove_events(self, rows):
+        """Remove events in rows."""
+        rows = np.unique(rows)
+        if len(rows) == 0:
+            return
+        # consecutive rows are removed at once
+        starts = rows[np.r_[True, np.diff(rows) > 1]]
+        stops = rows[np.r_[np.diff(rows) > 1, True]]
+        if len(starts) > 100:  # many separate blocks
+            self.beginResetModel()
+            self.events = np.delete(self.events, rows, axis=0)
+            self.endResetModel()
             return
-        else:
-            if value >= 0:  # event position and type must not be negative
-                super().setData(role, str(value))
+        for start, stop in zip(starts[::-1], stops[::-1]):
+            self.beginRemoveRows(QModelIndex(), int(start), int(stop))
+            self.events = np.delete(self.events, np.s_[start:stop + 1],
+                                    axis=0)
+            self.endRemoveRows()
 
 
 class EventsDialog(QDialog):
-    def __init__(self, parent, pos, desc):
+    def __init__(self, parent, events):
         super().__init__(parent)
         self.setWindowTitle("Edit Events")
 
-        self.table = QTableWidget(len(pos), 2)
-
-        for row, (p, d) in enumerate(zip(pos, desc)):
-            self.table.setItem(row, 0, IntTableWidgetItem(p))
-            self.table.setItem(row, 1, IntTableWidgetItem(d))
-
-        self.table.setHorizontalHeaderLabels(["Position", "Type"])
+        self.model = EventsModel(events, self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.horizontalHeader().setStretchLastSection(True)
         self.table.verticalHeader().setVisible(False)
+        # fixed row heights (no need to measure rows)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         self.table.setShowGrid(False)
         self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         self.table.setSortingEnabled(True)
@@ -54,35 +127,31 @@ class EventsDialog(QDialog):
         vbox.addLayout(hbox)
         buttonbox.accepted.connect(self.accept)
         buttonbox.rejected.connect(self.reject)
-        self.table.itemSelectionChanged.connect(self.toggle_buttons)
+        self.table.selectionModel().selectionChanged.connect(
+            self.toggle_buttons)
         self.remove_button.clicked.connect(self.remove_event)
         self.add_button.clicked.connect(self.add_event)
         self.toggle_buttons()
         self.resize(300, 500)
 
+    @property
+    def events(self):
+        """Edited events."""
+        return self.model.events
+
     @pyqtSlot()
     def toggle_buttons(self):
         """Toggle + and - buttons."""
-        if len(self.table.selectedItems()) == 2:  # one row (2 items) selected
-            self.add_button.setEnabled(True)
-            self.remove_button.setEnabled(True)
-        elif len(self.table.selectedItems()) > 2:  # more than one row selected
-            self.add_button.setEnabled(False)
-            self.remove_button.setEnabled(True)
-        else:  # no rows selected
-            self.add_button.setEnabled(False)
-            self.remove_button.setEnabled(False)
+        n_rows = len(self.table.selectionModel().selectedRows())
+        self.add_button.setEnabled(n_rows == 1)
+        self.remove_button.setEnabled(n_rows > 0)
 
     def add_event(self):
-        current_row = self.table.selectedIndexes()[0].row()
-        pos = int(self.table.item(current_row, 0).data(Qt.DisplayRole))
-        self.table.setSortingEnabled(False)
-        self.table.insertRow(current_row)
-        self.table.setItem(current_row, 0, IntTableWidgetItem(pos))
-        self.table.setItem(current_row, 1, IntTableWidgetItem(0))
-        self.table.setSortingEnabled(True)
+        current_row = self.table.selectionModel().selectedRows()[0].row()
+        pos = self.model.events[current_row, 0]
+        self.model.insert_event(current_row, pos, 0)
 
     def remove_event(self):
-        rows = {index.row() for index in self.table.selectedIndexes()}
-        for row in sorted(rows, reverse=True):
-            self.table.removeRow(row)
+        rows = [index.row() for index in
+                self.table.selectionModel().selectedRows()]
+        self.model.remove_events(rows)
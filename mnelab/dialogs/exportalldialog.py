@@ -0,0 +1,73 @@
+from os import cpu_count
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QGridLayout, QLabel,
+                             QListWidget, QListWidgetItem, QComboBox,
+                             QLineEdit, QPushButton, QSpinBox, QFileDialog,
+                             QDialogButtonBox)
+
+
+class ExportAllDialog(QDialog):
+    def __init__(self, parent, names, formats):
+        super().__init__(parent)
+        self.setWindowTitle("Export all")
+        vbox = QVBoxLayout(self)
+        vbox.addWidget(QLabel("Data sets:"))
+        self.datasets = QListWidget()
+        for name in names:
+            item = QListWidgetItem(name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.datasets.addItem(item)
+        vbox.addWidget(self.datasets)
+        grid = QGridLayout()
+        grid.addWidget(QLabel("Format:"), 0, 0)
+        self.formats = QComboBox()
+        self.formats.addItems(formats)
+        grid.addWidget(self.formats, 0, 1, 1, 2)
+        grid.addWidget(QLabel("Directory:"), 1, 0)
+        self.directoryedit = QLineEdit()
+        grid.addWidget(self.directoryedit, 1, 1)
+        browse = QPushButton("Browse...")
+        browse.clicked.connect(self.browse)
+        grid.addWidget(browse, 1, 2)
+        grid.addWidget(QLabel("Parallel jobs:"), 2, 0)
+        self.n_jobs = QSpinBox()
+        self.n_jobs.setMinimum(1)
+        self.n_jobs.setMaximum(cpu_count())
+        self.n_jobs.setValue(min(cpu_count(), len(names)))
+        grid.addWidget(self.n_jobs, 2, 1, 1, 2)
+        vbox.addLayout(grid)
+        self.buttonbox = QDialogButtonBox(QDialogButtonBox.Ok |
+                                          QDialogButtonBox.Cancel)
+        vbox.addWidget(self.buttonbox)
+        self.buttonbox.accepted.connect(self.accept)
+        self.buttonbox.rejected.connect(self.reject)
+        self.datasets.itemChanged.connect(self.toggle_buttons)
+        self.directoryedit.textChanged.connect(self.toggle_buttons)
+        self.toggle_buttons()
+
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(self, "Export directory",
+                                                     self.directory)
+        if directory:
+            self.directoryedit.setText(directory)
+
+    def toggle_buttons(self):
+        """Toggle OK button (at least one data set and a directory needed)."""
+        ok = bool(self.selected) and bool(self.directory)
+        self.buttonbox.button(QDialogButtonBox.Ok).setEnabled(ok)
+
+    @property
+    def selected(self):
+        """Indices of selected data sets."""
+        return [i for i in range(self.datasets.count())
+                if self.datasets.item(i).checkState() == Qt.Checked]
+
+    @property
+    def directory(self):
+        return self.directoryedit.text().strip()
+
+    @property
+    def ext(self):
+        return self.formats.currentText()
@@ -1,5 +1,9 @@
+from os import cpu_count
+
+from PyQt5.QtCore import pyqtSlot
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QGridLayout, QLabel,
-                             QLineEdit, QDialogButtonBox)
+                             QLineEdit, QDialogButtonBox, QSpinBox,
+                             QComboBox)
 
 
 class FilterDialog(QDialog):
@@ -14,6 +18,25 @@ class FilterDialog(QDialog):
         grid.addWidget(QLabel("High cutoff frequency (Hz):"), 1, 0)
         self.highedit = QLineEdit()
         grid.addWidget(self.highedit, 1, 1)
+        grid.addWidget(QLabel("Method:"), 2, 0)
+        self.methods = {"FIR": "fir", "IIR (Butterworth)": "iir"}
+        self.methodedit = QComboBox()
+        self.methodedit.addItems(self.methods.keys())
+        self.methodedit.currentIndexChanged.connect(self.toggle_order)
+        grid.addWidget(self.methodedit, 2, 1)
+        grid.addWidget(QLabel("Order:"), 3, 0)
+        self.orderedit = QSpinBox()
+        self.orderedit.setMinimum(1)
+        self.orderedit.setMaximum(16)
+        self.orderedit.setValue(4)
+        self.orderedit.setEnabled(False)
+        grid.addWidget(self.orderedit, 3, 1)
+        grid.addWidget(QLabel("Workers:"), 4, 0)
+        self.n_jobs = QSpinBox()
+        self.n_jobs.setMinimum(1)
+        self.n_jobs.setMaximum(cpu_count())
+        self.n_jobs.setValue(cpu_count())
+        grid.addWidget(self.n_jobs, 4, 1)
         vbox.addLayout(grid)
         buttonbox = QDialogButtonBox(QDialogButtonBox.Ok |
                                      QDialogButtonBox.Cancel)
@@ -22,6 +45,19 @@ class FilterDialog(QDialog):
         buttonbox.rejected.connect(self.reject)
         vbox.setSizeConstraint(QVBoxLayout.SetFixedSize)
 
+    @pyqtSlot()
+    def toggle_order(self):
+        """Enable filter order only for IIR filters."""
+        self.orderedit.setEnabled(self.method == "iir")
+
+    @property
+    def method(self):
+        return self.methods[self.methodedit.currentText()]
+
+    @property
+    def order(self):
+        return self.orderedit.value()
+
     @property
     def low(self):
         low = self.lowedit.text()
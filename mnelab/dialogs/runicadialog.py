@@ -51,6 +51,14 @@ class RunICADialog(QDialog):
         self.exclude_bad_segments = QCheckBox()
         self.exclude_bad_segments.setChecked(True)
         grid.addWidget(self.exclude_bad_segments)
+        grid.addWidget(QLabel("Random seed:"), 5, 0)
+        self.random_state = QSpinBox()
+        self.random_state.setMinimum(-1)  # -1 means no seed
+        self.random_state.setMaximum(2 ** 31 - 1)
+        self.random_state.setSpecialValueText("None")
+        self.random_state.setValue(-1)
+        self.random_state.setAlignment(Qt.AlignRight)
+        grid.addWidget(self.random_state, 5, 1)
         vbox.addLayout(grid)
         buttonbox = QDialogButtonBox(QDialogButtonBox.Ok |
                                      QDialogButtonBox.Cancel)
@@ -59,6 +67,12 @@ class RunICADialog(QDialog):
         buttonbox.rejected.connect(self.reject)
         vbox.setSizeConstraint(QVBoxLayout.SetFixedSize)
 
+    @property
+    def seed(self):
+        """Random seed (None if no seed has been set)."""
+        value = self.random_state.value()
+        return None if value < 0 else value
+
     @pyqtSlot()
     def toggle_options(self):
         """Toggle extended options.
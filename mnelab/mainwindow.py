@@ -1,15 +1,17 @@
-import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+import threading
 from sys import version_info
-from os.path import split, splitext
-import numpy as np
+from os import cpu_count
+from os.path import exists, join, split, splitext
 
 import mne
-from PyQt5.QtCore import (pyqtSlot, QStringListModel, QModelIndex, QSettings,
-                          QEvent, Qt, QObject)
+from PyQt5.QtCore import (pyqtSlot, pyqtSignal, QStringListModel, QModelIndex,
+                          QSettings, QEvent, Qt, QObject, QMetaObject,
+                          QStandardPaths, QTimer)
 from PyQt5.QtGui import QKeySequence, QDropEvent
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QFileDialog, QSplitter,
                              QMessageBox, QListView, QAction, QLabel, QFrame,
-                             QStatusBar, QToolBar)
+                             QStatusBar, QToolBar, QInputDialog)
 from mne.io.pick import channel_type
 
 from .dialogs.annotationsdialog import AnnotationsDialog
@@ -21,12 +23,15 @@ from .dialogs.montagedialog import MontageDialog
 from .dialogs.channelpropertiesdialog import ChannelPropertiesDialog
 from .dialogs.runicadialog import RunICADialog
 from .dialogs.calcdialog import CalcDialog
+from .dialogs.exportalldialog import ExportAllDialog
 from .dialogs.eventsdialog import EventsDialog
 from .dialogs.xdfstreamsdialog import XDFStreamsDialog
 from .widgets.infowidget import InfoWidget
+from .widgets.envelopeplot import EnvelopePlot
 from .model import (SUPPORTED_FORMATS, SUPPORTED_EXPORT_FORMATS,
                     LabelsNotFoundError, InvalidAnnotationsError)
-from .utils import have, parse_xdf, parse_chunks
+from .utils import (have, read_streams, Task, TaskCancelledError, ICAWorker,
+                    ResultCache, Envelope, estimate_scalings)
 
 
 __version__ = "0.1.0"
@@ -53,10 +58,24 @@ def read_settings():
     if statusbar is None:  # default is True
         statusbar = True
 
+    lazy = settings.value("lazy")
+    if lazy is None:  # default is False
+        lazy = False
+
+    memory_budget = settings.value("memory_budget")
+    if memory_budget is None:  # default is 0 (unlimited)
+        memory_budget = 0
+
+    cache_size = settings.value("cache_size")
+    if cache_size is None:  # default is 1024 MB
+        cache_size = 1024
+
     geometry = settings.value("geometry")
     state = settings.value("state")
 
-    return {"recent": recent, "statusbar": statusbar, "geometry": geometry,
+    return {"recent": recent, "statusbar": statusbar, "lazy": lazy,
+            "memory_budget": int(memory_budget),
+            "cache_size": int(cache_size), "geometry": geometry,
             "state": state}
 
 
@@ -69,6 +88,8 @@ def write_settings(**kwargs):
 
 class MainWindow(QMainWindow):
     """MNELAB main window."""
+    loading_changed = pyqtSignal()  # emitted from file loading threads
+
     def __init__(self, model):
         """Initialize MNELAB main window.
 
@@ -81,6 +102,12 @@ class MainWindow(QMainWindow):
         super().__init__()
 
         self.model = model  # data model
+        self.executor = ThreadPoolExecutor(max_workers=1)  # background tasks
+        self.task = None  # task which is currently running
+        self.ica_worker = ICAWorker()  # started when ICA is used first
+        self.loader = ThreadPoolExecutor(max_workers=cpu_count())
+        self.loading = []  # files which are loaded by self.loader
+        self.loading_changed.connect(self._update_loading)
         self.setWindowTitle("MNELAB")
 
         # restore settings
@@ -106,6 +133,15 @@ class MainWindow(QMainWindow):
         self.recent_menu.triggered.connect(self._load_recent)
         if not self.recent:
             self.recent_menu.setEnabled(False)
+        self.actions["lazy"] = file_menu.addAction("Load data lazily",
+                                                   self._toggle_lazy)
+        self.actions["lazy"].setCheckable(True)
+        self.actions["memory_budget"] = file_menu.addAction(
+            "Memory budget...",
+            self.set_memory_budget)
+        self.actions["cache_size"] = file_menu.addAction(
+            "Result cache...",
+            self.set_cache_size)
         self.actions["close_file"] = file_menu.addAction(
             "&Close",
             self.model.remove_data,
@@ -151,11 +187,22 @@ class MainWindow(QMainWindow):
             "Export ICA...",
             lambda: self.export_file(model.export_ica,
                                      "Export ICA", "*.fif *.fif.gz"))
+        self.actions["export_pipeline"] = file_menu.addAction(
+            "Export pipeline...",
+            lambda: self.export_file(model.export_pipeline,
+                                     "Export pipeline", "*.json"))
+        self.actions["export_all"] = file_menu.addAction(
+            "Export all...", self.export_all)
         file_menu.addSeparator()
         self.actions["quit"] = file_menu.addAction("&Quit", self.close,
                                                    QKeySequence.Quit)
 
         edit_menu = self.menuBar().addMenu("&Edit")
+        self.actions["undo"] = edit_menu.addAction("&Undo", self.model.undo,
+                                                   QKeySequence.Undo)
+        self.actions["redo"] = edit_menu.addAction("&Redo", self.model.redo,
+                                                   QKeySequence.Redo)
+        edit_menu.addSeparator()
         self.actions["pick_chans"] = edit_menu.addAction(
             "Pick &channels...",
             self.pick_channels)
@@ -177,6 +224,8 @@ class MainWindow(QMainWindow):
         plot_menu = self.menuBar().addMenu("&Plot")
         self.actions["plot_raw"] = plot_menu.addAction("&Raw data",
                                                        self.plot_raw)
+        self.actions["plot_raw_envelope"] = plot_menu.addAction(
+            "Raw data (&envelope)", self.plot_raw_envelope)
         self.actions["plot_psd"] = plot_menu.addAction(
             "&Power spectral density...", self.plot_psd)
         self.actions["plot_montage"] = plot_menu.addAction("Current &montage",
@@ -207,7 +256,8 @@ class MainWindow(QMainWindow):
 
         # actions that are always enabled
         self.always_enabled = ["open_file", "about", "about_qt", "quit",
-                               "statusbar"]
+                               "statusbar", "lazy", "memory_budget",
+                               "cache_size"]
 
         # set up data model for sidebar (list of open files)
         self.names = QStringListModel()
@@ -233,13 +283,26 @@ class MainWindow(QMainWindow):
         else:
             self.statusBar().hide()
             self.actions["statusbar"].setChecked(False)
+        self.model.lazy = settings["lazy"] in (True, "true")
+        self.actions["lazy"].setChecked(self.model.lazy)
+        self.memory_budget = settings["memory_budget"]  # in MB, 0 = unlimited
+        if self.memory_budget:
+            self.model.memory_budget = self.memory_budget * 1024 ** 2
+        self.cache_size = settings["cache_size"]  # in MB, 0 = disabled
+        self._set_cache()
 
         self.setAcceptDrops(True)
         self.data_changed()
 
+    @pyqtSlot()
     def data_changed(self):
+        if threading.current_thread() is not threading.main_thread():
+            # called from a background task, so update in the GUI thread
+            QMetaObject.invokeMethod(self, "data_changed", Qt.QueuedConnection)
+            return
+
         # update sidebar
-        self.names.setStringList(self.model.names)
+        self._update_sidebar()
         self.sidebar.setCurrentIndex(self.names.index(self.model.index))
 
         # update info widget
@@ -251,7 +314,11 @@ class MainWindow(QMainWindow):
         # update status bar
         if self.model.data:
             mb = self.model.nbytes / 1024 ** 2
-            self.status_label.setText("Total Memory: {:.2f} MB".format(mb))
+            text = "Total Memory: {:.2f} MB".format(mb)
+            spilled = self.model.spilled_nbytes / 1024 ** 2
+            if spilled:
+                text += " ({:.2f} MB spilled to disk)".format(spilled)
+            self.status_label.setText(text)
         else:
             self.status_label.clear()
 
@@ -277,10 +344,17 @@ class MainWindow(QMainWindow):
             self.actions["plot_montage"].setEnabled(enabled and montage)
             ica = bool(self.model.current["ica"])
             self.actions["export_ica"].setEnabled(enabled and ica)
+            pipeline = any(step["op"] != "load"
+                           for step in self.model.current["pipeline"])
+            self.actions["export_pipeline"].setEnabled(enabled and pipeline)
             self.actions["plot_ica_components"].setEnabled(enabled and ica and
                                                            montage)
             self.actions["plot_ica_sources"].setEnabled(enabled and ica)
             self.actions["events"].setEnabled(enabled and events)
+            undo = bool(self.model.current["undo"])
+            self.actions["undo"].setEnabled(enabled and undo)
+            redo = bool(self.model.current["redo"])
+            self.actions["redo"].setEnabled(enabled and redo)
 
         # add to recent files
         if len(self.model) > 0:
@@ -298,7 +372,9 @@ class MainWindow(QMainWindow):
                 raise ValueError(f"File format {ftype} is not supported.")
 
             if ext.lower() == ".xdf":
-                streams = parse_chunks(parse_xdf(fname))
+                # stream headers can follow Boundary chunks anywhere in the
+                # file, so all chunks are scanned (the index is cached)
+                streams = read_streams(fname, self.model.xdf_index(fname))
                 rows, disabled = [], []
                 for idx, s in enumerate(streams):
                     rows.append([s["stream_id"], s["name"], s["type"],
@@ -317,9 +393,42 @@ class MainWindow(QMainWindow):
                 if dialog.exec_():
                     row = dialog.view.selectionModel().selectedRows()[0].row()
                     stream_id = dialog.model.data(dialog.model.index(row, 0))
-                    self.model.load(fname, stream_id=stream_id)
+                    self.run_task("Loading", f"Loading {name + ext}...",
+                                  self.model.load, fname, stream_id=stream_id)
             else:  # all other file formats
-                self.model.load(fname)
+                self.run_task("Loading", f"Loading {name + ext}...",
+                              self.model.load, fname)
+
+    def load_files(self, fnames):
+        """Load several files in parallel.
+
+        Files are read in background threads, and each data set is inserted
+        as soon as it (and all files before it) have been read. The sidebar
+        lists files which are still being loaded.
+
+        Parameters
+        ----------
+        fnames : list of str
+            File names.
+        """
+        for fname in fnames:
+            if splitext(fname)[1].lower() == ".xdf":  # requires stream choice
+                self.open_raw(fname=fname)
+                continue
+            entry = {"name": splitext(split(fname)[-1])[0],
+                     "fname": fname, "status": "queued"}
+            entry["future"] = self.loader.submit(self._read_file, entry,
+                                                 fname)
+            entry["future"].add_done_callback(
+                lambda _: self.loading_changed.emit())
+            self.loading.append(entry)
+        self._update_sidebar()
+
+    def _read_file(self, entry, fname):
+        """Read file (runs in a background thread)."""
+        entry["status"] = "loading"
+        self.loading_changed.emit()
+        return self.model.read_data(fname)
 
     def open_file(self, f, text, ffilter):
         """Open file."""
@@ -331,7 +440,74 @@ class MainWindow(QMainWindow):
         """Export to file."""
         fname = QFileDialog.getSaveFileName(self, text, filter=ffilter)[0]
         if fname:
-            f(fname)
+            self.run_task(text, f"{text}...", f, fname)
+
+    def export_all(self):
+        """Export several data sets to a directory in parallel."""
+        names = [dataset["name"] for dataset in self.model.data]
+        formats = SUPPORTED_EXPORT_FORMATS.replace("*", "").split()
+        dialog = ExportAllDialog(self, names, formats)
+        if not dialog.exec_():
+            return
+        fnames = self.model.export_fnames(dialog.selected, dialog.directory,
+                                          dialog.ext)
+        existing = [fname for fname in fnames.values() if exists(fname)]
+        if existing:
+            msg = QMessageBox.question(self, "Overwrite existing files",
+                                       f"{len(existing)} file(s) already "
+                                       "exist. Overwrite?")
+            if msg == QMessageBox.No:
+                return
+        errors = self.run_task("Export all",
+                               f"Exporting {len(fnames)} data sets...",
+                               self.model.export_data, dialog.selected,
+                               dialog.directory, dialog.ext,
+                               dialog.n_jobs.value())
+        if errors:
+            QMessageBox.critical(self, "Export failed",
+                                 "\n".join(f"{fname}: {error}" for
+                                           fname, error in errors.items()))
+
+    def run_task(self, title, message, f, *args, **kwargs):
+        """Run function in a background thread.
+
+        A dialog shows the progress until the function has finished. The GUI
+        remains responsive in the meantime, and the function can be cancelled
+        (if it reports its progress, see mnelab.utils.report_progress).
+
+        Parameters
+        ----------
+        title : str
+            Dialog title.
+        message : str
+            Message shown in the dialog.
+        f : callable
+            Function to run.
+        args, kwargs
+            Arguments passed to the function.
+
+        Returns
+        -------
+        result
+            Return value of the function (None if it has been cancelled).
+        """
+        calc = CalcDialog(self, title, message, progress=True)
+        task = Task(self.executor, f, *args, **kwargs)
+        self.task = task
+        task.callbacks.append(calc.progress_changed.emit)
+        task.future.add_done_callback(
+            lambda _: calc.calculation_finished.emit())
+        calc.cancel_requested.connect(task.cancel)
+        if not task.done():
+            calc.exec_()
+        try:
+            return task.result()
+        except (TaskCancelledError, CancelledError):
+            return None
+        finally:
+            self.task = None
+            # insert data sets loaded in the meantime (after returning)
+            QTimer.singleShot(0, self._update_loading)
 
     def import_file(self, f, text, ffilter):
         """Import file."""
@@ -406,44 +582,29 @@ class MainWindow(QMainWindow):
 
     def edit_annotations(self):
         fs = self.model.current["raw"].info["sfreq"]
-        pos = self.model.current["raw"].annotations.onset
-        pos = (pos * fs).astype(int).tolist()
-        dur = self.model.current["raw"].annotations.duration
-        dur = (dur * fs).astype(int).tolist()
-        desc = self.model.current["raw"].annotations.description.tolist()
-        dialog = AnnotationsDialog(self, pos, dur, desc)
+        annotations = self.model.current["raw"].annotations
+        pos = (annotations.onset * fs).astype(int)
+        dur = (annotations.duration * fs).astype(int)
+        dialog = AnnotationsDialog(self, pos, dur, annotations.description)
         if dialog.exec_():
-            rows = dialog.table.rowCount()
-            onset, duration, description = [], [], []
-            for i in range(rows):
-                data = dialog.table.item(i, 0).data(Qt.DisplayRole)
-                onset.append(float(data) / fs)
-                data = dialog.table.item(i, 1).data(Qt.DisplayRole)
-                duration.append(float(data) / fs)
-                data = dialog.table.item(i, 2).data(Qt.DisplayRole)
-                description.append(data)
-            self.model.set_annotations(onset, duration, description)
+            self.model.set_annotations(dialog.onset / fs,
+                                       dialog.duration / fs,
+                                       dialog.description)
 
     def edit_events(self):
-        pos = self.model.current["events"][:, 0].tolist()
-        desc = self.model.current["events"][:, 2].tolist()
-        dialog = EventsDialog(self, pos, desc)
+        dialog = EventsDialog(self, self.model.current["events"])
         if dialog.exec_():
-            rows = dialog.table.rowCount()
-            events = np.zeros((rows, 3), dtype=int)
-            for i in range(rows):
-                pos = int(dialog.table.item(i, 0).data(Qt.DisplayRole))
-                desc = int(dialog.table.item(i, 1).data(Qt.DisplayRole))
-                events[i] = pos, 0, desc
-            self.model.set_events(events)
+            self.model.set_events(dialog.events)
 
     def plot_raw(self):
         """Plot raw data."""
         events = self.model.current["events"]
-        nchan = self.model.current["raw"].info["nchan"]
-        fig = self.model.current["raw"].plot(events=events, n_channels=nchan,
-                                             title=self.model.current["name"],
-                                             scalings="auto", show=False)
+        raw = self.model.current["raw"]
+        nchan = raw.info["nchan"]
+        # "auto" scalings would read all data (estimated from a sample here)
+        fig = raw.plot(events=events, n_channels=nchan,
+                       title=self.model.current["name"],
+                       scalings=estimate_scalings(raw), show=False)
         self.model.history.append("raw.plot(n_channels={})".format(nchan))
         win = fig.canvas.manager.window
         win.setWindowTitle("Raw data")
@@ -458,6 +619,19 @@ class MainWindow(QMainWindow):
 
         fig.show()
 
+    def plot_raw_envelope(self):
+        """Plot raw data as min/max envelopes (fast for long recordings)."""
+        raw = self.model.current["raw"]
+        # the envelope is computed for each window when it is first shown
+        plot = EnvelopePlot(raw, Envelope(raw), estimate_scalings(raw),
+                            events=self.model.current["events"],
+                            annotations=self.model.annotation_index(),
+                            parent=self)
+        plot.setWindowFlags(Qt.Window)
+        plot.setAttribute(Qt.WA_DeleteOnClose)
+        plot.setWindowTitle("Raw data")
+        plot.show()
+
     def plot_psd(self):
         """Plot power spectral density (PSD)."""
         fig = self.model.current["raw"].plot_psd(average=False,
@@ -488,9 +662,9 @@ class MainWindow(QMainWindow):
         """Run ICA calculation."""
         dialog = RunICADialog(self, self.model.current["raw"].info["nchan"],
                               have["picard"], have["sklearn"])
+        self.ica_worker.start()  # start worker while dialog is shown
 
         if dialog.exec_():
-            calc = CalcDialog(self, "Calculating ICA", "Calculating ICA.")
             method = dialog.method.currentText()
             exclude_bad_segments = dialog.exclude_bad_segments.isChecked()
             fit_params = {}
@@ -498,25 +672,20 @@ class MainWindow(QMainWindow):
                 fit_params["extended"] = dialog.extended.isChecked()
             if not dialog.ortho.isHidden():
                 fit_params["ortho"] = dialog.ortho.isChecked()
-            ica = mne.preprocessing.ICA(method=dialog.methods[method],
-                                        fit_params=fit_params)
-            pool = mp.Pool(1)
-            kwds = {"reject_by_annotation": exclude_bad_segments}
-            res = pool.apply_async(func=ica.fit,
-                                   args=(self.model.current["raw"],),
-                                   kwds=kwds, callback=lambda x: calc.accept())
-            if not calc.exec_():
-                pool.terminate()
-            else:
-                self.model.current["ica"] = res.get(timeout=1)
-                self.data_changed()
+            self.run_task("Calculating ICA", "Calculating ICA.",
+                          self.model.run_ica, dialog.methods[method],
+                          fit_params, exclude_bad_segments,
+                          fit=self.ica_worker.fit,
+                          random_state=dialog.seed)
 
     def filter_data(self):
         """Filter data."""
         dialog = FilterDialog(self)
         if dialog.exec_():
-            self.auto_duplicate()
-            self.model.filter(dialog.low, dialog.high)
+            self.run_task_duplicated("Filtering", "Filtering data...",
+                                     self.model.filter, dialog.low,
+                                     dialog.high, dialog.n_jobs.value(),
+                                     dialog.method, dialog.order)
 
     def find_events(self):
         info = self.model.current["raw"].info
@@ -535,23 +704,58 @@ class MainWindow(QMainWindow):
             uint_cast = dialog.uint_cast.isChecked()
             min_dur = dialog.minduredit.value()
             shortest_event = dialog.shortesteventedit.value()
-            self.model.find_events(stim_channel=stim_channel,
-                                   consecutive=consecutive,
-                                   initial_event=initial_event,
-                                   uint_cast=uint_cast,
-                                   min_duration=min_dur,
-                                   shortest_event=shortest_event)
+            self.run_task("Finding events", "Finding events...",
+                          self.model.find_events, stim_channel=stim_channel,
+                          consecutive=consecutive, initial_event=initial_event,
+                          uint_cast=uint_cast, min_duration=min_dur,
+                          shortest_event=shortest_event)
 
     def set_reference(self):
         """Set reference."""
         dialog = ReferenceDialog(self)
         if dialog.exec_():
-            self.auto_duplicate()
             if dialog.average.isChecked():
-                self.model.set_reference("average")
+                ref = "average"
             else:
                 ref = [c.strip() for c in dialog.channellist.text().split(",")]
-                self.model.set_reference(ref)
+            self.run_task_duplicated("Setting reference",
+                                     "Setting reference...",
+                                     self.model.set_reference, ref)
+
+    def set_memory_budget(self):
+        """Set maximum size of data kept in memory."""
+        value, ok = QInputDialog.getInt(self, "Memory budget",
+                                        "Memory budget in MB (0 = unlimited):",
+                                        self.memory_budget, 0, 2 ** 31 - 1)
+        if ok:
+            self.memory_budget = value
+            write_settings(memory_budget=value)
+            self.model.memory_budget = value * 1024 ** 2 if value else None
+            self.model.manage_memory()
+            self.data_changed()
+
+    def set_cache_size(self):
+        """Set maximum size of the result cache."""
+        value, ok = QInputDialog.getInt(self, "Result cache",
+                                        "Size of cached results of filtering, "
+                                        "re-referencing, and ICA\nin MB (0 = "
+                                        "disabled):", self.cache_size, 0,
+                                        2 ** 31 - 1)
+        if ok:
+            self.cache_size = value
+            write_settings(cache_size=value)
+            self._set_cache()
+
+    def _set_cache(self):
+        """Enable or disable the result cache of the model."""
+        if self.cache_size:
+            directory = join(QStandardPaths.writableLocation(
+                QStandardPaths.CacheLocation), "results")
+            self.model.cache = ResultCache(directory,
+                                           self.cache_size * 1024 ** 2)
+            self.model.cache.evict()
+        else:
+            self.model.cache = None
 
     def show_about(self):
         """Show About dialog."""
@@ -581,15 +785,40 @@ class MainWindow(QMainWindow):
         QMessageBox.aboutQt(self, "About Qt")
 
     def auto_duplicate(self):
-        # if current data is stored in a file create a new data set
+        if self.duplicate_needed():
+            self.model.duplicate_data()
+
+    def duplicate_needed(self):
+        """Check if the current data set should be duplicated before changes.
+
+        Data sets stored in a file are always duplicated, otherwise the user
+        is asked whether the data set should be overwritten.
+        """
         if self.model.current["fname"]:
+            return True
+        msg = QMessageBox.question(self, "Overwrite existing data set",
+                                   "Overwrite existing data set?")
+        return msg == QMessageBox.No
+
+    def run_task_duplicated(self, title, message, f, *args, **kwargs):
+        """Run function which changes the current data set in the background.
+
+        Like `run_task`, but the current data set is duplicated first if
+        necessary (see `duplicate_needed`). The duplicate is removed again if
+        the function is cancelled or fails.
+        """
+        if not self.duplicate_needed():
+            return self.run_task(title, message, f, *args, **kwargs)
+
+        def duplicated(*args, **kwargs):
             self.model.duplicate_data()
-        # otherwise ask the user
-        else:
-            msg = QMessageBox.question(self, "Overwrite existing data set",
-                                       "Overwrite existing data set?")
-            if msg == QMessageBox.No:  # create new data set
-                self.model.duplicate_data()
+            try:
+                return f(*args, **kwargs)
+            except Exception:
+                self.model.remove_data()
+                raise
+
+        return self.run_task(title, message, duplicated, *args, **kwargs)
 
     def _add_recent(self, fname):
         """Add a file to recent file list.
@@ -631,16 +860,44 @@ class MainWindow(QMainWindow):
         selected : QModelIndex
             Index of the selected row.
         """
-        if selected.row() != self.model.index:
+        if selected.row() >= len(self.model):  # file is still loading
+            self.sidebar.setCurrentIndex(self.names.index(self.model.index))
+        elif selected.row() != self.model.index:
             self.model.index = selected.row()
             self.data_changed()
 
     @pyqtSlot(QModelIndex, QModelIndex)
     def _update_names(self, start, stop):
         """Update names in DataSets after changes in sidebar."""
-        for index in range(start.row(), stop.row() + 1):
+        for index in range(start.row(), min(stop.row() + 1, len(self.model))):
             self.model.data[index]["name"] = self.names.stringList()[index]
 
+    def _update_sidebar(self):
+        """Show data sets and files which are still loading in sidebar."""
+        names = self.model.names
+        for entry in self.loading:
+            names.append(f"{entry['name']} ({entry['status']}...)")
+        self.names.setStringList(names)
+
+    @pyqtSlot()
+    def _update_loading(self):
+        """Insert loaded data sets (in the order the files were opened).
+
+        Data sets are not inserted while a task is running, because this
+        changes the current data set which the task might be using. They are
+        inserted once the task has finished (see `run_task`).
+        """
+        while (self.task is None and self.loading and
+               self.loading[0]["future"].done()):
+            entry = self.loading.pop(0)
+            try:
+                self.model.insert_loaded(*entry["future"].result())
+            except Exception as e:
+                QMessageBox.critical(self, "Could not load file",
+                                     f"{entry['fname']}:\n{e}")
+        self._update_sidebar()
+        self.sidebar.setCurrentIndex(self.names.index(self.model.index))
+
     @pyqtSlot()
     def _update_recent_menu(self):
         self.recent_menu.clear()
@@ -659,6 +916,11 @@ class MainWindow(QMainWindow):
             self.statusBar().hide()
         write_settings(statusbar=not self.statusBar().isHidden())
 
+    @pyqtSlot()
+    def _toggle_lazy(self):
+        self.model.lazy = self.actions["lazy"].isChecked()
+        write_settings(lazy=self.model.lazy)
+
     @pyqtSlot(QDropEvent)
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls():
@@ -668,9 +930,7 @@ class MainWindow(QMainWindow):
     def dropEvent(self, event):
         mime = event.mimeData()
         if mime.hasUrls():
-            urls = mime.urls()
-            for url in urls:
-                self.model.load(url.toLocalFile())
+            self.load_files([url.toLocalFile() for url in mime.urls()])
 
     @pyqtSlot(QEvent)
     def closeEvent(self, event):
@@ -682,6 +942,8 @@ class MainWindow(QMainWindow):
             Close event.
         """
         write_settings(geometry=self.saveGeometry(), state=self.saveState())
+        self.ica_worker.stop()
+        self.loader.shutdown(wait=False)
         if self.model.history:
             print("\nCommand History")
             print("===============")
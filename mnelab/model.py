@@ -1,23 +1,40 @@
-from os.path import getsize, join, split, splitext
+import os
+from os.path import abspath, getsize, join, split, splitext
 from collections import Counter, defaultdict
+from contextlib import contextmanager
 from functools import wraps
-from copy import deepcopy
+from inspect import signature
+from itertools import count
+from tempfile import TemporaryDirectory
 from datetime import datetime
+import json
+import warnings
 import numpy as np
 from numpy.core.records import fromarrays
 from scipy.io import savemat
 import mne
+from mne.io import BaseRaw
+from mne.io.pick import _picks_to_idx
 
-from .utils import read_raw_xdf, have
+from .utils import (read_raw_xdf, index_xdf, have, data_buffer, data_nbytes,
+                    share_data, unshare_data, is_spilled, spill_data,
+                    restore_data, snapshot, snapshot_channels, restore,
+                    saved_raws, report_progress, ResultCache, raw_state,
+                    share_raw, filter_data, filter_chunked,
+                    update_filter_info, CHUNK_SIZE, iter_chunks, map_parallel,
+                    TaskCancelledError, read_events_csv, write_events_csv,
+                    merge_events, read_annotations_csv,
+                    write_annotations_csv, AnnotationIndex)
 
 
-SUPPORTED_FORMATS = "*.bdf *.edf *.gdf *.fif *.vhdr *.set"
-if have["pyxdf"]:
-    SUPPORTED_FORMATS += " *.xdf"
+SUPPORTED_FORMATS = "*.bdf *.edf *.gdf *.fif *.vhdr *.set *.xdf"
 SUPPORTED_EXPORT_FORMATS = "*.fif *.set"
 if have["pyedflib"]:
     SUPPORTED_EXPORT_FORMATS += " *.edf *.bdf"
 
+MAX_UNDO = 20  # maximum number of operations that can be undone
+MAX_SET_SIZE = 2 ** 30  # data larger than this is exported to .fdt files
+
 
 class LabelsNotFoundError(Exception):
     pass
@@ -36,23 +53,139 @@ def data_changed(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         f(*args, **kwargs)
-        args[0].view.data_changed()
+        args[0].update_nbytes()
+        args[0].manage_memory()
+        if args[0].view is not None:  # no view in batch mode
+            args[0].view.data_changed()
+    return wrapper
+
+
+def load_data(f):
+    """Load data of current data set into memory before function call."""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        model = args[0]
+        if not model.current["raw"].preload:
+            model.current["raw"].load_data()
+            model.history.append("raw.load_data()")
+        return f(*args, **kwargs)
     return wrapper
 
 
+def recorded(f):
+    """Add function call to the pipeline of the current data set.
+
+    The pipeline contains the name and the arguments of all operations applied
+    to a data set, so they can be replayed on other files (see mnelab.batch).
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        model = args[0]
+        result = f(*args, **kwargs)
+        bound = signature(f).bind(*args, **kwargs)
+        step = {"op": f.__name__,
+                "kwargs": dict(list(bound.arguments.items())[1:])}
+        # replace instead of append, because undo states share the list
+        model.current["pipeline"] = model.current["pipeline"] + [step]
+        return result
+    return wrapper
+
+
+def busy(f):
+    """Protect current data set from memory management during function call.
+
+    Functions running in a background thread read or modify the data, while
+    memory might be managed in the GUI thread at the same time. The data of
+    busy data sets is neither spilled to disk nor restored into memory.
+    """
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        model = args[0]
+        with model.using(model.current):
+            return f(*args, **kwargs)
+    return wrapper
+
+
+def undoable(*fields):
+    """Save fields of current data set before function call (for undo).
+
+    Parameters
+    ----------
+    fields : str
+        Fields to save (see mnelab.utils.snapshot).
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            model = args[0]
+            state = snapshot(model.current, fields + ("pipeline",))
+            # push_undo clears redo (and might drop the oldest undo state)
+            undo = list(model.current["undo"])
+            redo = list(model.current["redo"])
+            model.push_undo(f.__name__, state)
+            try:
+                return f(*args, **kwargs)
+            except Exception:  # revert changes of failed operation
+                model.current["undo"][:] = undo
+                model.current["redo"][:] = redo
+                restore(model.current, state)
+                raise
+        return wrapper
+    return decorator
+
+
+def edf_record_length(n_times, sfreq):
+    """Return number of samples per EDF data record without padding.
+
+    Data records are at most one second long, and their duration must be a
+    multiple of 10 microseconds (and at least 1 millisecond). The longest
+    record which divides the number of samples is chosen, so that the last
+    record does not need to be padded.
+
+    Parameters
+    ----------
+    n_times : int
+        Number of samples.
+    sfreq : float
+        Sampling frequency.
+
+    Returns
+    -------
+    n_record : int | None
+        Number of samples per data record (None if there is no such record
+        length).
+    """
+    for n_record in range(min(int(sfreq), n_times), 0, -1):
+        duration = n_record / sfreq * 1e5  # in units of 10 microseconds
+        if n_times % n_record == 0 and duration >= 100 and \
+                abs(duration - round(duration)) < 1e-6:
+            return n_record
+    return None
+
+
 class Model:
     """Data model for MNELAB."""
     def __init__(self):
         self.view = None  # current view
         self.data = []  # list of data sets
-        self.index = -1  # index of currently active data set
+        self._index = -1  # index of currently active data set
         self.history = []  # command history
+        self.lazy = False  # load only headers and read data on demand
+        self.memory_budget = None  # maximum size (in bytes) of data in memory
+        self._spilldir = None  # temporary directory for spilled data
+        self._clock = count()  # used to find least recently used data sets
+        self.cache = None  # mnelab.utils.ResultCache (None disables cache)
+        self._busy = []  # data sets used by running tasks (see busy)
 
     @data_changed
     def insert_data(self, dataset):
         """Insert data set after current index."""
-        self.index += 1
-        self.data.insert(self.index, dataset)
+        if dataset["undo"] is None:
+            dataset["undo"], dataset["redo"] = [], []
+        if dataset["pipeline"] is None:
+            dataset["pipeline"] = []
+        self._index += 1
+        self.data.insert(self._index, dataset)
 
     @data_changed
     def update_data(self, dataset):
@@ -63,17 +196,21 @@ class Model:
     def remove_data(self):
         """Remove data set at current index."""
         try:
-            self.data.pop(self.index)
+            self.data.pop(self._index)
         except IndexError:
             raise IndexError("Cannot remove data set from an empty list.")
         else:
-            if self.index >= len(self.data):  # if last entry was removed
-                self.index = len(self.data) - 1  # reset index to last entry
+            if self._index >= len(self.data):  # if last entry was removed
+                self._index = len(self.data) - 1  # reset index to last entry
 
     @data_changed
     def duplicate_data(self):
-        """Duplicate current data set."""
-        self.insert_data(deepcopy(self.current))
+        """Duplicate current data set.
+
+        The duplicate shares its data with the original data set until one of
+        them is modified (copy on write).
+        """
+        self.insert_data(share_data(self.current, exclude=["undo", "redo"]))
         self.current["fname"] = None
         self.current["ftype"] = None
 
@@ -84,76 +221,332 @@ class Model:
 
     @property
     def nbytes(self):
-        """Return size (in bytes) of all data sets."""
-        return sum([item["raw"].get_data().nbytes for item in self.data])
+        """Return size (in bytes) of all data sets.
+
+        Data shared between data sets is counted only once.
+        """
+        buffers = {id(data_buffer(raw)): data_nbytes(raw)
+                   for raw in self._raws() if not is_spilled(raw)}
+        return sum(buffers.values())
+
+    @property
+    def spilled_nbytes(self):
+        """Return size (in bytes) of all data sets spilled to disk."""
+        buffers = {id(data_buffer(raw)): data_nbytes(raw)
+                   for raw in self._raws() if is_spilled(raw)}
+        return sum(buffers.values())
+
+    def update_nbytes(self):
+        """Update memory size (in bytes) of current data set.
+
+        The size is determined from the data buffer without copying it, and
+        it is only updated when the current data set has changed.
+        """
+        if self.current is not None:
+            self.current["nbytes"] = data_nbytes(self.current["raw"])
+
+    @contextmanager
+    def using(self, *datasets):
+        """Mark data sets as used by a running task (see busy)."""
+        # replace instead of modifying the list, which is read in other threads
+        self._busy = self._busy + list(datasets)
+        try:
+            yield
+        finally:
+            busy = list(self._busy)
+            for dataset in datasets:
+                busy.pop(next(i for i, item in enumerate(busy)
+                              if item is dataset))
+            self._busy = busy
+
+    def _busy_buffers(self):
+        """Return ids of data buffers used by running tasks."""
+        return {id(data_buffer(dataset["raw"])) for dataset in self._busy}
+
+    def manage_memory(self):
+        """Keep data in memory within the memory budget.
+
+        The current data set is always kept in memory (and restored from disk
+        if necessary), except in lazy mode. If the total size of all data sets
+        exceeds the memory budget, saved undo states and the least recently
+        used data sets are spilled to disk.
+        Files of spilled data which is no longer used are deleted.
+        Data sets used by running tasks are skipped.
+        """
+        busy = self._busy_buffers()
+        if self.current is not None and is_spilled(self.current["raw"]) and \
+                not self.lazy and \
+                id(data_buffer(self.current["raw"])) not in busy:
+            buffer = data_buffer(self.current["raw"])
+            self._replace_buffer(buffer, restore_data(buffer))
+        self._delete_spillfiles()
+        if self.current is None:
+            return
+        self.current["last_used"] = next(self._clock)
+        if self.memory_budget is None or self.nbytes <= self.memory_budget:
+            return
+
+        # a buffer can be shared by several data sets (copy on write)
+        priority = {}
+        buffers = {}
+        for item in self.data:
+            for raw in self._raws(item):
+                buffer = data_buffer(raw)
+                if buffer is None or is_spilled(raw):
+                    continue
+                # saved undo states are spilled before data sets
+                key = (raw is item["raw"], item["last_used"])
+                priority[id(buffer)] = max(priority.get(id(buffer), key), key)
+                buffers[id(buffer)] = buffer
+        active = id(data_buffer(self.current["raw"]))
+        nbytes = self.nbytes
+        for key in sorted(buffers, key=lambda key: priority[key]):
+            if nbytes <= self.memory_budget:
+                break
+            if key != active and key not in busy:
+                self._spill(buffers[key])
+                nbytes -= buffers[key].nbytes
+
+    def _spill(self, buffer):
+        """Spill data buffer to disk."""
+        self._replace_buffer(buffer, spill_data(buffer, self._spillfile()))
+
+    def _spillfile(self):
+        """Return name of a new file for data stored on disk."""
+        if self._spilldir is None:
+            self._spilldir = TemporaryDirectory(prefix="mnelab-")
+        return join(self._spilldir.name, f"{next(self._clock)}.npy")
+
+    def _delete_spillfiles(self):
+        """Delete files of spilled data which are not used anymore.
+
+        Files are no longer used after their data sets (or saved undo states)
+        have been removed or restored into memory. Nothing is deleted while a
+        task is running, because its output files are not used by any data
+        set until it has finished.
+        """
+        if self._spilldir is None or self._busy:
+            return
+        used = {abspath(data_buffer(raw).filename) for raw in self._raws()
+                if is_spilled(raw)}
+        for fname in os.listdir(self._spilldir.name):
+            fname = abspath(join(self._spilldir.name, fname))
+            if fname not in used:
+                try:
+                    os.remove(fname)
+                except OSError:  # still memory-mapped (on Windows)
+                    pass
+
+    def _replace_buffer(self, old, new):
+        """Replace data buffer in all raw objects that use it."""
+        for raw in self._raws():
+            if data_buffer(raw) is old:
+                raw._data = new
+
+    def _raws(self, dataset=None):
+        """Return raw objects of data sets (including saved undo states).
+
+        Parameters
+        ----------
+        dataset : dict | None
+            Return raw objects of this data set only (or of all data sets if
+            None).
+        """
+        raws = []
+        for item in self.data if dataset is None else [dataset]:
+            raws.append(item["raw"])
+            for _, state in item["undo"] + item["redo"]:
+                raws.extend(saved_raws(state))
+        return raws
+
+    def _cache_key(self, op, *params, nbytes=None):
+        """Compute cache key of an operation on the current data set.
+
+        If the estimated size (in bytes) of the result exceeds the cache size,
+        the result cannot be cached, so None is returned without hashing the
+        data.
+        """
+        if self.cache is None:
+            return None
+        if nbytes is not None and nbytes > self.cache.max_size:
+            return None
+        raw = self.current["raw"]
+        data = data_buffer(raw)
+        if data is None:  # reading the data only to compute the key is slow
+            return None
+        return ResultCache.key(mne.__version__, op, params, raw_state(raw),
+                               data)
+
+    def _cached(self, key):
+        """Return cached result (None if there is no cached result)."""
+        if key is None:
+            return None
+        return self.cache.get(key)
+
+    def _cache(self, key, result):
+        """Add result to cache (if the cache is enabled).
+
+        Raw objects whose data exceeds the cache size are not pickled. Results
+        of cancelled tasks are not cached (TaskCancelledError is raised
+        instead).
+        """
+        report_progress(None)
+        if key is not None:
+            nbytes = data_nbytes(result) if isinstance(result, BaseRaw) \
+                else None
+            self.cache.put(key, result, nbytes)
+
+    def push_undo(self, name, state):
+        """Save state of current data set before an operation.
+
+        Parameters
+        ----------
+        name : str
+            Name of the operation.
+        state : dict
+            State of the current data set before the operation.
+        """
+        self.current["undo"].append((name, state))
+        del self.current["undo"][:-MAX_UNDO]
+        self.current["redo"].clear()
+
+    @data_changed
+    def undo(self):
+        """Undo last operation on current data set."""
+        name, state = self.current["undo"].pop()
+        self.current["redo"].append((name, restore(self.current, state)))
+
+    @data_changed
+    def redo(self):
+        """Redo last undone operation on current data set."""
+        name, state = self.current["redo"].pop()
+        self.current["undo"].append((name, restore(self.current, state)))
+
+    @property
+    def index(self):
+        """Return index of currently active data set."""
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+        self.manage_memory()
 
     @property
     def current(self):
         """Return current data set."""
-        if self.index > -1:
-            return self.data[self.index]
+        if self._index > -1:
+            return self.data[self._index]
         else:
             return None
 
     @current.setter
     def current(self, value):
-        self.data[self.index] = value
+        self.data[self._index] = value
 
     def __len__(self):
         """Return number of data sets."""
         return len(self.data)
 
-    @data_changed
     def load(self, fname, *args, **kwargs):
         """Load data set from file."""
+        self.insert_loaded(*self.read_data(fname, *args, **kwargs))
+
+    def read_data(self, fname, *args, **kwargs):
+        """Read data set from file.
+
+        In contrast to `load`, the data set is neither inserted nor added to
+        the command history, so several files can be read in parallel.
+
+        Returns
+        -------
+        dataset : dict
+            Data set (insert with `insert_loaded`).
+        command : str | None
+            Command which loads the data set (for the command history).
+        """
         name, ext = splitext(split(fname)[-1])
         ftype = ext[1:].upper()
         if ext.lower() not in SUPPORTED_FORMATS:
             raise ValueError(f"File format {ftype} is not supported.")
 
+        pipeline = None
         if ext.lower() in [".edf", ".bdf", ".gdf"]:
-            raw = self._load_edf(fname)
+            raw, command = self._load_edf(fname)
         elif ext in [".fif"]:
-            raw = self._load_fif(fname)
+            raw, command = self._load_fif(fname)
         elif ext in [".vhdr"]:
-            raw = self._load_brainvision(fname)
+            raw, command = self._load_brainvision(fname)
         elif ext in [".set"]:
-            raw = self._load_eeglab(fname)
+            raw, command = self._load_eeglab(fname)
         elif ext in [".xdf"]:
-            raw = self._load_xdf(fname, *args, **kwargs)
+            raw, command = self._load_xdf(fname, *args, **kwargs)
+            # the stream is selected again when the pipeline is replayed
+            bound = signature(self._load_xdf).bind(fname, *args, **kwargs)
+            pipeline = [{"op": "load", "kwargs": {
+                "stream_id": bound.arguments["stream_id"]}}]
+        report_progress(1)
 
-        self.insert_data(defaultdict(lambda: None, name=name, fname=fname,
-                                     ftype=ftype, raw=raw))
+        dataset = defaultdict(lambda: None, name=name, fname=fname,
+                              ftype=ftype, raw=raw, pipeline=pipeline)
+        return dataset, command
+
+    @data_changed
+    def insert_loaded(self, dataset, command=None):
+        """Insert data set read with `read_data`."""
+        self.insert_data(dataset)
+        if command is not None:
+            self.history.append(command)
 
     def _load_edf(self, fname):
-        raw = mne.io.read_raw_edf(fname, preload=True)
-        self.history.append(f"raw = mne.io.read_raw_edf('{fname}', "
-                            f"preload=True)")
-        return raw
+        raw = mne.io.read_raw_edf(fname, preload=not self.lazy)
+        return raw, (f"raw = mne.io.read_raw_edf('{fname}', "
+                     f"preload={not self.lazy})")
 
     def _load_fif(self, fname):
-        raw = mne.io.read_raw_fif(fname, preload=True)
-        self.history.append(f"raw = mne.io.read_raw_fif('{fname}', "
-                            f"preload=True)")
-        return raw
+        raw = mne.io.read_raw_fif(fname, preload=not self.lazy)
+        return raw, (f"raw = mne.io.read_raw_fif('{fname}', "
+                     f"preload={not self.lazy})")
 
     def _load_brainvision(self, fname):
-        raw = mne.io.read_raw_brainvision(fname, preload=True)
-        self.history.append(f"raw = mne.io.read_raw_brainvision('{fname}',"
-                            f" preload=True)")
-        return raw
+        raw = mne.io.read_raw_brainvision(fname, preload=not self.lazy)
+        return raw, (f"raw = mne.io.read_raw_brainvision('{fname}', "
+                     f"preload={not self.lazy})")
 
     def _load_eeglab(self, fname):
-        raw = mne.io.read_raw_eeglab(fname, preload=True)
-        self.history.append(f"raw = mne.io.read_raw_eeglab('{fname}', "
-                            f"preload=True)")
-        return raw
+        raw = mne.io.read_raw_eeglab(fname, preload=not self.lazy)
+        return raw, (f"raw = mne.io.read_raw_eeglab('{fname}', "
+                     f"preload={not self.lazy})")
 
     def _load_xdf(self, fname, stream_id):
-        raw = read_raw_xdf(fname, stream_id=stream_id)
-        return raw
+        index = self.xdf_index(fname) if self.cache is not None else None
+        raw = read_raw_xdf(fname, stream_id=stream_id, index=index)
+        return raw, None
+
+    def xdf_index(self, fname):
+        """Return chunk index of an XDF file.
+
+        The index is stored in the result cache (if enabled), so it is only
+        built once for each file (identified by its path, size, and
+        modification time).
+        """
+        key = None
+        if self.cache is not None:
+            stat = os.stat(fname)
+            key = self.cache.key("index_xdf", abspath(fname), stat.st_size,
+                                 stat.st_mtime_ns)
+            index = self.cache.get(key)
+            if index is not None:
+                return index
+        index = index_xdf(fname)
+        if key is not None:
+            self.cache.put(key, index)
+        return index
 
     @data_changed
+    @recorded
+    @busy
+    @undoable("events")
     def find_events(self, stim_channel, consecutive=True, initial_event=True,
                     uint_cast=True, min_duration=0, shortest_event=0):
         """Find events in raw data."""
@@ -164,50 +557,146 @@ class Model:
                                  uint_cast=uint_cast,
                                  min_duration=min_duration,
                                  shortest_event=shortest_event)
+        report_progress(1)
         if events.shape[0] > 0:  # if events were found
             self.current["events"] = events
             self.history.append("events = mne.find_events(raw)")
 
-    def export_raw(self, fname):
-        """Export raw to file."""
+    @busy
+    def export_raw(self, fname, fdt=None):
+        """Export raw to file.
+
+        Parameters
+        ----------
+        fname : str
+            File name (the extension determines the format).
+        fdt : bool | None
+            Store data of EEGLAB files in a separate .fdt file (None does so
+            if the data is larger than MAX_SET_SIZE).
+        """
         name, ext = splitext(split(fname)[-1])
         ext = ext if ext else ".fif"  # automatically add extension
         fname = join(split(fname)[0], name + ext)
+        self._export_raw(self.current["raw"], fname, fdt)
+
+    def export_data(self, indices, directory, ext, n_jobs=None):
+        """Export several data sets in parallel.
+
+        Data sets are exported in separate threads (most of the time is spent
+        reading and writing files). Existing files are overwritten.
+
+        Parameters
+        ----------
+        indices : list of int
+            Indices of data sets which are exported.
+        directory : str
+            Output directory.
+        ext : str
+            File extension (determines the format).
+        n_jobs : int | None
+            Number of threads (None uses the number of CPUs).
+
+        Returns
+        -------
+        errors : dict
+            Error messages of data sets which could not be exported.
+        """
+        fnames = self.export_fnames(indices, directory, ext)
+
+        def export(index):
+            try:
+                self._export_raw(self.data[index]["raw"], fnames[index])
+            except TaskCancelledError:
+                raise
+            except Exception as e:
+                return e
+
+        with self.using(*[self.data[index] for index in indices]):
+            errors = map_parallel(export, indices, n_jobs)
+        return {fnames[index]: str(error)
+                for index, error in zip(indices, errors) if error is not None}
+
+    def export_fnames(self, indices, directory, ext):
+        """Return file names of data sets exported with `export_data`.
+
+        Names of data sets are used as file names, and duplicate names are
+        numbered.
+        """
+        fnames, counts = {}, Counter()
+        for index in indices:
+            name = self.data[index]["name"]
+            counts[name] += 1
+            if counts[name] > 1:
+                name += f" ({counts[name]})"
+            fnames[index] = join(directory, name + ext)
+        return fnames
+
+    def _export_raw(self, raw, fname, fdt=None):
+        """Export raw object (format is determined by the extension)."""
+        ext = splitext(fname)[1]
         if ext == ".fif":
-            self.current["raw"].save(fname)
+            raw.save(fname, overwrite=True)
         elif ext == ".set":
-            self._export_set(fname)
+            self._export_set(raw, fname, fdt)
         elif ext in (".edf", ".bdf"):
-            self._export_edf(fname)
+            self._export_edf(raw, fname)
 
-    def _export_set(self, fname):
-        """Export raw to EEGLAB file."""
-        data = self.current["raw"].get_data() * 1e6  # convert to microvolts
-        fs = self.current["raw"].info["sfreq"]
-        times = self.current["raw"].times
-        ch_names = self.current["raw"].info["ch_names"]
+    def _export_set(self, raw, fname, fdt=None):
+        """Export raw to EEGLAB file.
+
+        If fdt is True, the data is written to a separate .fdt file (float32
+        in microvolts, sample by sample) in chunks. This needs only little
+        memory and is not limited to 2 GB (like data in the .set file).
+        """
+        nchan, n_times = raw.info["nchan"], raw.n_times
+        if fdt is None:
+            fdt = 4 * nchan * n_times > MAX_SET_SIZE
+        if fdt:
+            base, _ = splitext(fname)
+            datfile = split(base)[-1] + ".fdt"
+            with open(base + ".fdt", "wb") as f:
+                for start, stop, data in iter_chunks(raw):
+                    data *= 1e6  # convert to microvolts
+                    data.T.astype("<f4").tofile(f)  # sample by sample
+                    report_progress(stop / n_times)
+            data = datfile
+        else:
+            data = raw.get_data() * 1e6  # convert to microvolts
+        fs = raw.info["sfreq"]
+        ch_names = raw.info["ch_names"]
         chanlocs = fromarrays([ch_names], names=["labels"])
-        events = fromarrays([self.current["raw"].annotations.description,
-                             self.current["raw"].annotations.onset * fs + 1,
-                             self.current["raw"].annotations.duration * fs],
+        events = fromarrays([raw.annotations.description,
+                             raw.annotations.onset * fs + 1,
+                             raw.annotations.duration * fs],
                             names=["type", "latency", "duration"])
-        savemat(fname, dict(EEG=dict(data=data,
-                                     setname=fname,
-                                     nbchan=data.shape[0],
-                                     pnts=data.shape[1],
-                                     trials=1,
-                                     srate=fs,
-                                     xmin=times[0],
-                                     xmax=times[-1],
-                                     chanlocs=chanlocs,
-                                     event=events,
-                                     icawinv=[],
-                                     icasphere=[],
-                                     icaweights=[])),
-                appendmat=False)
-
-    def _export_edf(self, fname):
-        """Export raw to EDF/BDF file (requires pyEDFlib)."""
+        eeg = dict(data=data,
+                   setname=fname,
+                   nbchan=nchan,
+                   pnts=n_times,
+                   trials=1,
+                   srate=fs,
+                   xmin=0,
+                   xmax=(n_times - 1) / fs,
+                   chanlocs=chanlocs,
+                   event=events,
+                   icawinv=[],
+                   icasphere=[],
+                   icaweights=[])
+        if fdt:
+            eeg["datfile"] = data
+        savemat(fname, dict(EEG=eeg), appendmat=False)
+
+    def _export_edf(self, raw, fname):
+        """Export raw to EDF/BDF file (requires pyEDFlib).
+
+        Data is read and written in chunks, so memory usage does not depend on
+        the size of the data. The duration of data records is chosen so that
+        the number of samples is a multiple of the record length (see
+        `edf_record_length`). If this is not possible, one-second records are
+        used, the last data record is padded with the last sample, and the
+        padded samples are marked with a "BAD_padding" annotation (the
+        exported recording is longer than the original one).
+        """
         import pyedflib
         name, ext = splitext(split(fname)[-1])
         if ext == ".edf":
@@ -216,41 +705,74 @@ class Model:
         elif ext == ".bdf":
             filetype = pyedflib.FILETYPE_BDFPLUS
             dmin, dmax = -8388608, 8388607
-        data = self.current["raw"].get_data() * 1e6  # convert to microvolts
-        fs = self.current["raw"].info["sfreq"]
-        nchan = self.current["raw"].info["nchan"]
-        ch_names = self.current["raw"].info["ch_names"]
-        if self.current["raw"].info["meas_date"] is not None:
-            meas_date = self.current["raw"].info["meas_date"][0]
+        fs = raw.info["sfreq"]
+        nchan = raw.info["nchan"]
+        ch_names = raw.info["ch_names"]
+        if raw.info["meas_date"] is not None:
+            meas_date = raw.info["meas_date"][0]
         else:
             meas_date = None
-        prefilter = (f"{self.current['raw'].info['highpass']}Hz - "
-                     f"{self.current['raw'].info['lowpass']}")
-        pmin, pmax = data.min(axis=1), data.max(axis=1)
+        prefilter = (f"{raw.info['highpass']}Hz - "
+                     f"{raw.info['lowpass']}")
+
+        # first pass: physical range of each channel
+        pmin, pmax = np.full(nchan, np.inf), np.full(nchan, -np.inf)
+        for start, stop, data in iter_chunks(raw):
+            data *= 1e6  # convert to microvolts
+            pmin = np.minimum(pmin, data.min(axis=1))
+            pmax = np.maximum(pmax, data.max(axis=1))
+            report_progress(stop / raw.n_times / 2)
+        pmax[pmax == pmin] += 1  # range of flat channels must not be empty
+
         f = pyedflib.EdfWriter(fname, nchan, filetype)
-        channel_info = []
-        data_list = []
-        for i in range(nchan):
-            channel_info.append(dict(label=ch_names[i],
-                                     dimension="uV",
-                                     sample_rate=fs,
-                                     physical_min=pmin[i],
-                                     physical_max=pmax[i],
-                                     digital_min=dmin,
-                                     digital_max=dmax,
-                                     transducer="",
-                                     prefilter=prefilter))
-            data_list.append(data[i])
-        f.setTechnician("Exported by MNELAB")
-        f.setSignalHeaders(channel_info)
-        if meas_date is not None:
-            f.setStartdatetime(datetime.utcfromtimestamp(meas_date))
-        # note that currently, only blocks of whole seconds can be written
-        f.writeSamples(data_list)
-        if self.current["raw"].annotations is not None:
-            for ann in self.current["raw"].annotations:
-                f.writeAnnotation(ann["onset"], ann["duration"],
-                                  ann["description"])
+        try:
+            channel_info = []
+            for i in range(nchan):
+                channel_info.append(dict(label=ch_names[i],
+                                         dimension="uV",
+                                         sample_frequency=fs,
+                                         physical_min=pmin[i],
+                                         physical_max=pmax[i],
+                                         digital_min=dmin,
+                                         digital_max=dmax,
+                                         transducer="",
+                                         prefilter=prefilter))
+            f.setTechnician("Exported by MNELAB")
+            try:
+                f.setSignalHeaders(channel_info)
+            except KeyError:  # pyEDFlib < 0.1.25 uses "sample_rate"
+                for info in channel_info:
+                    info["sample_rate"] = info.pop("sample_frequency")
+                f.setSignalHeaders(channel_info)
+            if meas_date is not None:
+                f.setStartdatetime(datetime.utcfromtimestamp(meas_date))
+            n_record = edf_record_length(raw.n_times, fs)
+            if n_record is not None:
+                with warnings.catch_warnings():  # duration is exact
+                    warnings.simplefilter("ignore")
+                    f.setDatarecordDuration(n_record / fs)
+
+            # second pass: write data records
+            n_record = f.get_smp_per_record(0)
+            step = n_record * max(CHUNK_SIZE // (8 * nchan * n_record), 1)
+            for start, stop, data in iter_chunks(raw, step):
+                data *= 1e6  # convert to microvolts
+                if data.shape[1] % n_record:  # last record is incomplete
+                    pad = n_record - data.shape[1] % n_record
+                    data = np.pad(data, ((0, 0), (0, pad)), mode="edge")
+                for record in np.split(data, data.shape[1] // n_record,
+                                       axis=1):
+                    f.blockWritePhysicalSamples(record.ravel())
+                report_progress(0.5 + stop / raw.n_times / 2)
+            if raw.annotations is not None:
+                for ann in raw.annotations:
+                    f.writeAnnotation(ann["onset"], ann["duration"],
+                                      ann["description"])
+            if raw.n_times % n_record:  # mark padded samples
+                pad = n_record - raw.n_times % n_record
+                f.writeAnnotation(raw.n_times / fs, pad / fs, "BAD_padding")
+        finally:
+            f.close()
 
     def export_bads(self, fname):
         """Export bad channels info to a CSV file."""
@@ -265,8 +787,7 @@ class Model:
         name, ext = splitext(split(fname)[-1])
         ext = ext if ext else ".csv"  # automatically add extension
         fname = join(split(fname)[0], name + ext)
-        np.savetxt(fname, self.current["events"][:, [0, 2]], fmt="%d",
-                   delimiter=",", header="pos,type", comments="")
+        write_events_csv(fname, self.current["events"])
 
     def export_annotations(self, fname):
         """Export annotations to a CSV file."""
@@ -274,11 +795,20 @@ class Model:
         ext = ext if ext else ".csv"  # automatically add extension
         fname = join(split(fname)[0], name + ext)
         anns = self.current["raw"].annotations
+        write_annotations_csv(fname, anns.onset, anns.duration,
+                              anns.description)
+
+    def export_pipeline(self, fname):
+        """Export pipeline of current data set to a JSON file.
+
+        The pipeline can be applied to other files with
+        `python -m mnelab batch`.
+        """
+        name, ext = splitext(split(fname)[-1])
+        ext = ext if ext else ".json"  # automatically add extension
+        fname = join(split(fname)[0], name + ext)
         with open(fname, "w") as f:
-            f.write("type,onset,duration\n")
-            for a in zip(anns.description, anns.onset, anns.duration):
-                f.write(",".join([a[0], str(a[1]), str(a[2])]))
-                f.write("\n")
+            json.dump({"steps": self.current["pipeline"]}, f, indent=4)
 
     def export_ica(self, fname):
         name, ext = splitext(split(fname)[-1])
@@ -287,6 +817,7 @@ class Model:
         self.current["ica"].save(fname)
 
     @data_changed
+    @undoable("info")
     def import_bads(self, fname):
         """Import bad channels info from a CSV file."""
         with open(fname) as f:
@@ -300,44 +831,62 @@ class Model:
                 self.current["raw"].info["bads"] = bads
 
     @data_changed
+    @undoable("events")
     def import_events(self, fname):
-        """Import events from a CSV file."""
-        pos, desc = [], []
-        with open(fname) as f:
-            f.readline()  # skip header
-            for line in f:
-                p, d = [int(l.strip()) for l in line.split(",")]
-                pos.append(p)
-                desc.append(d)
-        events = np.column_stack((pos, desc))
-        events = np.insert(events, 1, 0, axis=1)  # insert zero column
-        if self.current["events"] is not None:
-            events = np.row_stack((self.current["events"], events))
-            events = np.unique(events, axis=0)
-        self.current["events"] = events
+        """Import events from a CSV file (merged with existing events)."""
+        events = read_events_csv(fname)
+        self.current["events"] = merge_events(self.current["events"], events)
 
     @data_changed
+    @undoable("annotations")
     def import_annotations(self, fname):
         """Import annotations from a CSV file."""
-        descs, onsets, durations = [], [], []
+        onsets, durations, descs = read_annotations_csv(fname)
         fs = self.current["raw"].info["sfreq"]
-        with open(fname) as f:
-            f.readline()  # skip header
-            for line in f:
-                ann = line.split(",")
-                if len(ann) == 3:  # type, onset, duration
-                    onset = float(ann[1].strip())
-                    duration = float(ann[2].strip())
-                    if onset > self.current["raw"].n_times / fs:
-                        msg = ("One or more annotations are outside of the "
-                               "data range.")
-                        raise InvalidAnnotationsError(msg)
-                    else:
-                        descs.append(ann[0].strip())
-                        onsets.append(onset)
-                        durations.append(duration)
+        if (onsets > self.current["raw"].n_times / fs).any():
+            msg = "One or more annotations are outside of the data range."
+            raise InvalidAnnotationsError(msg)
         annotations = mne.Annotations(onsets, durations, descs)
-        self.current["raw"].annotations = annotations
+        self.current["raw"].set_annotations(annotations)
+        self.annotation_index()
+
+    @data_changed
+    @busy
+    def run_ica(self, method, fit_params=None, reject_by_annotation=True,
+                fit=None, random_state=None):
+        """Compute ICA of current data set.
+
+        Parameters
+        ----------
+        method : str
+            ICA method (see mne.preprocessing.ICA).
+        fit_params : dict | None
+            Additional parameters passed to the ICA method.
+        reject_by_annotation : bool
+            Whether to exclude segments annotated as bad.
+        fit : callable | None
+            Function fitting ICA with the signature fit(ica, raw, **kwargs)
+            (e.g. mnelab.utils.ICAWorker.fit). If None, ICA.fit is used.
+        random_state : int | None
+            Random seed (results are only cached if a seed is given, because
+            otherwise each fit is different).
+        """
+        key = None
+        if random_state is not None:
+            key = self._cache_key("run_ica", method, fit_params,
+                                  reject_by_annotation, random_state)
+        ica = self._cached(key)
+        if ica is None:
+            ica = mne.preprocessing.ICA(method=method, fit_params=fit_params,
+                                        random_state=random_state)
+            if fit is None:
+                ica.fit(self.current["raw"],
+                        reject_by_annotation=reject_by_annotation)
+            else:
+                ica = fit(ica, self.current["raw"],
+                          reject_by_annotation=reject_by_annotation)
+            self._cache(key, ica)
+        self.current["ica"] = ica
 
     @data_changed
     def import_ica(self, fname):
@@ -401,11 +950,15 @@ class Model:
             ica = "-"
 
         size_disk = f"{getsize(fname) / 1024 ** 2:.2f} MB" if fname else "-"
+        if raw.preload:
+            size_mem = f"{self.current['nbytes'] / 1024 ** 2:.2f} MB"
+        else:
+            size_mem = "- (not loaded)"
 
         return {"File name": fname if fname else "-",
                 "File type": ftype if ftype else "-",
                 "Size on disk": size_disk,
-                "Size in memory": f"{raw.get_data().nbytes / 1024**2:.2f} MB",
+                "Size in memory": size_mem,
                 "Channels": f"{nchan} (" + ", ".join(
                     [" ".join([str(v), k.upper()]) for k, v in chans]) + ")",
                 "Samples": raw.n_times,
@@ -418,11 +971,17 @@ class Model:
                 "ICA": ica}
 
     @data_changed
+    @recorded
     def drop_channels(self, drops):
+        state = snapshot_channels(self.current, drops)
+        state.update(snapshot(self.current, ["name", "pipeline"]))
         self.current["raw"] = self.current["raw"].drop_channels(drops)
         self.current["name"] += " (channels dropped)"
+        self.push_undo("drop_channels", state)  # only if dropping succeeded
 
     @data_changed
+    @recorded
+    @undoable("info")
     def set_channel_properties(self, bads=None, names=None, types=None):
         if bads:
             self.current["raw"].info["bads"] = bads
@@ -432,41 +991,161 @@ class Model:
             self.current["raw"].set_channel_types(types)
 
     @data_changed
+    @undoable("info", "montage")
     def set_montage(self, montage):
         self.current["montage"] = montage
         self.current["raw"].set_montage(montage)
 
     @data_changed
-    def filter(self, low, high):
-        self.current["raw"].filter(low, high)
-        self.current["name"] += " ({}-{} Hz)".format(low, high)
-        self.history.append("raw.filter({}, {})".format(low, high))
+    @recorded
+    @busy
+    @undoable("raw", "name")
+    def filter(self, low, high, n_jobs=1, method="fir", order=4):
+        raw = self.current["raw"]
+        params = dict(n_jobs=n_jobs, method=method, order=order)
+        if not raw.preload or is_spilled(raw):  # data is on disk
+            if not raw.preload:
+                self.history.append("raw.load_data()")
+            self.current["raw"] = self._filter_out_of_core(raw, low, high,
+                                                           **params)
+        else:
+            key = self._cache_key("filter", low, high, method, order,
+                                  nbytes=data_nbytes(raw))
+            cached = self._cached(key)
+            if cached is None:
+                unshare_data(raw, self._raws())
+                self._filter_in_memory(raw, low, high, **params)
+                self._cache(key, raw)
+            else:
+                self.current["raw"] = cached
+        report_progress(1)
+        if method == "iir":
+            self.current["name"] += " ({}-{} Hz IIR)".format(low, high)
+            self.history.append(f"raw.filter({low}, {high}, method='iir', "
+                                f"iir_params=dict(order={order}, "
+                                f"ftype='butter', output='sos'))")
+        else:
+            self.current["name"] += " ({}-{} Hz)".format(low, high)
+            self.history.append(f"raw.filter({low}, {high}, "
+                                f"n_jobs={n_jobs})")
+
+    def _filter_in_memory(self, raw, low, high, **kwargs):
+        """Filter data in place (like raw.filter, but with threads)."""
+        picks = _picks_to_idx(raw.info, None, "data_or_ica", exclude=())
+        # segments separated by "edge" annotations are filtered separately
+        index = self.annotation_index(raw)
+        starts, stops = index.good_segments(raw.n_times, raw.info["sfreq"],
+                                            "edge")
+        for start, stop in zip(starts, stops):
+            filter_data(raw._data[:, start:stop], raw.info["sfreq"], low,
+                        high, picks, **kwargs)
+        update_filter_info(raw.info, low, high)
+
+    def _filter_out_of_core(self, raw, low, high, **kwargs):
+        """Filter data from disk to disk with constant memory usage.
+
+        Like in `_filter_in_memory`, segments separated by "edge" annotations
+        are filtered separately, and samples within these annotations are
+        copied unfiltered.
+
+        Returns
+        -------
+        filtered : mne.io.Raw
+            Filtered copy of raw, whose data is a memory-mapped file.
+        """
+        fname = self._spillfile()
+        out = np.lib.format.open_memmap(fname, mode="w+", dtype=np.float64,
+                                        shape=(raw.info["nchan"],
+                                               raw.n_times))
+        index = self.annotation_index(raw)
+        starts, stops = index.good_segments(raw.n_times, raw.info["sfreq"],
+                                            "edge")
+        gaps = zip(np.r_[0, stops], np.r_[starts, raw.n_times])
+        for start, stop in gaps:  # samples which are not filtered
+            for first, last, data in iter_chunks(raw, start=start, stop=stop):
+                out[:, first:last] = data
+        for start, stop in zip(starts, stops):
+            filter_chunked(raw, low, high, out, start=start, stop=stop,
+                           **kwargs)
+        out.flush()
+        del out
+        filtered = share_raw(raw)
+        filtered._data = np.load(fname, mmap_mode="r")
+        filtered.preload = True
+        filtered._comp = None  # compensation has been applied by get_data
+        update_filter_info(filtered.info, low, high)
+        return filtered
 
     @data_changed
+    @recorded
+    @busy
+    @load_data
+    @undoable("raw", "name", "reference")
     def set_reference(self, ref):
         self.current["reference"] = ref
         if ref == "average":
             self.current["name"] += " (average ref)"
-            self.current["raw"].set_eeg_reference(ref, projection=False)
         else:
             self.current["name"] += " (" + ",".join(ref) + ")"
-            if set(ref) - set(self.current["raw"].info["ch_names"]):
-                # add new reference channel(s) to data
-                try:
-                    mne.add_reference_channels(self.current["raw"], ref,
-                                               copy=False)
-                except RuntimeError:
-                    raise AddReferenceError("Cannot add reference channels "
-                                            "to average reference signals.")
-            else:
-                # re-reference to existing channel(s)
-                self.current["raw"].set_eeg_reference(ref, projection=False)
+        key = self._cache_key("set_reference", ref,
+                              nbytes=data_nbytes(self.current["raw"]))
+        raw = self._cached(key)
+        if raw is not None:  # shared data does not need to be copied
+            self.current["raw"] = raw
+        else:
+            unshare_data(self.current["raw"], self._raws())
+            self._set_reference(self.current["raw"], ref)
+            self._cache(key, self.current["raw"])
+        report_progress(1)
+
+    def _set_reference(self, raw, ref):
+        """Set reference of raw in place."""
+        if ref == "average":
+            raw.set_eeg_reference(ref, projection=False)
+        elif set(ref) - set(raw.info["ch_names"]):
+            # add new reference channel(s) to data
+            try:
+                mne.add_reference_channels(raw, ref, copy=False)
+            except RuntimeError:
+                raise AddReferenceError("Cannot add reference channels to "
+                                        "average reference signals.")
+        else:
+            # re-reference to existing channel(s)
+            raw.set_eeg_reference(ref, projection=False)
 
     @data_changed
+    @undoable("events")
     def set_events(self, events):
         self.current["events"] = events
 
     @data_changed
+    @undoable("annotations")
     def set_annotations(self, onset, duration, description):
         self.current["raw"].set_annotations(mne.Annotations(onset, duration,
                                                             description))
+        self.annotation_index()
+
+    def annotation_index(self, raw=None):
+        """Return interval index of annotations.
+
+        The index of the current data set is rebuilt only if its annotations
+        have changed.
+
+        Parameters
+        ----------
+        raw : mne.io.Raw | None
+            Raw object (None uses the current data set).
+
+        Returns
+        -------
+        index : AnnotationIndex
+            Index of annotations.
+        """
+        if raw is not None and raw is not self.current["raw"]:
+            return AnnotationIndex.from_raw(raw)
+        raw = self.current["raw"]
+        index = self.current["annotation_index"]
+        if index is None or not index.is_current(raw):
+            index = AnnotationIndex.from_raw(raw)
+            self.current["annotation_index"] = index
+        return index
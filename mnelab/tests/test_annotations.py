@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from mnelab.utils import AnnotationIndex
+
+
+def _random_annotations(n, seed=0):
+    rng = np.random.RandomState(seed)
+    onset = rng.uniform(0, 100, n).round(3)
+    duration = rng.exponential(1, n).round(3)
+    duration[rng.rand(n) < 0.1] = 0
+    description = rng.choice(["bad", "BAD_blink", "edge", "stimulus"], n)
+    return onset, duration, description
+
+
+@pytest.mark.parametrize("n", [0, 1, 500])
+@pytest.mark.parametrize("kinds", [None, "bad", ["Edge", "stim"]])
+def test_overlapping(n, kinds):
+    """Test if overlapping annotations are found like in a linear search."""
+    onset, duration, description = _random_annotations(n)
+    index = AnnotationIndex(onset, duration, description)
+    if kinds is None:
+        matches = np.ones(n, dtype=bool)
+    else:
+        matches = np.zeros(n, dtype=bool)
+        for kind in np.atleast_1d(kinds):
+            matches |= np.char.startswith(np.char.upper(description),
+                                          kind.upper())
+    rng = np.random.RandomState(1)
+    for t0 in rng.uniform(-10, 110, 100):
+        t1 = t0 + rng.exponential(5)
+        expected = np.flatnonzero((onset <= t1) & (onset + duration >= t0) &
+                                  matches)
+        idx = index.overlapping(t0, t1, kinds)
+        assert np.array_equal(np.sort(idx), expected)
+
+
+@pytest.mark.parametrize("n", [0, 1, 500])
+def test_good_mask(n):
+    """Test if masks of annotated samples match a linear search."""
+    sfreq = 100
+    onset, duration, description = _random_annotations(n)
+    index = AnnotationIndex(onset, duration, description)
+    bad = np.char.startswith(np.char.upper(description), "BAD")
+    expected = np.ones(11000, dtype=bool)
+    for t0, t1 in zip(onset[bad], onset[bad] + duration[bad]):
+        expected[int(round(t0 * sfreq)):int(round(t1 * sfreq))] = False
+    assert np.array_equal(index.good_mask(0, 11000, sfreq), expected)
+    rng = np.random.RandomState(1)
+    for start in rng.randint(0, 10000, 50):
+        stop = start + rng.randint(0, 1000)
+        assert np.array_equal(index.good_mask(start, stop, sfreq),
+                              expected[start:stop])
+
+
+@pytest.mark.parametrize("n", [0, 1, 500])
+def test_good_segments(n):
+    """Test if segments between annotations are found."""
+    sfreq, n_times = 100, 9000
+    onset, duration, description = _random_annotations(n)
+    index = AnnotationIndex(onset, duration, description)
+    starts, stops = index.good_segments(n_times, sfreq, "edge")
+    assert (starts < stops).all()
+    assert (starts[1:] >= stops[:-1]).all()
+    edge = np.char.startswith(np.char.upper(description), "EDGE")
+    covered = np.zeros(n_times, dtype=bool)
+    boundaries = set()
+    for t0, t1 in zip(onset[edge], onset[edge] + duration[edge]):
+        first, last = int(round(t0 * sfreq)), int(round(t1 * sfreq))
+        covered[first:last] = True
+        boundaries.add(first)
+    mask = np.zeros(n_times, dtype=bool)
+    for start, stop in zip(starts, stops):
+        mask[start:stop] = True
+    assert np.array_equal(mask, ~covered)
+    # annotations with zero duration split segments
+    for point in boundaries:
+        assert not ((starts < point) & (stops > point)).any()
@@ -0,0 +1,175 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import Qt, QPersistentModelIndex
+
+from mnelab.dialogs.annotationsdialog import AnnotationsModel
+
+
+def _annotations(n=20, seed=0):
+    rng = np.random.RandomState(seed)
+    onset = rng.permutation(n) * 100
+    duration = rng.randint(0, 5, n) * 10
+    description = rng.choice(["bad", "edge", "stimulus"], n)
+    return onset, duration, description
+
+
+def _shown(model):
+    """Return shown annotations (rows of the table)."""
+    return [tuple(model.data(model.index(row, column)) for column in range(3))
+            for row in range(model.rowCount())]
+
+
+def _annotation(model, index):
+    """Return the annotation of a (persistent) index."""
+    return tuple(model.data(model.index(index.row(), column))
+                 for column in range(3))
+
+
+def test_annotations_model(qtmodeltester):
+    """Test if the model shows all annotations or only filtered ones."""
+    onset, duration, description = _annotations()
+    model = AnnotationsModel(onset, duration, description)
+    qtmodeltester.check(model)
+    assert _shown(model) == list(zip(onset, duration, description))
+    assert model.descriptions() == ["bad", "edge", "stimulus"]
+    model.set_filter("edge")
+    qtmodeltester.check(model)
+    mask = description == "edge"
+    assert _shown(model) == list(zip(onset[mask], duration[mask],
+                                     description[mask]))
+    model.set_filter(None)
+    assert model.rowCount() == 20
+
+
+def test_annotations_set_data():
+    """Test if edits of shown rows change the annotations."""
+    model = AnnotationsModel(*_annotations())
+    model.set_filter("bad")
+    row = model.rows[1]
+    assert model.setData(model.index(1, 0), "5")
+    assert model.setData(model.index(1, 2), " new ")
+    assert model.onset[row] == 5 and model.description[row] == "new"
+    assert not model.setData(model.index(1, 1), "-1")
+    assert not model.setData(model.index(1, 1), "abc")
+    assert not model.setData(model.index(1, 2), " ")
+    assert not model.setData(model.index(1, 0), 7, Qt.DisplayRole)
+    assert model.onset[row] == 5
+
+
+@pytest.mark.parametrize("filter", [None, "bad"])
+@pytest.mark.parametrize("column", [0, 1, 2])
+@pytest.mark.parametrize("order", [Qt.AscendingOrder, Qt.DescendingOrder])
+def test_annotations_sort(filter, column, order):
+    """Test if sorting is stable and persistent indexes follow their
+    annotations (also if annotations are filtered)."""
+    onset, duration, description = _annotations(50)
+    model = AnnotationsModel(onset, duration, description)
+    model.set_filter(filter)
+    persistent = [QPersistentModelIndex(model.index(row, column))
+                  for row in range(0, model.rowCount(), 3)]
+    expected = [_annotation(model, index) for index in persistent]
+    shown = _shown(model)
+    model.sort(column, order)
+    values = [onset, duration, description][column]
+    idx = np.argsort(values, kind="stable")
+    if order == Qt.DescendingOrder:
+        idx = idx[::-1]
+    assert np.array_equal(model.onset, onset[idx])
+    assert model.description.tolist() == description[idx].tolist()
+    assert sorted(_shown(model)) == sorted(shown)
+    for index, annotation in zip(persistent, expected):
+        assert index.isValid() and index.column() == column
+        assert _annotation(model, index) == annotation
+
+
+def test_annotations_sort_edited():
+    """Test if persistent indexes of edited annotations which do not match
+    the filter anymore become invalid when sorting."""
+    model = AnnotationsModel(*_annotations(50))
+    model.set_filter("bad")
+    n_rows = model.rowCount()
+    edited = QPersistentModelIndex(model.index(2, 2))
+    kept = QPersistentModelIndex(model.index(3, 0))
+    annotation = _annotation(model, kept)
+    model.setData(model.index(2, 2), "stimulus")
+    model.sort(0, Qt.AscendingOrder)
+    assert not edited.isValid()
+    assert _annotation(model, kept) == annotation
+    assert model.rowCount() == n_rows - 1
+    assert all(description == "bad" for *_, description in _shown(model))
+
+
+@pytest.mark.parametrize("filter", [None, "bad"])
+@pytest.mark.parametrize("rows", [[], [3], [1, 2, 3, 7, 8, 0],
+                                  list(range(0, 250, 2))])
+def test_annotations_remove(filter, rows):
+    """Test if shown annotations are removed in blocks (or with a reset if
+    there are many blocks)."""
+    onset, duration, description = _annotations(1000)
+    model = AnnotationsModel(onset, duration, description)
+    model.set_filter(filter)
+    removed, reset = [], []
+    model.rowsRemoved.connect(lambda parent, first, last:
+                              removed.append((first, last)))
+    model.modelReset.connect(lambda: reset.append(True))
+    keep = np.delete(np.arange(1000), model.rows[rows])
+    shown = [annotation for row, annotation in enumerate(_shown(model))
+             if row not in rows]
+    model.remove_annotations(rows)
+    assert np.array_equal(model.onset, onset[keep])
+    assert np.array_equal(model.duration, duration[keep])
+    assert model.description.tolist() == description[keep].tolist()
+    assert _shown(model) == shown
+    if len(rows) > 100:
+        assert reset and not removed
+    else:
+        assert not reset
+        assert removed == {0: [], 1: [(3, 3)],
+                           6: [(7, 8), (0, 3)]}[len(rows)]
+
+
+def test_annotations_remove_description():
+    """Test if all annotations with a description are removed."""
+    onset, duration, description = _annotations()
+    model = AnnotationsModel(onset, duration, description)
+    model.remove_description("edge")
+    mask = description != "edge"
+    assert _shown(model) == list(zip(onset[mask], duration[mask],
+                                     description[mask]))
+
+
+def test_annotations_rename_description():
+    """Test if renamed descriptions are still shown when filtered."""
+    onset, duration, description = _annotations()
+    model = AnnotationsModel(onset, duration, description)
+    model.set_filter("bad")
+    rows = model.rows.copy()
+    changed = []
+    model.dataChanged.connect(lambda first, last:
+                              changed.append((first.row(), first.column(),
+                                              last.row(), last.column())))
+    model.rename_description("bad", "BAD_renamed")
+    assert model.filter == "BAD_renamed"
+    assert np.array_equal(model.rows, rows)
+    assert changed == [(0, 2, len(rows) - 1, 2)]
+    assert model.descriptions() == ["BAD_renamed", "edge", "stimulus"]
+    model.rename_description("edge", "stimulus")  # merge types
+    assert model.filter == "BAD_renamed"
+    assert (model.description[description == "edge"] == "stimulus").all()
+
+
+def test_annotations_shift_onsets():
+    """Test if only onsets of shown annotations are shifted."""
+    onset, duration, description = _annotations()
+    model = AnnotationsModel(onset, duration, description)
+    model.set_filter("stimulus")
+    model.shift_onsets(-50)
+    mask = description == "stimulus"
+    assert np.array_equal(model.onset[mask], onset[mask] - 50)
+    assert np.array_equal(model.onset[~mask], onset[~mask])
+    model.set_filter(None)
+    model.shift_onsets(10)
+    assert np.array_equal(model.onset, onset - 50 * mask + 10)
+    model.set_filter("unknown")  # nothing shown
+    model.shift_onsets(10)
+    assert np.array_equal(model.onset, onset - 50 * mask + 10)
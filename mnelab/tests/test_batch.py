@@ -0,0 +1,75 @@
+from os.path import join
+
+import numpy as np
+import pytest
+import mne
+
+from mnelab.model import Model
+from mnelab.batch import read_pipeline, run_pipeline
+from mnelab.tests.test_xdf import _write_xdf
+
+
+def _apply(model):
+    model.drop_channels([model.current["raw"].ch_names[-1]])
+    model.filter(1, 20)
+    model.set_reference("average")
+
+
+def test_run_pipeline(tmpdir):
+    """Test if a replayed pipeline gives the same result as the model."""
+    fname = str(tmpdir.join("test_raw.fif"))
+    rng = np.random.RandomState(0)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3", "STI"], 100,
+                           ["eeg", "eeg", "eeg", "stim"])
+    data = rng.randn(4, 3000) * 1e-5
+    data[3] = 0
+    data[3, 500:510] = 1
+    mne.io.RawArray(data, info, verbose=False).save(fname, verbose=False)
+    model = Model()
+    model.load(fname)
+    model.find_events("STI")
+    _apply(model)
+    model.export_pipeline(str(tmpdir.join("pipeline.json")))
+
+    steps = read_pipeline(str(tmpdir.join("pipeline.json")))
+    assert [step["op"] for step in steps] == ["find_events", "drop_channels",
+                                              "filter", "set_reference"]
+    out = run_pipeline(steps, fname, str(tmpdir))
+    assert out == join(str(tmpdir), "test_raw.fif")
+    raw = mne.io.read_raw_fif(out, preload=True, verbose=False)
+    assert raw.ch_names == ["EEG1", "EEG2", "EEG3"]
+    assert np.allclose(raw.get_data(), model.current["raw"].get_data())
+    events = np.loadtxt(join(str(tmpdir), "test_raw_events.csv"),
+                        delimiter=",", skiprows=1, ndmin=2)
+    assert np.array_equal(events[:, 0], model.current["events"][:, 0])
+
+
+def test_run_pipeline_xdf(tmpdir):
+    """Test if pipelines of XDF data contain the stream ID."""
+    fname = str(tmpdir.join("test.xdf"))
+    _write_xdf(fname)
+    model = Model()
+    model.load(fname, stream_id=3)
+    _apply(model)
+    model.export_pipeline(str(tmpdir.join("pipeline.json")))
+    steps = read_pipeline(str(tmpdir.join("pipeline.json")))
+    assert steps[0] == {"op": "load", "kwargs": {"stream_id": 3}}
+    out = run_pipeline(steps, fname, str(tmpdir))
+    raw = mne.io.read_raw_fif(out, preload=True, verbose=False)
+    assert raw.info["sfreq"] == 50
+    assert np.allclose(raw.get_data(), model.current["raw"].get_data())
+
+    with pytest.raises(ValueError, match="stream ID"):
+        run_pipeline(steps[1:], fname, str(tmpdir))
+
+
+def test_read_pipeline(tmpdir):
+    """Test if unknown operations are rejected."""
+    fname = str(tmpdir.join("pipeline.json"))
+    for steps in ('[{"op": "remove_data", "kwargs": {}}]',
+                  '[{"op": "filter", "kwargs": {"low": 1, "high": 20}}, '
+                  '{"op": "load", "kwargs": {"stream_id": 1}}]'):
+        with open(fname, "w") as f:
+            f.write('{"steps": ' + steps + '}')
+        with pytest.raises(ValueError, match="Unknown"):
+            read_pipeline(fname)
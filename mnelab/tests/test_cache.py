@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+
+import numpy as np
+import pytest
+import mne
+
+import mnelab.model
+from mnelab.model import Model
+from mnelab.utils import ResultCache, raw_state, Task, TaskCancelledError
+
+
+def test_key():
+    """Test if keys are stable and depend on data and parameters."""
+    data = np.arange(100.)
+    key = ResultCache.key("filter", (1, 40), data)
+    assert key == ResultCache.key("filter", (1, 40), data.copy())
+    assert key != ResultCache.key("filter", (1, 30), data)
+    assert key != ResultCache.key("filter", (1, 40), data.astype(np.float32))
+    assert key != ResultCache.key("filter", (1, 40), data.reshape(10, 10))
+
+    info = mne.create_info(["EEG1", "EEG2"], 100, "eeg")
+    raw = mne.io.RawArray(np.zeros((2, 100)), info, verbose=False)
+    key = ResultCache.key(raw_state(raw))
+    assert key == ResultCache.key(raw_state(raw.copy()))
+    raw.info["bads"] = ["EEG1"]
+    assert key != ResultCache.key(raw_state(raw))
+
+
+def test_eviction(tmpdir):
+    """Test if least recently used results are evicted first."""
+    cache = ResultCache(str(tmpdir), max_size=3000)
+    for i, key in enumerate("abc"):
+        assert cache.put(key, np.zeros(100))  # about 1 kB each
+        os.utime(cache._fname(key), (i, i))  # a is the oldest
+    assert cache.get("a") is not None  # a is now the newest
+    cache.put("d", np.zeros(100))
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.size <= cache.max_size
+
+
+def test_too_large(tmpdir):
+    """Test if results larger than the cache are skipped."""
+    cache = ResultCache(str(tmpdir), max_size=10000)
+    cache.put("a", np.zeros(100))
+    cache.put("b", np.zeros(100))
+    assert not cache.put("big", np.zeros(2000))  # no size estimate
+    assert not cache.put("big", np.zeros(2000), nbytes=16000)
+    assert cache.get("big") is None
+    assert cache.get("a") is not None and cache.get("b") is not None
+    assert os.listdir(str(tmpdir)).count("big.pkl") == 0
+    assert all(fname.endswith(".pkl") for fname in os.listdir(str(tmpdir)))
+
+
+def test_corrupt(tmpdir):
+    """Test if corrupt results are deleted."""
+    cache = ResultCache(str(tmpdir), max_size=10000)
+    cache.put("a", np.arange(10))
+    with open(cache._fname("a"), "r+b") as f:
+        f.truncate(20)
+    assert cache.get("a") is None
+    assert not os.path.exists(cache._fname("a"))
+    cache.put("a", np.arange(10))
+    assert np.array_equal(cache.get("a"), np.arange(10))
+
+
+def _model(cache_dir):
+    rng = np.random.RandomState(0)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3"], 100, "eeg")
+    raw = mne.io.RawArray(rng.randn(3, 1000) * 1e-5, info, verbose=False)
+    model = Model()
+    model.cache = ResultCache(cache_dir, max_size=10 ** 6)
+    model.insert_data(defaultdict(lambda: None, name="data", raw=raw))
+    return model
+
+
+def test_cached_set_reference(tmpdir):
+    """Test if cached results are used without copying shared data."""
+    model = _model(str(tmpdir))
+    model.duplicate_data()
+    model.set_reference("average")
+    expected = model.current["raw"].get_data()
+    model.undo()
+    shared = model.current["raw"]._data
+    unshare = Mock(wraps=mnelab.model.unshare_data)
+    with patch("mnelab.model.unshare_data", unshare):
+        model.set_reference("average")
+        model.undo()
+        model.filter(1, 20)
+        model.undo()
+        model.filter(1, 20)
+    assert unshare.call_count == 1  # only the first filter was computed
+    model.undo()
+    model.set_reference("average")
+    assert np.array_equal(model.current["raw"].get_data(), expected)
+    assert model.data[0]["raw"]._data is shared  # original data unchanged
+
+
+def test_cancelled_not_cached(tmpdir):
+    """Test if results of cancelled tasks are not cached."""
+    model = _model(str(tmpdir))
+    start = threading.Event()
+
+    def set_reference():
+        start.wait()
+        model.set_reference("average")
+
+    with ThreadPoolExecutor(1) as executor:
+        task = Task(executor, set_reference)
+        task.cancel()  # while the task waits (before re-referencing)
+        start.set()
+        with pytest.raises(TaskCancelledError):
+            task.result()
+    assert os.listdir(str(tmpdir)) == []
+    assert model.current["reference"] is None
+    assert model.current["undo"] == []
+    model.set_reference("average")
+    assert len(os.listdir(str(tmpdir))) == 1
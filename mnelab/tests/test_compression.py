@@ -0,0 +1,75 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from mnelab.utils import SeekableGzip
+
+
+def _write_gzip(fname, n_members, size=2 ** 20):
+    """Write data as a gzip file with several members and return it."""
+    rng = np.random.RandomState(0)
+    # partly compressible, so that blocks decompress to different sizes
+    data = rng.randint(0, 16, size, dtype=np.uint8).tobytes()
+    bounds = np.linspace(0, size, n_members + 1).astype(int)
+    with open(fname, "wb") as f:
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            f.write(gzip.compress(data[start:stop]))
+    return data
+
+
+@pytest.mark.parametrize("n_members", [1, 3])
+def test_seek_read(tmpdir, n_members):
+    """Test if random seeks and reads return the uncompressed data."""
+    fname = str(tmpdir.join("test.gz"))
+    data = _write_gzip(fname, n_members)
+    rng = np.random.RandomState(1)
+    with SeekableGzip(fname, spacing=2 ** 16) as f:
+        assert f.read() == data
+        assert len(f.checkpoints) > 4
+        for start in rng.randint(0, len(data) + 10, 100):  # also backwards
+            size = rng.randint(0, 2 ** 17)
+            assert f.seek(start) == start
+            assert f.read(size) == data[start:start + size]
+            assert f.tell() == min(start + size, max(start, len(data)))
+        f.seek(1000)
+        f.seek(-500, 1)
+        assert f.read(10) == data[500:510]
+
+
+def test_shared_checkpoints(tmpdir):
+    """Test if checkpoints are reused when a file is opened again."""
+    fname = str(tmpdir.join("test.gz"))
+    data = _write_gzip(fname, 2)
+    with SeekableGzip(fname, spacing=2 ** 16) as f:
+        f.seek(len(data) // 2)
+        f.read(10)
+        checkpoints = list(f.checkpoints)
+    with SeekableGzip(fname, spacing=2 ** 16) as f:
+        assert f.checkpoints[:len(checkpoints)] == checkpoints
+        read_compressed, sizes = f._read_compressed, []
+
+        def counting_read(size, pos):
+            sizes.append(size)
+            return read_compressed(size, pos)
+
+        f._read_compressed = counting_read
+        middle = len(data) // 2
+        f.seek(middle - 100)
+        assert f.read(200) == data[middle - 100:middle + 100]
+        # decompression resumed close to the requested position
+        assert sum(sizes) <= 2 * f.blocksize + 2
+        f.seek(0)
+        assert f.read() == data
+
+
+def test_read_ranges(tmpdir):
+    """Test if reading ranges in parallel returns the uncompressed data."""
+    fname = str(tmpdir.join("test.gz"))
+    data = _write_gzip(fname, 3)
+    with SeekableGzip(fname, spacing=2 ** 16) as f:
+        f.read()
+        starts = np.sort(np.random.RandomState(2).randint(0, len(data), 50))
+        ranges = [(int(start), 3000) for start in starts]
+        result = f.read_ranges(ranges, n_jobs=4)
+    assert result == [data[start:start + size] for start, size in ranges]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from mnelab.utils import (read_events_csv, write_events_csv, merge_events,
+                          read_annotations_csv, write_annotations_csv)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")  # empty input
+@pytest.mark.parametrize("n_events", [0, 1, 100])
+def test_events_roundtrip(tmpdir, n_events):
+    """Test if written events are read back."""
+    fname = str(tmpdir.join("events.csv"))
+    events = np.zeros((n_events, 3), dtype=np.int64)
+    rng = np.random.RandomState(0)
+    events[:, 0] = np.sort(rng.randint(0, 10 ** 9, n_events))
+    events[:, 2] = rng.randint(1, 256, n_events)
+    write_events_csv(fname, events)
+    assert np.array_equal(read_events_csv(fname), events)
+    assert read_events_csv(fname).shape == (n_events, 3)
+
+
+@pytest.mark.filterwarnings("ignore::UserWarning")  # empty input
+@pytest.mark.parametrize("contents", ["", "pos,type\n"])
+def test_read_events_empty(tmpdir, contents):
+    """Test if empty and header-only event files contain no events."""
+    fname = str(tmpdir.join("events.csv"))
+    with open(fname, "w") as f:
+        f.write(contents)
+    assert read_events_csv(fname).shape == (0, 3)
+
+
+def test_merge_events():
+    """Test if merged events are sorted and unique."""
+    events = np.array([[10, 0, 1], [20, 0, 2], [30, 0, 1]])
+    new = np.array([[5, 0, 3], [20, 0, 2], [20, 0, 1]])
+    merged = merge_events(events, new)
+    assert merged.tolist() == [[5, 0, 3], [10, 0, 1], [20, 0, 1],
+                               [20, 0, 2], [30, 0, 1]]
+    assert np.array_equal(merge_events(None, new[::-1]), new[[0, 2, 1]])
+
+
+@pytest.mark.parametrize("n_annotations", [0, 1, 50])
+def test_annotations_roundtrip(tmpdir, n_annotations):
+    """Test if written annotations are read back exactly."""
+    fname = str(tmpdir.join("annotations.csv"))
+    rng = np.random.RandomState(0)
+    onset = np.sort(rng.uniform(0, 1000, n_annotations))
+    duration = rng.uniform(0, 10, n_annotations)
+    description = rng.choice(["bad", "BAD_blink", "edge", "Stimulus/S 1"],
+                             n_annotations)
+    write_annotations_csv(fname, onset, duration, description)
+    result = read_annotations_csv(fname)
+    assert np.array_equal(result[0], onset)
+    assert np.array_equal(result[1], duration)
+    assert result[2].tolist() == description.tolist()
+
+
+@pytest.mark.parametrize("contents", ["", "type,onset,duration\n",
+                                      "type,onset,duration\nbad,1.5\n"])
+def test_read_annotations_empty(tmpdir, contents):
+    """Test if files without annotations are read."""
+    fname = str(tmpdir.join("annotations.csv"))
+    with open(fname, "w") as f:
+        f.write(contents)
+    onset, duration, description = read_annotations_csv(fname)
+    assert len(onset) == len(duration) == len(description) == 0
+
+
+def test_read_annotations_single(tmpdir):
+    """Test if a file with a single annotation is read."""
+    fname = str(tmpdir.join("annotations.csv"))
+    with open(fname, "w") as f:
+        f.write("type,onset,duration\n bad ,1.5,0.25\n")
+    onset, duration, description = read_annotations_csv(fname)
+    assert onset.tolist() == [1.5]
+    assert duration.tolist() == [0.25]
+    assert description.tolist() == ["bad"]
+
+
+def test_annotations_special_characters(tmpdir):
+    """Test if types with comment characters, commas, and quotes are read
+    back exactly."""
+    fname = str(tmpdir.join("annotations.csv"))
+    onset = np.arange(6) * 1.5
+    duration = np.full(6, 0.25)
+    description = np.array(["#1 bad", "a,b", "plain", 'say "hi"',
+                            '"quoted, twice"', "# comment"])
+    write_annotations_csv(fname, onset, duration, description)
+    result = read_annotations_csv(fname)
+    assert np.array_equal(result[0], onset)
+    assert np.array_equal(result[1], duration)
+    assert result[2].tolist() == description.tolist()
+
+
+def test_read_annotations_columns(tmpdir):
+    """Test if lines with unquoted commas in types are ignored."""
+    fname = str(tmpdir.join("annotations.csv"))
+    with open(fname, "w") as f:
+        f.write('type,onset,duration\na,b,1,2\n"c,d",3,4\nbad,5,6\n')
+    onset, duration, description = read_annotations_csv(fname)
+    assert onset.tolist() == [3, 5]
+    assert duration.tolist() == [4, 6]
+    assert description.tolist() == ["c,d", "bad"]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import mne
+
+from mnelab.utils import Envelope
+
+
+def _expected_end(envelope, start, stop, width):
+    """Return the last sample covered by the envelope of a window."""
+    per_pixel = (stop - start) / width
+    if per_pixel < envelope.block:  # full resolution
+        return stop
+    level = 0
+    while (level + 1 < len(envelope.levels) and
+           envelope.block * envelope.factor ** (level + 1) <= per_pixel):
+        level += 1
+    size = envelope.block * envelope.factor ** level
+    return min(-(-stop // size) * size, envelope.raw.n_times)
+
+
+@pytest.mark.parametrize("n_times", [1, 100003])
+def test_envelope(n_times):
+    """Test if envelopes match minima and maxima of the data."""
+    rng = np.random.RandomState(0)
+    data = rng.randn(3, n_times).cumsum(axis=1)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3"], 1000, "eeg")
+    raw = mne.io.RawArray(data, info, verbose=False)
+    envelope = Envelope(raw)
+    envelope._step = 5 * envelope.block  # read data in several chunks
+    assert not any(computed.any() for computed in envelope.computed)
+    for _ in range(200):
+        start = rng.randint(0, n_times)
+        stop = rng.randint(start + 1, n_times + 1)
+        width = rng.randint(1, 1500)
+        picks = rng.choice(3, rng.randint(1, 4), replace=False)
+        samples, mins, maxs = envelope.get(start, stop, width, picks)
+        assert len(samples) <= width
+        assert (np.diff(samples) > 0).all()
+        edges = np.r_[samples, _expected_end(envelope, start, stop, width)]
+        assert edges[0] <= start and edges[-1] >= stop
+        for i, (first, last) in enumerate(zip(edges[:-1], edges[1:])):
+            segment = data[picks, first:last].astype(np.float32)
+            assert np.array_equal(mins[:, i].astype(np.float32),
+                                  segment.min(axis=1))
+            assert np.array_equal(maxs[:, i].astype(np.float32),
+                                  segment.max(axis=1))
+
+
+def test_envelope_lazy():
+    """Test if only blocks (and levels) of drawn windows are computed."""
+    info = mne.create_info(["EEG1", "EEG2"], 1000, "eeg")
+    raw = mne.io.RawArray(np.zeros((2, 10 ** 6)), info, verbose=False)
+    envelope = Envelope(raw)
+    assert all(level is None for level in envelope.levels)
+    envelope.get(0, 10000, 100)  # 100 samples per pixel (second level)
+    assert [level is None for level in envelope.levels[:3]] == [False, False,
+                                                                True]
+    computed = envelope.computed[0]
+    assert computed[:10000 // envelope.block].all()
+    assert computed.sum() <= 10064 // envelope.block  # whole blocks
+    envelope.get(0, 10 ** 6, 1000)  # 1000 samples per pixel (third level)
+    assert computed.all()
+    assert not envelope.computed[-1].any()  # coarsest level is not needed
+    assert envelope.levels[-1] is None
+    assert envelope.levels[0][0].shape == (2, len(computed))
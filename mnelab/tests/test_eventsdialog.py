@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+from PyQt5.QtCore import Qt, QPersistentModelIndex
+
+from mnelab.dialogs.eventsdialog import EventsModel, EventsDialog
+
+
+def _events(n=10, seed=0):
+    rng = np.random.RandomState(seed)
+    events = np.zeros((n, 3), dtype=np.int64)
+    events[:, 0] = rng.permutation(n) * 100
+    events[:, 2] = rng.randint(1, 4, n)
+    return events
+
+
+def test_events_model(qtmodeltester):
+    """Test if the model shows positions and types of all events."""
+    events = _events()
+    model = EventsModel(events)
+    qtmodeltester.check(model)
+    assert model.rowCount() == 10 and model.columnCount() == 2
+    assert model.data(model.index(3, 0)) == events[3, 0]
+    assert model.data(model.index(3, 1)) == events[3, 2]
+    events[3, 0] = 1  # the array is copied
+    assert model.data(model.index(3, 0)) != 1
+    assert model.headerData(1, Qt.Horizontal) == "Type"
+
+
+def test_events_set_data():
+    """Test if only non-negative integers can be entered."""
+    model = EventsModel(_events())
+    index = model.index(2, 1)
+    assert model.setData(index, "7")
+    assert model.events[2, 2] == 7
+    assert not model.setData(index, "-1")
+    assert not model.setData(index, "abc")
+    assert not model.setData(index, 8, Qt.DisplayRole)
+    assert model.events[2, 2] == 7
+
+
+@pytest.mark.parametrize("order", [Qt.AscendingOrder, Qt.DescendingOrder])
+def test_events_sort(order):
+    """Test if sorting is stable and persistent indexes follow their rows."""
+    events = _events(50)
+    model = EventsModel(events)
+    persistent = [QPersistentModelIndex(model.index(row, 1))
+                  for row in range(0, 50, 7)]
+    rows = [index.row() for index in persistent]
+    model.sort(1, order)
+    idx = np.argsort(events[:, 2], kind="stable")
+    if order == Qt.DescendingOrder:
+        idx = idx[::-1]
+    assert np.array_equal(model.events, events[idx])
+    for index, row in zip(persistent, rows):
+        assert index.column() == 1
+        assert np.array_equal(model.events[index.row()], events[row])
+
+
+def test_events_insert():
+    """Test if inserted events are shown before a row."""
+    events = _events()
+    model = EventsModel(events)
+    model.insert_event(4, 123, 9)
+    assert model.rowCount() == 11
+    assert model.events[4].tolist() == [123, 0, 9]
+    assert np.array_equal(np.delete(model.events, 4, axis=0), events)
+
+
+@pytest.mark.parametrize("rows", [[], [3], [1, 2, 3, 7, 8, 0],
+                                  list(range(0, 400, 2))])
+def test_events_remove(qtbot, rows):
+    """Test if events are removed in blocks (or with a reset if there are
+    many blocks)."""
+    events = _events(500)
+    model = EventsModel(events)
+    persistent = QPersistentModelIndex(model.index(499, 0))
+    removed, reset = [], []
+    model.rowsRemoved.connect(lambda parent, first, last:
+                              removed.append((first, last)))
+    model.modelReset.connect(lambda: reset.append(True))
+    model.remove_events(rows)
+    assert np.array_equal(model.events, np.delete(events, rows, axis=0))
+    assert model.rowCount() == 500 - len(rows)
+    if len(rows) > 100:
+        assert reset and not removed
+        assert not persistent.isValid()
+    else:
+        assert not reset
+        assert removed == {0: [], 1: [(3, 3)],
+                           6: [(7, 8), (0, 3)]}[len(rows)]
+        assert persistent.row() == 499 - len(rows)
+
+
+def test_events_dialog(qtbot):
+    """Test if the dialog adds and removes selected events."""
+    events = _events()
+    dialog = EventsDialog(None, events)
+    qtbot.addWidget(dialog)
+    assert np.array_equal(dialog.events, events[np.argsort(events[:, 0])])
+    assert not dialog.add_button.isEnabled()
+    dialog.table.selectRow(2)
+    assert dialog.add_button.isEnabled() and dialog.remove_button.isEnabled()
+    dialog.add_button.click()
+    assert dialog.events[2].tolist() == [200, 0, 0]
+    dialog.remove_button.click()
+    assert len(dialog.events) == 10
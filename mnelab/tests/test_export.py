@@ -0,0 +1,131 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import mne
+
+from mnelab.model import Model, edf_record_length
+from mnelab.utils import Task
+
+
+def _raw(n_times, sfreq=250, seed=0):
+    rng = np.random.RandomState(seed)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3"], sfreq, "eeg")
+    raw = mne.io.RawArray(rng.randn(3, n_times).cumsum(axis=1) * 1e-6, info,
+                          verbose=False)
+    raw.set_annotations(mne.Annotations([1, 2.5], [0.5, 0], ["bad", "stim"]))
+    return raw
+
+
+def _model(*raws):
+    model = Model()
+    for i, raw in enumerate(raws):
+        model.insert_data(defaultdict(lambda: None, name=f"data{i}",
+                                      raw=raw))
+    return model
+
+
+@pytest.mark.parametrize("n_times,sfreq,expected", [(2500, 250, 250),
+                                                    (2550, 250, 170),
+                                                    (2561, 256, None),
+                                                    (7, 1000, 7),
+                                                    (1, 100, 1),
+                                                    (1, 2000, None)])
+def test_edf_record_length(n_times, sfreq, expected):
+    """Test if EDF records divide the data and have a valid duration."""
+    assert edf_record_length(n_times, sfreq) == expected
+
+
+@pytest.mark.parametrize("ext", [".edf", ".bdf"])
+@pytest.mark.parametrize("n_times,sfreq", [(2500, 250), (2550, 250),
+                                           (2561, 256)])
+def test_export_edf(tmpdir, ext, n_times, sfreq):
+    """Test if exported EDF/BDF files contain the data and annotations."""
+    pytest.importorskip("pyedflib")
+    raw = _raw(n_times, sfreq)
+    fname = str(tmpdir.join("test" + ext))
+    _model(raw).export_raw(fname)
+    exported = mne.io.read_raw_edf(fname, preload=True, verbose=False)
+    assert exported.info["sfreq"] == pytest.approx(sfreq)
+    data = raw.get_data()
+    resolution = np.ptp(data, axis=1) / (2 ** (16 if ext == ".edf" else 24))
+    resolution += 3e-10  # physical range is stored with 8 characters
+    padded = edf_record_length(n_times, sfreq) is None
+    if padded:
+        assert exported.n_times == -(-n_times // sfreq) * sfreq
+    else:
+        assert exported.n_times == n_times
+    result = exported.get_data()[:len(data)]
+    assert (np.abs(result[:, :n_times] - data).max(axis=1) <=
+            resolution).all()
+    assert (result[:, n_times:] == result[:, n_times - 1:n_times]).all()
+    annotations = exported.annotations
+    assert list(annotations.description) == \
+        ["bad", "stim"] + ["BAD_padding"] * padded
+    expected = [1, 2.5] + [n_times / sfreq] * padded
+    assert np.allclose(annotations.onset, expected, rtol=0, atol=1e-4)
+
+
+@pytest.mark.parametrize("fdt", [True, False])
+@pytest.mark.parametrize("preload", [True, False])
+def test_export_set(tmpdir, monkeypatch, fdt, preload):
+    """Test if data exported to EEGLAB files (with or without a separate
+    .fdt file) is read back."""
+    raw = _raw(5000)
+    fname = str(tmpdir.join("test_raw.fif"))
+    raw.save(fname, verbose=False)
+    raw = mne.io.read_raw_fif(fname, preload=preload, verbose=False)
+    monkeypatch.setattr("mnelab.utils.memory.CHUNK_SIZE", 8 * 3 * 1000)
+    set_fname = str(tmpdir.join("test.set"))
+    _model(raw).export_raw(set_fname, fdt=fdt)
+    assert tmpdir.join("test.fdt").check() == fdt
+    exported = mne.io.read_raw_eeglab(set_fname, preload=True,
+                                      verbose=False)
+    assert exported.ch_names == raw.ch_names
+    assert exported.info["sfreq"] == raw.info["sfreq"]
+    expected = raw.get_data().astype(np.float32).astype(float)
+    assert np.allclose(exported.get_data(), expected, rtol=1e-6, atol=0)
+    assert list(exported.annotations.description) == ["bad", "stim"]
+    assert np.allclose(exported.annotations.onset, [1, 2.5])
+
+
+@pytest.mark.parametrize("ext", [".fif", ".set"])
+def test_export_data(tmpdir, ext):
+    """Test if several data sets are exported in parallel."""
+    raws = [_raw(1000, seed=seed) for seed in range(4)]
+    model = _model(*raws)
+    model.data[2]["name"] = "data0"  # duplicate names are numbered
+    progress, start = [], threading.Event()
+
+    def export():
+        start.wait()  # until the callback has been added
+        return model.export_data([0, 1, 2, 3], str(tmpdir), ext, n_jobs=3)
+
+    with ThreadPoolExecutor(1) as executor:
+        task = Task(executor, export)
+        task.callbacks.append(progress.append)
+        start.set()
+        assert task.result() == {}
+    assert progress[-1] == 1  # combined progress of all data sets
+    names = ["data0", "data1", "data0 (2)", "data3"]
+    assert sorted(tmpdir.listdir(fil="*" + ext)) == \
+        sorted(tmpdir.join(name + ext) for name in names)
+    for name, raw in zip(names, raws):
+        fname = str(tmpdir.join(name + ext))
+        if ext == ".fif":
+            exported = mne.io.read_raw_fif(fname, verbose=False)
+        else:
+            exported = mne.io.read_raw_eeglab(fname, verbose=False)
+        assert np.allclose(exported.get_data(), raw.get_data(), rtol=1e-6,
+                           atol=0)
+
+
+def test_export_data_errors(tmpdir):
+    """Test if errors of single data sets are returned."""
+    model = _model(_raw(1000), _raw(1000))
+    model.data[1]["raw"] = None  # cannot be exported
+    errors = model.export_data([0, 1], str(tmpdir), ".fif")
+    assert list(errors) == [str(tmpdir.join("data1.fif"))]
+    assert tmpdir.join("data0.fif").check()
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import mne
+
+from mnelab.utils import filter_chunked, filter_data
+
+
+@pytest.mark.parametrize("low,high", [(1, 40), (0.5, None), (None, 30)])
+@pytest.mark.parametrize("chunk_size", [2 ** 12, 2 ** 24])
+def test_filter_chunked(low, high, chunk_size):
+    """Test if chunked filtering matches raw.filter."""
+    info = mne.create_info(["EEG1", "EEG2", "STI"], 250,
+                           ["eeg", "eeg", "stim"])
+    data = np.random.RandomState(0).randn(3, 10000)
+    raw = mne.io.RawArray(data, info, verbose=False)
+    out = np.empty_like(data)
+    filter_chunked(raw, low, high, out, chunk_size=chunk_size)
+    expected = raw.copy().filter(low, high, verbose=False).get_data()
+    assert np.allclose(out, expected, rtol=0, atol=1e-12)
+    assert np.array_equal(out[2], data[2])  # stim channel is not filtered
+
+
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_filter_data(n_jobs):
+    """Test if parallel filtering matches mne.filter.filter_data."""
+    data = np.random.RandomState(0).randn(8, 10000)
+    expected = mne.filter.filter_data(data, 250, 1, 40, verbose=False)
+    filter_data(data, 250, 1, 40, n_jobs=n_jobs)
+    assert np.allclose(data, expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("low,high", [(1, 40), (0.5, None), (None, 30)])
+def test_filter_iir(low, high):
+    """Test if chunked IIR filtering matches raw.filter."""
+    info = mne.create_info(["EEG1", "EEG2", "STI"], 250,
+                           ["eeg", "eeg", "stim"])
+    data = np.random.RandomState(0).randn(3, 10000)
+    raw = mne.io.RawArray(data, info, verbose=False)
+    iir_params = dict(order=4, ftype="butter", output="sos")
+    expected = raw.copy().filter(low, high, method="iir",
+                                 iir_params=iir_params,
+                                 verbose=False).get_data()
+    out = np.empty_like(data)
+    filter_chunked(raw, low, high, out, chunk_size=2 ** 12, n_jobs=2,
+                   method="iir")
+    assert np.allclose(out, expected, rtol=0, atol=1e-12)
+    filter_data(data, 250, low, high, [0, 1], method="iir",
+                chunk_size=2 ** 12)
+    assert np.allclose(data, expected, rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("method", ["fir", "iir"])
+def test_filter_chunked_segment(method):
+    """Test if a segment is filtered like a separate recording."""
+    info = mne.create_info(["EEG1", "EEG2", "STI"], 250,
+                           ["eeg", "eeg", "stim"])
+    data = np.random.RandomState(0).randn(3, 10000)
+    raw = mne.io.RawArray(data, info, verbose=False)
+    out = np.zeros_like(data)
+    filter_chunked(raw, 1, 40, out, chunk_size=2 ** 12, method=method,
+                   start=3000, stop=7000)
+    segment = mne.io.RawArray(data[:, 3000:7000], info, verbose=False)
+    expected = np.zeros_like(data)
+    filter_chunked(segment, 1, 40, expected[:, 3000:7000], chunk_size=2 ** 12,
+                   method=method)
+    assert np.array_equal(out, expected)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+import mne
+
+from mnelab.utils import ICAWorker
+from mnelab.utils import ica as ica_module
+
+
+@pytest.fixture(scope="module")
+def worker():
+    worker = ICAWorker()
+    yield worker
+    worker.stop()
+
+
+@pytest.mark.parametrize("shared_memory", [True, False])
+@pytest.mark.parametrize("preload", [True, False])
+def test_ica_worker(tmpdir, monkeypatch, worker, shared_memory, preload):
+    """Test if ICA fitted in the worker process matches ICA.fit."""
+    if not shared_memory:  # like Python < 3.8
+        monkeypatch.setattr(ica_module, "shared_memory", None)
+    rng = np.random.RandomState(0)
+    sources = np.vstack([np.sin(np.arange(5000) / 10),
+                         rng.laplace(size=5000), rng.laplace(size=5000)])
+    data = rng.randn(3, 3) @ sources * 1e-5
+    info = mne.create_info(["EEG1", "EEG2", "EEG3"], 100, "eeg")
+    fname = str(tmpdir.join("test_raw.fif"))
+    mne.io.RawArray(data, info, verbose=False).save(fname, verbose=False)
+    raw = mne.io.read_raw_fif(fname, preload=preload, verbose=False)
+
+    expected = mne.preprocessing.ICA(method="infomax", random_state=0)
+    expected.fit(raw, verbose=False)
+    ica = mne.preprocessing.ICA(method="infomax", random_state=0)
+    ica = worker.fit(ica, raw, verbose=False)
+    assert np.allclose(ica.unmixing_matrix_, expected.unmixing_matrix_)
+    assert not raw.preload or preload  # lazy data is not loaded
@@ -0,0 +1,130 @@
+import os
+from collections import defaultdict
+
+import numpy as np
+import mne
+
+from mnelab.model import Model
+from mnelab.utils import share_raw, share_data, data_buffer, is_spilled
+
+
+def _raw(n_times=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3"], 100, "eeg")
+    return mne.io.RawArray(rng.randn(3, n_times) * 1e-5, info, verbose=False)
+
+
+def _model(*raws):
+    model = Model()
+    for i, raw in enumerate(raws):
+        model.insert_data(defaultdict(lambda: None, name=f"data{i}",
+                                      raw=raw))
+    return model
+
+
+def test_share_raw():
+    """Test if shared raw objects use the same read-only buffer."""
+    raw = _raw()
+    copy = share_raw(raw)
+    assert data_buffer(copy) is data_buffer(raw)
+    assert not data_buffer(raw).flags.writeable
+    copy.info["bads"] = ["EEG1"]  # everything else is copied
+    assert raw.info["bads"] == []
+
+
+def test_share_data():
+    """Test if shared data sets use the same read-only buffer."""
+    dataset = defaultdict(lambda: None, name="data", raw=_raw(),
+                          undo=[], redo=[])
+    copy = share_data(dataset, exclude=["undo", "redo"])
+    assert data_buffer(copy["raw"]) is data_buffer(dataset["raw"])
+    assert not data_buffer(copy["raw"]).flags.writeable
+    assert copy["undo"] is None and copy["name"] == "data"
+
+
+def test_copy_on_write():
+    """Test if only the modified duplicate gets its own copy of the data."""
+    model = _model(_raw())
+    original = model.current["raw"]
+    data = original.get_data()
+    model.duplicate_data()
+    model.duplicate_data()
+    raws = [dataset["raw"] for dataset in model.data]
+    assert all(data_buffer(raw) is data_buffer(original) for raw in raws)
+    assert not data_buffer(original).flags.writeable
+
+    model.set_reference("average")  # in place on the last duplicate
+    modified = model.current["raw"]
+    assert data_buffer(modified) is not data_buffer(original)
+    assert data_buffer(modified).flags.writeable
+    assert data_buffer(model.data[1]["raw"]) is data_buffer(original)
+    assert np.array_equal(original.get_data(), data)  # original is unchanged
+    # undo state of the modified data set still shares the original buffer
+    state = model.current["undo"][-1][1]
+    assert data_buffer(state["raw"]) is data_buffer(original)
+
+    model.index = 1
+    model.filter(1, 20)
+    assert data_buffer(model.data[1]["raw"]) is not data_buffer(original)
+    assert np.array_equal(original.get_data(), data)
+
+
+def test_memory_budget():
+    """Test if least recently used data sets are spilled to disk."""
+    raws = [_raw(seed=seed) for seed in range(3)]
+    data = [raw.get_data() for raw in raws]
+    model = _model(*raws)
+    nbytes = raws[0]._data.nbytes
+    model.memory_budget = 2 * nbytes
+    model.index = 2
+    assert is_spilled(raws[0])
+    assert not is_spilled(raws[1]) and not is_spilled(raws[2])
+    assert model.nbytes <= model.memory_budget
+    assert model.spilled_nbytes == nbytes
+    assert len(os.listdir(model._spilldir.name)) == 1
+
+    model.index = 0  # restored, least recently used data set is spilled
+    assert not is_spilled(raws[0]) and is_spilled(raws[1])
+    assert len(os.listdir(model._spilldir.name)) == 1  # first file deleted
+    for raw, expected in zip(raws, data):
+        assert np.array_equal(raw.get_data(), expected)
+
+    model.index = 1  # the third data set is spilled
+    assert is_spilled(raws[2])
+    model.remove_data()  # the third data set is restored again
+    assert model.spilled_nbytes == 0
+    assert os.listdir(model._spilldir.name) == []
+
+
+def test_spilled_undo_states():
+    """Test if saved undo states are spilled before data sets."""
+    model = _model(_raw())
+    data = model.current["raw"].get_data()
+    model.set_reference("average")
+    model.memory_budget = model.current["raw"]._data.nbytes
+    model.manage_memory()
+    state = model.current["undo"][-1][1]
+    assert is_spilled(state["raw"])
+    assert not is_spilled(model.current["raw"])
+    model.undo()  # restored from disk
+    assert not is_spilled(model.current["raw"])
+    assert np.array_equal(model.current["raw"].get_data(), data)
+
+
+def test_busy_data_sets():
+    """Test if data used by running tasks is neither spilled nor deleted."""
+    raws = [_raw(seed=seed) for seed in range(3)]
+    model = _model(*raws)
+    model.memory_budget = raws[0]._data.nbytes
+    with model.using(model.data[0]):
+        model.manage_memory()
+        assert not is_spilled(raws[0]) and is_spilled(raws[1])
+        fname = model._spillfile()  # output of the running task
+        open(fname, "w").close()
+        model.remove_data()
+        model.manage_memory()
+        assert os.path.exists(fname)
+    model.manage_memory()
+    assert is_spilled(raws[0])
+    assert not os.path.exists(fname)
+    assert model._busy == []
@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+import mne
+
+from mnelab.model import Model
+
+
+def _model(n_times=2000):
+    rng = np.random.RandomState(0)
+    info = mne.create_info(["EEG1", "EEG2", "EEG3", "EEG4"], 100, "eeg")
+    raw = mne.io.RawArray(rng.randn(4, n_times) * 1e-5, info, verbose=False)
+    model = Model()
+    model.insert_data(defaultdict(lambda: None, name="data", raw=raw))
+    return model
+
+
+def _state(model):
+    """Return everything undo and redo restore."""
+    raw = model.current["raw"]
+    return (raw.ch_names, raw.get_data(), model.current["name"],
+            model.current["reference"], list(raw.annotations.onset),
+            list(raw.annotations.description), raw.info["highpass"],
+            [step["op"] for step in model.current["pipeline"]])
+
+
+def _assert_state(model, state):
+    names, data, *rest = _state(model)
+    assert names == state[0]
+    assert np.array_equal(data, state[1])
+    assert rest == list(state[2:])
+
+
+def test_undo_redo():
+    """Test if operations are undone and redone in order."""
+    model = _model()
+    states = [_state(model)]
+    model.filter(1, 20)
+    states.append(_state(model))
+    model.drop_channels(["EEG2"])
+    states.append(_state(model))
+    model.set_reference("average")
+    states.append(_state(model))
+    model.set_annotations([1, 5], [0.5, 0], ["bad", "stimulus"])
+    states.append(_state(model))
+    model.set_reference(["EEG1"])
+    states.append(_state(model))
+    assert len(model.current["undo"]) == len(states) - 1
+
+    for state in states[-2::-1]:
+        model.undo()
+        _assert_state(model, state)
+    assert model.current["undo"] == []
+    for state in states[1:]:
+        model.redo()
+        _assert_state(model, state)
+    assert model.current["redo"] == []
+
+    model.undo()
+    model.undo()
+    model.drop_channels(["EEG3"])  # new operation clears redo
+    assert model.current["redo"] == []
+    model.undo()
+    _assert_state(model, states[-3])
+
+
+@pytest.mark.parametrize("drops", [["EEG1", "EEG2", "EEG3", "EEG4"],
+                                   ["unknown"]])
+def test_failed_drop_channels(drops):
+    """Test if a failed operation keeps the undo and redo history."""
+    model = _model()
+    model.filter(1, 20)
+    model.drop_channels(["EEG2"])
+    model.undo()
+    state = _state(model)
+    undo, redo = list(model.current["undo"]), list(model.current["redo"])
+    with pytest.raises(ValueError):
+        model.drop_channels(drops)
+    assert model.current["undo"] == undo
+    assert model.current["redo"] == redo
+    _assert_state(model, state)
+    model.redo()
+    assert model.current["raw"].ch_names == ["EEG1", "EEG3", "EEG4"]
+
+
+@pytest.mark.parametrize("method", ["fir", "iir"])
+def test_filter_edge(tmpdir, method):
+    """Test if lazy, spilled, and loaded data is filtered like raw.filter
+    (segments separated by "edge" annotations are filtered separately)."""
+    rng = np.random.RandomState(0)
+    info = mne.create_info(["EEG1", "EEG2", "STI"], 100,
+                           ["eeg", "eeg", "stim"])
+    raw = mne.io.RawArray(rng.randn(3, 8000) * 1e-5, info, verbose=False)
+    raw.set_annotations(mne.Annotations([30, 50, 65], [0, 2, 1],
+                                        ["edge", "EDGE boundary", "bad"]))
+    fname = str(tmpdir.join("test_raw.fif"))
+    raw.save(fname, verbose=False)
+    raw = mne.io.read_raw_fif(fname, preload=True, verbose=False)
+    iir_params = dict(order=4, ftype="butter", output="sos")
+    expected = raw.filter(1, 40, method=method, verbose=False,
+                          iir_params=iir_params if method == "iir" else None)
+    expected = expected.get_data()
+
+    results = []
+    for mode in ("lazy", "spilled", "loaded"):
+        model = Model()
+        model.lazy = mode == "lazy"
+        model.load(fname)
+        if mode == "spilled":
+            model._spill(model.current["raw"]._data)
+        model.filter(1, 40, method=method)
+        assert model.current["raw"].preload
+        results.append(model.current["raw"].get_data())
+    for result in results:
+        assert np.allclose(result, expected, rtol=0, atol=1e-15)
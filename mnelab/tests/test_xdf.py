@@ -0,0 +1,175 @@
+import gzip
+import struct
+
+import numpy as np
+import pytest
+
+from mnelab.utils import (read_raw_xdf, index_xdf, read_streams, scan_xdf,
+                          parse_chunks, parse_xdf)
+
+
+def _varlen(n):
+    if n < 256:
+        return b"\x01" + struct.pack("<B", n)
+    return b"\x04" + struct.pack("<I", n)
+
+
+def _chunk(tag, contents, stream_id=None):
+    if stream_id is not None:
+        contents = struct.pack("<I", stream_id) + contents
+    return _varlen(len(contents) + 2) + struct.pack("<H", tag) + contents
+
+
+def _header(stream_id, name, kind, n_chans, fmt, srate):
+    channels = "".join(f"<channel><label>C{i}</label><unit>microvolts</unit>"
+                       "</channel>" for i in range(n_chans))
+    xml = (f"<?xml version='1.0'?><info><name>{name}</name><type>{kind}"
+           f"</type><channel_count>{n_chans}</channel_count><channel_format>"
+           f"{fmt}</channel_format><nominal_srate>{srate}</nominal_srate>"
+           f"<source_id>{name}</source_id><desc><channels>{channels}"
+           "</channels></desc></info>")
+    return _chunk(2, xml.encode(), stream_id)
+
+
+def _samples(stream_id, timestamps, values, omit=()):
+    contents = _varlen(len(timestamps))
+    for i, (timestamp, sample) in enumerate(zip(timestamps, values)):
+        if i in omit:
+            contents += b"\x00"
+        else:
+            contents += b"\x08" + struct.pack("<d", timestamp)
+        if isinstance(sample[0], str):
+            for value in sample:
+                contents += _varlen(len(value)) + value.encode()
+        else:
+            contents += np.asarray(sample, dtype="<f4").tobytes()
+    return _chunk(3, contents, stream_id)
+
+
+def _write_xdf(fname, jitter=0, offset=0, drift=0, n_times=3000, seed=0):
+    """Write an XDF file with an EEG stream, a marker stream, and a stream
+    with a different sampling frequency (Samples chunks are interleaved,
+    and some time stamps are omitted)."""
+    rng = np.random.RandomState(seed)
+    eeg = rng.randn(n_times, 4).astype(np.float32)
+    eeg_ts = 100 + np.arange(n_times) / 100 + rng.normal(0, jitter, n_times)
+    misc = rng.randn(n_times // 2, 2).astype(np.float32)
+    misc_ts = 100.002 + np.arange(n_times // 2) / 50
+    markers = [[f"m{i}"] for i in range(10)]
+    marker_ts = np.sort(rng.uniform(100, 100 + n_times / 100, 10))
+    data = b"XDF:" + _chunk(1, b"<?xml version='1.0'?><info><version>1.0"
+                               b"</version></info>")
+    data += _header(1, "EEG", "EEG", 4, "float32", 100)
+    data += _header(2, "Markers", "Markers", 1, "string", 0)
+    data += _header(3, "Misc", "Misc", 2, "float32", 50)
+    for i, start in enumerate(range(0, n_times, 100)):
+        stop = start + 100
+        omit = range(1, 100, 3) if i % 2 else ()
+        data += _samples(1, eeg_ts[start:stop], eeg[start:stop], omit)
+        data += _samples(3, misc_ts[start // 2:stop // 2],
+                         misc[start // 2:stop // 2])
+        pick = (marker_ts >= 100 + start / 100) & \
+            (marker_ts < 100 + stop / 100)
+        data += _samples(2, marker_ts[pick],
+                         [markers[j] for j in np.flatnonzero(pick)])
+        for stream_id in (1, 2, 3):
+            data += _chunk(4, struct.pack("<dd", 100 + start / 100,
+                                          offset + drift * start), stream_id)
+    with open(fname, "wb") as f:
+        f.write(data)
+    return eeg, eeg_ts, misc, marker_ts, markers
+
+
+def test_read_raw_xdf(tmpdir):
+    """Test if data, time stamps, and markers of XDF files are read."""
+    fname = str(tmpdir.join("test.xdf"))
+    eeg, eeg_ts, misc, marker_ts, markers = _write_xdf(fname)
+    raw = read_raw_xdf(fname, 1)
+    assert raw.ch_names == ["C0", "C1", "C2", "C3"]
+    assert raw.info["sfreq"] == 100
+    assert np.array_equal(raw.get_data(), eeg.T.astype(float) * 1e-6)
+    assert np.allclose(raw.times, eeg_ts - eeg_ts[0], rtol=0, atol=1e-9)
+    assert np.allclose(raw.annotations.onset, marker_ts - eeg_ts[0],
+                       rtol=0, atol=1e-9)
+    assert list(raw.annotations.description) == [m[0] for m in markers]
+
+    raw = read_raw_xdf(fname, 3)
+    assert raw.info["sfreq"] == 50
+    assert np.array_equal(raw.get_data(), misc.T.astype(float) * 1e-6)
+    assert np.allclose(raw.annotations.onset, marker_ts - 100.002,
+                       rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize("stream_id", [1, 3])
+def test_read_raw_xdf_pyxdf(tmpdir, stream_id):
+    """Test if XDF files with jitter and clock offsets are read like pyxdf."""
+    pyxdf = pytest.importorskip("pyxdf")
+    fname = str(tmpdir.join("test.xdf"))
+    _write_xdf(fname, jitter=1e-4, offset=0.5, drift=1e-8)
+    streams = {int(stream["info"]["stream_id"]): stream
+               for stream in pyxdf.load_xdf(fname)[0]}
+    expected = streams[stream_id]
+    raw = read_raw_xdf(fname, stream_id)
+    assert np.array_equal(raw.get_data(),
+                          expected["time_series"].T.astype(float) * 1e-6)
+    timestamps = expected["time_stamps"]
+    assert np.allclose(raw.times, timestamps - timestamps[0], rtol=0,
+                       atol=1e-4)
+    assert np.allclose(raw.annotations.onset,
+                       streams[2]["time_stamps"] - timestamps[0], rtol=0,
+                       atol=1e-9)
+    assert list(raw.annotations.description) == \
+        [sample[0] for sample in streams[2]["time_series"]]
+
+
+@pytest.mark.parametrize("tmin,tmax", [(0, 3), (7.5, None), (None, 12.345),
+                                       (4.99, 20.01), (29.99, None)])
+def test_read_raw_xdf_crop(tmpdir, tmin, tmax):
+    """Test if reading a time range with and without an index is identical."""
+    fname = str(tmpdir.join("test.xdf"))
+    eeg, *_ = _write_xdf(fname, jitter=1e-3, offset=0.5, drift=1e-8)
+    raw = read_raw_xdf(fname, 1, tmin=tmin, tmax=tmax)
+    raw_indexed = read_raw_xdf(fname, 1, index=index_xdf(fname), tmin=tmin,
+                               tmax=tmax)
+    first = round((tmin or 0) * 100)
+    last = round(tmax * 100) + 1 if tmax is not None else len(eeg)
+    assert np.array_equal(raw.get_data(),
+                          eeg[first:last].T.astype(float) * 1e-6)
+    assert np.array_equal(raw_indexed.get_data(), raw.get_data())
+    # time stamps are dejittered using only the chunks which were read
+    assert np.allclose(raw_indexed.annotations.onset, raw.annotations.onset,
+                       rtol=0, atol=1e-3)
+    assert np.array_equal(raw_indexed.annotations.description,
+                          raw.annotations.description)
+
+
+def test_read_raw_xdf_single_channel(tmpdir):
+    """Test if streams with a single channel are read."""
+    fname = str(tmpdir.join("test.xdf"))
+    with open(fname, "wb") as f:
+        f.write(b"XDF:" + _header(1, "EEG", "EEG", 1, "float32", 100) +
+                _samples(1, [0, 0.01, 0.02], [[1], [2], [3]]))
+    raw = read_raw_xdf(fname, 1)
+    assert np.array_equal(raw.get_data(), [[1e-6, 2e-6, 3e-6]])
+
+
+@pytest.mark.parametrize("ext", [".xdf", ".xdfz"])
+def test_late_stream_header(tmpdir, ext):
+    """Test if stream headers after the first Boundary chunk are found."""
+    fname = str(tmpdir.join("test" + ext))
+    boundary = _chunk(5, bytes(range(16)))
+    data = b"XDF:" + _chunk(1, b"<?xml version='1.0'?><info><version>1.0"
+                               b"</version></info>")
+    data += _header(1, "EEG", "EEG", 2, "float32", 100)
+    data += _header(2, "Markers", "Markers", 1, "string", 0)
+    data += boundary + _samples(1, [0, 0.01], [[1, 2], [3, 4]])
+    data += boundary + _header(3, "Late", "Misc", 1, "float32", 10)
+    data += _samples(3, [0.5], [[5]]) + boundary
+    with (gzip.open if ext == ".xdfz" else open)(fname, "wb") as f:
+        f.write(data)
+    expected = [1, 2, 3]
+    for streams in (read_streams(fname, index_xdf(fname)),
+                    parse_chunks(scan_xdf(fname)),
+                    parse_chunks(parse_xdf(fname))):
+        assert [stream["stream_id"] for stream in streams] == expected
+    assert np.allclose(read_raw_xdf(fname, 3).get_data(), [[5e-6]])
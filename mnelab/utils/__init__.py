@@ -1,2 +1,17 @@
 from .dependencies import have
-from .xdf import parse_xdf, parse_chunks, read_raw_xdf
+from .xdf import (parse_xdf, parse_chunks, read_raw_xdf, index_xdf,
+                  read_streams, scan_xdf)
+from .memory import (CHUNK_SIZE, data_buffer, data_nbytes, share_raw,
+                     share_data, unshare_data, is_spilled, spill_data,
+                     restore_data, iter_chunks)
+from .undo import snapshot, snapshot_channels, saved_raws, restore
+from .tasks import Task, TaskCancelledError, report_progress, map_parallel
+from .ica import ICAWorker
+from .cache import ResultCache, raw_state
+from .compression import SeekableGzip
+from .csvio import (read_events_csv, write_events_csv, merge_events,
+                    read_annotations_csv, write_annotations_csv)
+from .annotations import AnnotationIndex
+from .envelope import Envelope, estimate_scalings
+from .filtering import (fir_kernel, filter_data, filter_chunked,
+                        update_filter_info)
@@ -0,0 +1,186 @@
+import numpy as np
+from mne.annotations import _sync_onset
+
+
+class AnnotationIndex:
+    """Interval index of annotations.
+
+    Annotations are sorted by onset, and the running maximum of their end
+    times is stored. Since this maximum is sorted as well, annotations
+    overlapping a time window are found with two binary searches. Merged
+    intervals of annotations (e.g. all bad segments) and annotations matching
+    descriptions are computed once and cached.
+
+    Parameters
+    ----------
+    onset, duration : array-like
+        Onsets and durations of annotations (in seconds relative to the first
+        sample of the data).
+    description : array-like
+        Descriptions of annotations.
+    """
+    def __init__(self, onset, duration, description):
+        onset = np.asarray(onset, dtype=float)
+        self.order = np.argsort(onset, kind="stable")
+        self.onset = onset[self.order]
+        self.end = self.onset + np.asarray(duration, dtype=float)[self.order]
+        self.description = np.asarray(description, dtype=str)[self.order]
+        self.max_end = np.maximum.accumulate(self.end)
+        self._upper = np.char.upper(self.description)  # to match kinds
+        self._masks = {}
+        self._intervals = {}
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Create index of annotations of a raw object."""
+        annotations = raw.annotations
+        onset = _sync_onset(raw, annotations.onset)
+        index = cls(onset, annotations.duration, annotations.description)
+        index.annotations = annotations  # to check if the index is current
+        index.n_annotations = len(annotations)
+        return index
+
+    def is_current(self, raw):
+        """Check if the index still describes the annotations of raw."""
+        return (getattr(self, "annotations", None) is raw.annotations and
+                self.n_annotations == len(raw.annotations))
+
+    def __len__(self):
+        return len(self.onset)
+
+    def _matches(self, kinds):
+        """Mask of annotations whose description starts with one of kinds."""
+        if kinds is None:
+            return np.ones(len(self), dtype=bool)
+        kinds = tuple(np.atleast_1d(kinds))
+        if kinds not in self._masks:
+            self._masks[kinds] = np.any(
+                [np.char.startswith(self._upper, kind.upper())
+                 for kind in kinds], axis=0).reshape(-1)
+        return self._masks[kinds]
+
+    def overlapping(self, t0, t1, kinds=None):
+        """Find annotations overlapping a time window.
+
+        Parameters
+        ----------
+        t0, t1 : float
+            Start and end of the time window (in seconds).
+        kinds : str | list of str | None
+            Only find annotations whose descriptions start with one of these
+            (case-insensitive). None finds all annotations.
+
+        Returns
+        -------
+        idx : numpy.ndarray
+            Indices of annotations (in the original order).
+        """
+        first = np.searchsorted(self.max_end, t0, side="left")
+        last = np.searchsorted(self.onset, t1, side="right")
+        candidates = np.arange(first, max(first, last))
+        candidates = candidates[self.end[first:last] >= t0]
+        if kinds is not None:
+            candidates = candidates[self._matches(kinds)[candidates]]
+        return self.order[candidates]
+
+    def intervals(self, sfreq, kinds=None):
+        """Return merged sample intervals of annotations.
+
+        Overlapping and adjacent annotations are merged. Annotations with
+        zero duration are kept as empty intervals (they mark boundaries such
+        as "edge") unless they are inside another interval.
+
+        Parameters
+        ----------
+        sfreq : float
+            Sampling frequency.
+        kinds : str | list of str | None
+            Descriptions (see `overlapping`).
+
+        Returns
+        -------
+        starts, stops : numpy.ndarray
+            First and last (exclusive) samples of intervals.
+        """
+        key = (sfreq, None if kinds is None else tuple(np.atleast_1d(kinds)))
+        if key not in self._intervals:
+            matches = self._matches(kinds)
+            starts = np.round(self.onset[matches] * sfreq).astype(int)
+            stops = np.round(self.end[matches] * sfreq).astype(int)
+            empty = starts == stops
+            points = np.unique(starts[empty])
+            starts, stops = _merge(starts[~empty], stops[~empty])
+            # keep empty intervals (boundaries) outside of other intervals
+            i = np.searchsorted(starts, points, side="left") - 1
+            inside = np.zeros(len(points), dtype=bool)
+            if len(starts) > 0:
+                inside = (i >= 0) & (stops[np.maximum(i, 0)] > points)
+            starts = np.concatenate((starts, points[~inside]))
+            stops = np.concatenate((stops, points[~inside]))
+            order = np.lexsort((stops, starts))
+            self._intervals[key] = starts[order], stops[order]
+        return self._intervals[key]
+
+    def good_mask(self, start, stop, sfreq, kinds="bad"):
+        """Compute mask of samples which are not annotated.
+
+        Only intervals overlapping the requested samples are visited, so the
+        time depends on the number of samples, not on the number of
+        annotations.
+
+        Parameters
+        ----------
+        start, stop : int
+            First and last (exclusive) sample.
+        sfreq : float
+            Sampling frequency.
+        kinds : str | list of str | None
+            Descriptions of annotated segments (see `overlapping`).
+
+        Returns
+        -------
+        mask : numpy.ndarray, shape (stop - start,)
+            True for samples which are not annotated.
+        """
+        starts, stops = self.intervals(sfreq, kinds)
+        mask = np.ones(stop - start, dtype=bool)
+        first = np.searchsorted(stops, start, side="right")
+        last = np.searchsorted(starts, stop, side="left")
+        for onset, end in zip(starts[first:last], stops[first:last]):
+            mask[max(onset - start, 0):max(end - start, 0)] = False
+        return mask
+
+    def good_segments(self, n_times, sfreq, kinds="edge"):
+        """Return segments of samples between annotations.
+
+        Parameters
+        ----------
+        n_times : int
+            Number of samples.
+        sfreq : float
+            Sampling frequency.
+        kinds : str | list of str | None
+            Descriptions of annotations (see `overlapping`).
+
+        Returns
+        -------
+        starts, stops : numpy.ndarray
+            First and last (exclusive) samples of non-empty segments.
+        """
+        onsets, ends = self.intervals(sfreq, kinds)
+        starts = np.clip(np.r_[0, ends], 0, n_times)
+        stops = np.clip(np.r_[onsets, n_times], 0, n_times)
+        keep = starts < stops
+        return starts[keep], stops[keep]
+
+
+def _merge(starts, stops):
+    """Merge overlapping and adjacent intervals."""
+    if len(starts) == 0:
+        return starts, stops
+    order = np.argsort(starts, kind="stable")
+    starts, stops = starts[order], stops[order]
+    new = np.ones(len(starts), dtype=bool)  # interval starts after all others
+    new[1:] = starts[1:] > np.maximum.accumulate(stops)[:-1]
+    first = np.flatnonzero(new)
+    return starts[first], np.maximum.reduceat(stops, first)
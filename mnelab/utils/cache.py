@@ -0,0 +1,178 @@
+import hashlib
+import os
+from os.path import getsize, join
+import pickle
+import numpy as np
+
+
+class ResultCache:
+    """Persistent cache for results of expensive operations.
+
+    Results are pickled to files in a directory. They are identified by a key
+    computed from the input data and the parameters of the operation (see
+    `key`). If the total size of all cached results exceeds the maximum size,
+    least recently used results are deleted.
+
+    Parameters
+    ----------
+    directory : str
+        Cache directory (created if it does not exist).
+    max_size : int
+        Maximum size (in bytes) of all cached results.
+    """
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        """Compute key from arrays and other (picklable) objects.
+
+        Parameters
+        ----------
+        parts
+            Input data and parameters of an operation.
+
+        Returns
+        -------
+        key : str
+            Hash of all parts.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        for part in parts:
+            if isinstance(part, np.ndarray):
+                h.update(f"{part.dtype.str}{part.shape}".encode())
+                h.update(np.ascontiguousarray(part).data)
+            else:
+                h.update(pickle.dumps(part, protocol=4))
+        return h.hexdigest()
+
+    def _fname(self, key):
+        return join(self.directory, key + ".pkl")
+
+    def get(self, key):
+        """Return cached result (None if there is no result for this key)."""
+        fname = self._fname(key)
+        try:
+            with open(fname, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:  # corrupt file (e.g. after a crash)
+            os.remove(fname)
+            return None
+        os.utime(fname)  # mark as recently used
+        return result
+
+    def put(self, key, result, nbytes=None):
+        """Add result to cache (deletes old results if the cache is full).
+
+        Results larger than the maximum size are not cached (writing stops as
+        soon as the maximum size is exceeded), because they would evict all
+        other results and then themselves.
+
+        Parameters
+        ----------
+        key : str
+            Key (see `key`).
+        result
+            Result (must be picklable).
+        nbytes : int | None
+            Estimated size of the result in bytes (if known, too large
+            results are skipped before pickling).
+
+        Returns
+        -------
+        cached : bool
+            Whether the result has been cached.
+        """
+        if nbytes is not None and nbytes > self.max_size:
+            return False
+        fname = self._fname(key)
+        tmp = fname + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump(result, _LimitedWriter(f, self.max_size),
+                            protocol=4)
+        except _ResultTooLarge:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, fname)  # never leave partially written results
+        self.evict()
+        return True
+
+    @property
+    def size(self):
+        """Total size (in bytes) of all cached results."""
+        return sum(getsize(fname) for _, fname in self._entries())
+
+    def _entries(self):
+        """Return (modification time, file name) of all cached results."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pkl"):
+                entries.append((entry.stat().st_mtime, entry.path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used results until the cache fits."""
+        entries = sorted(self._entries())
+        size = sum(getsize(fname) for _, fname in entries)
+        for _, fname in entries:
+            if size <= self.max_size:
+                break
+            size -= getsize(fname)
+            os.remove(fname)
+
+    def clear(self):
+        """Delete all cached results."""
+        for _, fname in self._entries():
+            os.remove(fname)
+
+
+class _ResultTooLarge(Exception):
+    pass
+
+
+class _LimitedWriter:
+    """File wrapper which raises _ResultTooLarge after writing limit bytes."""
+    def __init__(self, f, limit):
+        self.f = f
+        self.limit = limit
+        self.size = 0
+
+    def write(self, data):
+        self.size += memoryview(data).nbytes
+        if self.size > self.limit:
+            raise _ResultTooLarge()
+        return self.f.write(data)
+
+
+def raw_state(raw):
+    """Describe metadata of a raw object which affects computations.
+
+    In contrast to pickled info objects, the description is identical for
+    equal metadata, so it can be used to compute cache keys.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object.
+
+    Returns
+    -------
+    state : list
+        Metadata (channels, sampling frequency, filter settings, projectors,
+        bad channels, and annotations).
+    """
+    info = raw.info
+    chs = [(ch["ch_name"], ch["kind"], ch["coil_type"], ch["unit"],
+            ch["cal"], ch["range"], ch["loc"].tolist()) for ch in info["chs"]]
+    projs = [(p["desc"], p["active"], p["data"]["col_names"],
+              p["data"]["data"].tolist()) for p in info["projs"]]
+    annotations = raw.annotations
+    return [chs, projs, info["sfreq"], info["highpass"], info["lowpass"],
+            info["custom_ref_applied"], list(info["bads"]), raw.first_samp,
+            annotations.onset.tolist(), annotations.duration.tolist(),
+            annotations.description.tolist()]
@@ -0,0 +1,185 @@
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import zlib
+
+
+# decompressor state at a position in the uncompressed data (decompressor is
+# None at the start of a gzip member)
+Checkpoint = namedtuple("Checkpoint", ["out_pos", "in_pos", "decompressor"])
+
+# checkpoints of recently opened files (shared by all SeekableGzip objects)
+_checkpoints = OrderedDict()
+_lock = threading.Lock()
+MAX_FILES = 8  # number of files whose checkpoints are kept
+
+
+class SeekableGzip:
+    """Read-only gzip file with fast random access.
+
+    While data is decompressed for the first time, the decompressor state is
+    saved in regular intervals (checkpoints). Seeking then resumes
+    decompression from the nearest checkpoint instead of the start of the
+    file. Checkpoints are kept in memory for the last MAX_FILES files, so
+    they can be reused when a file is opened again.
+
+    Parameters
+    ----------
+    fname : str
+        File name.
+    spacing : int
+        Minimum distance (in bytes of uncompressed data) between checkpoints.
+    """
+    blocksize = 2 ** 16  # bytes of compressed data decompressed at once
+
+    def __init__(self, fname, spacing=2 ** 22):
+        self.fname = fname
+        self.spacing = spacing
+        self._file = open(fname, "rb")
+        stat = os.fstat(self._file.fileno())
+        key = (os.path.abspath(fname), stat.st_size, stat.st_mtime_ns)
+        with _lock:
+            if key not in _checkpoints:
+                _checkpoints[key] = [Checkpoint(0, 0, None)]
+            _checkpoints.move_to_end(key)
+            while len(_checkpoints) > MAX_FILES:
+                _checkpoints.popitem(last=False)
+            self.checkpoints = _checkpoints[key]
+        self._pos = 0  # current position (uncompressed)
+        self._restart(self.checkpoints[0])
+
+    def _restart(self, checkpoint):
+        """Resume decompression at a checkpoint."""
+        if checkpoint.decompressor is None:
+            self._decompressor = zlib.decompressobj(31)
+        else:
+            self._decompressor = checkpoint.decompressor.copy()
+        self._in_pos = checkpoint.in_pos
+        self._out_pos = checkpoint.out_pos  # position of self._buffer
+        self._buffer = b""
+        self._finished = False
+
+    def _decompress(self):
+        """Decompress next block (returns False at the end of the file)."""
+        if self._finished:
+            return False
+        data = self._read_compressed(self.blocksize, self._in_pos)
+        if not data:
+            self._finished = True
+            return False
+        buffer = self._decompressor.decompress(data)
+        self._in_pos += len(data)
+        if self._decompressor.eof:  # end of gzip member
+            self._in_pos -= len(self._decompressor.unused_data)
+            if self._read_compressed(2, self._in_pos) == b"\x1f\x8b":
+                self._decompressor = zlib.decompressobj(31)
+            else:  # end of file (or trailing garbage)
+                self._finished = True
+        self._out_pos += len(self._buffer)
+        self._buffer = buffer
+        self._add_checkpoint()
+        return True
+
+    def _read_compressed(self, size, pos):
+        """Read compressed data at a position."""
+        self._file.seek(pos)
+        return self._file.read(size)
+
+    def _add_checkpoint(self):
+        """Save decompressor state if it is far enough from the last one."""
+        pos = self._out_pos + len(self._buffer)
+        if self._finished or pos < self.checkpoints[-1].out_pos + self.spacing:
+            return
+        with _lock:
+            if pos >= self.checkpoints[-1].out_pos + self.spacing:
+                self.checkpoints.append(
+                    Checkpoint(pos, self._in_pos, self._decompressor.copy()))
+
+    def _locate(self, pos):
+        """Make sure that decompression does not start after pos."""
+        end = self._out_pos + len(self._buffer)
+        if self._out_pos <= pos <= end + self.spacing:  # close enough
+            return
+        index = bisect_right([c.out_pos for c in self.checkpoints], pos) - 1
+        checkpoint = self.checkpoints[index]
+        if pos < self._out_pos or checkpoint.out_pos > end:
+            self._restart(checkpoint)
+
+    def read(self, size=-1):
+        self._locate(self._pos)
+        data = []
+        while size != 0:
+            offset = self._pos - self._out_pos
+            if offset < len(self._buffer):
+                if size < 0:
+                    block = self._buffer[offset:]
+                else:
+                    block = self._buffer[offset:offset + size]
+                    size -= len(block)
+                data.append(block)
+                self._pos += len(block)
+            elif not self._decompress():
+                break
+        return b"".join(data)
+
+    def read_ranges(self, ranges, n_jobs=None):
+        """Read several ranges of data in parallel.
+
+        Ranges which start after different checkpoints are decompressed in
+        separate threads (each with its own file handle, zlib releases the
+        GIL).
+
+        Parameters
+        ----------
+        ranges : list of tuple
+            Start position and size of each range (in ascending order).
+        n_jobs : int | None
+            Number of threads (None uses the number of CPUs).
+
+        Returns
+        -------
+        data : list of bytes
+            Data of all ranges.
+        """
+        positions = [c.out_pos for c in self.checkpoints]
+        groups = OrderedDict()
+        for start, size in ranges:
+            groups.setdefault(bisect_right(positions, start), []).append(
+                (start, size))
+
+        def read(group):
+            with SeekableGzip(self.fname, self.spacing) as f:
+                data = []
+                for start, size in group:
+                    f.seek(start)
+                    data.append(f.read(size))
+                return data
+
+        if len(groups) < 2:
+            return read(ranges)
+        with ThreadPoolExecutor(n_jobs) as executor:
+            results = executor.map(read, groups.values())
+            return [data for result in results for data in result]
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self._pos = offset
+        elif whence == os.SEEK_CUR:
+            self._pos += offset
+        else:
+            raise ValueError("Seeking from the end is not supported.")
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
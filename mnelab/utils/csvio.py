@@ -0,0 +1,126 @@
+import numpy as np
+
+
+def read_events_csv(fname):
+    """Read events from a CSV file.
+
+    The file has a header line and two columns (position and type).
+
+    Parameters
+    ----------
+    fname : str
+        File name.
+
+    Returns
+    -------
+    events : numpy.ndarray, shape (n_events, 3)
+        Events (position, zero, type) as in MNE.
+    """
+    data = np.loadtxt(fname, dtype=np.int64, delimiter=",", skiprows=1,
+                      ndmin=2, comments=None)
+    events = np.zeros((data.shape[0], 3), dtype=np.int64)
+    events[:, [0, 2]] = data
+    return events
+
+
+def write_events_csv(fname, events):
+    """Write events (positions and types) to a CSV file."""
+    with open(fname, "w") as f:
+        f.write("pos,type\n")
+        f.write(("%d,%d\n" * len(events)) %
+                tuple(events[:, [0, 2]].ravel().tolist()))
+
+
+def merge_events(events, new):
+    """Merge events and remove duplicates.
+
+    Both arrays are typically sorted already, so the (stable) lexicographic
+    sort of the concatenated events merges two sorted runs.
+
+    Parameters
+    ----------
+    events : numpy.ndarray, shape (n_events, 3) | None
+        Existing events.
+    new : numpy.ndarray, shape (n_new, 3)
+        Events to add.
+
+    Returns
+    -------
+    merged : numpy.ndarray, shape (n_merged, 3)
+        Unique events sorted by position (then middle column and type).
+    """
+    if events is not None:
+        new = np.concatenate((events, new))
+    merged = new[np.lexsort(new.T[::-1])]
+    unique = np.ones(len(merged), dtype=bool)
+    unique[1:] = np.any(merged[1:] != merged[:-1], axis=1)
+    return merged[unique]
+
+
+def read_annotations_csv(fname):
+    """Read annotations from a CSV file.
+
+    The file has a header line and three columns (type, onset, and duration).
+    Types containing commas or quotes are quoted like in the csv module (see
+    `write_annotations_csv`). Lines with a different number of columns are
+    ignored.
+
+    Parameters
+    ----------
+    fname : str
+        File name.
+
+    Returns
+    -------
+    onset, duration : numpy.ndarray
+        Onsets and durations (in seconds).
+    description : numpy.ndarray
+        Descriptions (types).
+    """
+    with open(fname) as f:
+        f.readline()  # skip header
+        lines = [line for line in f.read().splitlines()
+                 if line.count(",") == 2 or '"' in line and
+                 line.count(",") > 2]
+    if not lines:
+        return np.empty(0), np.empty(0), np.empty(0, dtype=str)
+    # quoted lines are parsed separately (the rest is parsed in bulk)
+    quoted = [i for i, line in enumerate(lines) if '"' in line]
+    rows = [lines[i].rsplit(",", 2) for i in quoted]
+    for i in quoted:
+        lines[i] = ",0,0"
+    onset, duration = np.loadtxt(lines, delimiter=",", usecols=(1, 2),
+                                 ndmin=2, comments=None).T
+    description = np.loadtxt(lines, dtype=str, delimiter=",", usecols=0,
+                             ndmin=1, comments=None)
+    description = np.char.strip(description)
+    if quoted:
+        description = description.astype(object)
+        for i, (value, first, length) in zip(quoted, rows):
+            value = value.strip()
+            if len(value) > 1 and value[0] == value[-1] == '"':
+                value = value[1:-1].replace('""', '"')
+            description[i] = value
+            onset[i], duration[i] = float(first), float(length)
+        description = description.astype(str)
+    return onset, duration, description
+
+
+def _quote(description):
+    """Quote description if it contains commas or quotes (like csv)."""
+    if "," in description or '"' in description:
+        return '"' + description.replace('"', '""') + '"'
+    return description
+
+
+def write_annotations_csv(fname, onset, duration, description):
+    """Write annotations (type, onset, and duration) to a CSV file.
+
+    Types containing commas or quotes are quoted.
+    """
+    rows = zip(map(_quote, np.asarray(description).tolist()),
+               np.asarray(onset).tolist(), np.asarray(duration).tolist())
+    with open(fname, "w") as f:
+        f.write("type,onset,duration\n")
+        f.write(("%s,%r,%r\n" * len(onset)) %
+                tuple(value for row in rows for value in row))
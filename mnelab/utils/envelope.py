@@ -0,0 +1,160 @@
+import numpy as np
+from mne.io.pick import channel_indices_by_type
+
+from .memory import CHUNK_SIZE, iter_chunks
+
+
+class Envelope:
+    """Minima and maxima of data at multiple resolutions.
+
+    Level k contains minima and maxima of blocks of ``block * factor ** k``
+    samples. A time window is drawn from the coarsest level which has at least
+    one block per pixel, so the cost of computing the envelope of a window
+    depends on its width in pixels and not on the number of samples.
+
+    Blocks are computed when a window needs them for the first time and are
+    kept afterwards (blocks of coarser levels are computed from finer
+    levels). Therefore, creating an envelope does not read any data, the data
+    of each block is read only once, and memory is allocated only for levels
+    which have been needed.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object.
+    """
+    block = 16  # samples per block of the first level
+    factor = 4  # number of blocks combined into one block of the next level
+
+    def __init__(self, raw):
+        self.raw = raw
+        nchan = raw.info["nchan"]
+        n_blocks = -(-raw.n_times // self.block)
+        self._step = max(CHUNK_SIZE // (8 * nchan) // self.block, 1) * \
+            self.block  # samples per chunk (whole blocks)
+        self.levels = []  # minima and maxima (None until first needed)
+        self.computed = []  # blocks of all levels which have been computed
+        while True:
+            self.levels.append(None)
+            self.computed.append(np.zeros(n_blocks, dtype=bool))
+            if n_blocks <= 1:
+                break
+            n_blocks = -(-n_blocks // self.factor)
+
+    def _compute(self, level, first, last):
+        """Compute blocks of a level which have not been computed yet."""
+        missing = np.flatnonzero(~self.computed[level][first:last]) + first
+        if len(missing) == 0:
+            return
+        if self.levels[level] is None:
+            shape = self.raw.info["nchan"], len(self.computed[level])
+            self.levels[level] = (np.empty(shape, dtype=np.float32),
+                                  np.empty(shape, dtype=np.float32))
+        mins, maxs = self.levels[level]
+        # runs of consecutive missing blocks
+        for run in np.split(missing, np.flatnonzero(np.diff(missing) > 1) + 1):
+            a, b = run[0], run[-1] + 1
+            if level == 0:  # read data in chunks of whole blocks
+                end = min(b * self.block, self.raw.n_times)
+                for start, stop, data in iter_chunks(self.raw, self._step,
+                                                     a * self.block, end):
+                    blocks = np.arange(0, stop - start, self.block)
+                    i = start // self.block
+                    mins[:, i:i + len(blocks)] = np.minimum.reduceat(
+                        data, blocks, axis=1)
+                    maxs[:, i:i + len(blocks)] = np.maximum.reduceat(
+                        data, blocks, axis=1)
+            else:  # combine blocks of the previous level
+                n_blocks = len(self.computed[level - 1])
+                start, stop = a * self.factor, min(b * self.factor, n_blocks)
+                self._compute(level - 1, start, stop)
+                blocks = np.arange(0, stop - start, self.factor)
+                lower_mins, lower_maxs = self.levels[level - 1]
+                mins[:, a:b] = np.minimum.reduceat(
+                    lower_mins[:, start:stop], blocks, axis=1)
+                maxs[:, a:b] = np.maximum.reduceat(
+                    lower_maxs[:, start:stop], blocks, axis=1)
+            self.computed[level][a:b] = True
+
+    def get(self, start, stop, width, picks=None):
+        """Compute envelope of a time window.
+
+        Parameters
+        ----------
+        start, stop : int
+            First and last (exclusive) sample of the window.
+        width : int
+            Width of the window (in pixels).
+        picks : array-like of int | None
+            Channels (None uses all channels).
+
+        Returns
+        -------
+        samples : numpy.ndarray, shape (n_bins,)
+            First sample of each bin (at most width bins).
+        mins, maxs : numpy.ndarray, shape (n_picks, n_bins)
+            Minima and maxima of each bin (identical if each bin contains a
+            single sample).
+        """
+        if picks is None:
+            picks = np.arange(self.raw.info["nchan"])
+        width = max(int(width), 1)
+        per_pixel = (stop - start) / width
+        if per_pixel < self.block:  # full resolution
+            data = self.raw.get_data(picks, start, stop)
+            if per_pixel <= 1:
+                return np.arange(start, stop), data, data
+            bins = _bins(0, stop - start, width)
+            return (start + bins, np.minimum.reduceat(data, bins, axis=1),
+                    np.maximum.reduceat(data, bins, axis=1))
+        level = 0
+        while (level + 1 < len(self.levels) and
+               self.block * self.factor ** (level + 1) <= per_pixel):
+            level += 1
+        size = self.block * self.factor ** level
+        first, last = start // size, -(-stop // size)
+        self._compute(level, first, last)
+        mins, maxs = self.levels[level]
+        mins, maxs = mins[picks, first:last], maxs[picks, first:last]
+        bins = _bins(0, last - first, width)
+        return ((first + bins) * size, np.minimum.reduceat(mins, bins, axis=1),
+                np.maximum.reduceat(maxs, bins, axis=1))
+
+
+def _bins(start, stop, n):
+    """Split a range into (at most) n bins and return their first indices."""
+    return np.unique(np.linspace(start, stop, n, endpoint=False).astype(int))
+
+
+def estimate_scalings(raw, n_segments=50):
+    """Estimate scalings of channel types from a sample of the data.
+
+    Scalings are computed like the "auto" scalings of MNE (the maximum
+    absolute value of the 0.5th and 99.5th percentiles), but from short
+    segments distributed across the whole recording.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object.
+    n_segments : int
+        Number of segments (about CHUNK_SIZE bytes are read in total).
+
+    Returns
+    -------
+    scalings : dict
+        Scaling of each channel type.
+    """
+    n_times = raw.n_times
+    length = max(CHUNK_SIZE // (8 * raw.info["nchan"]) // n_segments, 1)
+    length = min(length, n_times)
+    starts = np.unique(np.linspace(0, n_times - length, n_segments,
+                                   dtype=int))
+    data = np.hstack([raw.get_data(start=start, stop=start + length)
+                      for start in starts])
+    scalings = {}
+    for kind, picks in channel_indices_by_type(raw.info).items():
+        if len(picks) > 0:
+            scaling = np.abs(np.percentile(data[picks], [0.5, 99.5])).max()
+            scalings[kind] = scaling if scaling > 0 else 1.0
+    return scalings
@@ -0,0 +1,345 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+import mne
+from mne.io.pick import _picks_to_idx
+
+from .memory import CHUNK_SIZE
+from .tasks import report_progress
+
+try:
+    from scipy.fft import rfft, irfft, next_fast_len  # releases the GIL
+except ImportError:  # SciPy < 1.4
+    from numpy.fft import rfft, irfft
+    from scipy.fftpack import next_fast_len
+
+
+@lru_cache(maxsize=16)
+def fir_kernel(sfreq, low, high):
+    """Design zero-phase FIR filter (default parameters of raw.filter).
+
+    Kernels are cached, because designing long kernels is slow.
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling frequency.
+    low : float | None
+        Lower cutoff frequency (None for a lowpass filter).
+    high : float | None
+        Upper cutoff frequency (None for a highpass filter).
+
+    Returns
+    -------
+    h : numpy.ndarray | None
+        Filter kernel (read-only), None if both cutoffs are None.
+    """
+    h = mne.filter.create_filter(None, sfreq, low, high, verbose=False)
+    if h is not None:
+        h.flags.writeable = False
+    return h
+
+
+@lru_cache(maxsize=16)
+def _kernel_fft(sfreq, low, high, n_fft):
+    """Return (cached) FFT of a filter kernel."""
+    H = rfft(fir_kernel(sfreq, low, high), n_fft)
+    H.flags.writeable = False
+    return H
+
+
+@lru_cache(maxsize=64)
+def _fft_length(n_h, n_x):
+    """Return FFT length with the lowest cost (like MNE)."""
+    min_fft = 2 * n_h - 1
+    if n_x < min_fft:  # use only a single block
+        return next_fast_len(n_x)
+    N = 2 ** np.arange(np.ceil(np.log2(min_fft)), np.ceil(np.log2(n_x)) + 1,
+                       dtype=int)
+    cost = np.ceil(n_x / (N - n_h + 1)) * N * (np.log2(N) + 1)
+    cost += 4e-5 * N * n_x  # long FFTs are slower than predicted
+    return int(N[np.argmin(cost)])
+
+
+def _convolve(x, sfreq, low, high):
+    """Convolve padded signal with filter kernel (overlap-save).
+
+    Only the part of the result computed without zero-padding is returned
+    (like mode="valid" in numpy.convolve).
+    """
+    n_h = len(fir_kernel(sfreq, low, high))
+    n_fft = _fft_length(n_h, len(x))
+    H = _kernel_fft(sfreq, low, high, n_fft)
+    step = n_fft - n_h + 1
+    y = np.empty(len(x) - n_h + 1)
+    for start in range(0, len(y), step):
+        stop = min(start + step, len(y))
+        segment = irfft(rfft(x[start:start + n_fft], n_fft) * H, n_fft)
+        y[start:stop] = segment[n_h - 1:n_h - 1 + stop - start]
+    return y
+
+
+@lru_cache(maxsize=16)
+def iir_sos(sfreq, low, high, order=4):
+    """Design Butterworth IIR filter (second-order sections).
+
+    Parameters
+    ----------
+    sfreq : float
+        Sampling frequency.
+    low : float | None
+        Lower cutoff frequency (None for a lowpass filter).
+    high : float | None
+        Upper cutoff frequency (None for a highpass filter).
+    order : int
+        Filter order.
+
+    Returns
+    -------
+    sos : numpy.ndarray | None
+        Second-order sections (read-only), None if both cutoffs are None.
+    padlen : int
+        Number of samples used to pad the signal at both edges.
+    """
+    if low is None and high is None:
+        return None, 0
+    iir_params = dict(order=order, ftype="butter", output="sos")
+    iir_params = mne.filter.create_filter(None, sfreq, low, high,
+                                          method="iir", iir_params=iir_params,
+                                          verbose=False)
+    sos = iir_params["sos"]
+    sos.flags.writeable = False
+    return sos, iir_params["padlen"]
+
+
+def _sosfilt(sos, x, zi, pool, n_jobs):
+    """Apply IIR filter to n_jobs groups of channels in parallel."""
+    groups = [group for group in np.array_split(np.arange(len(x)), n_jobs)
+              if len(group)]
+    y, zf = np.empty_like(x), np.empty_like(zi)
+    results = pool.map(lambda group: sosfilt(sos, x[group],
+                                             zi=zi[:, group]), groups)
+    for group, (y_group, zf_group) in zip(groups, results):
+        y[group], zf[:, group] = y_group, zf_group
+    return y, zf
+
+
+def _filtfilt_chunked(read, out, rows, n_times, sos, padlen, step, pool,
+                      n_jobs):
+    """Apply IIR filter forward and backward in chunks (like sosfiltfilt).
+
+    The forward pass reads chunks with read(start, stop) and writes its
+    output to out[rows], and the backward pass filters out[rows] in place
+    (from the end to the beginning). The filter state is carried from chunk
+    to chunk, so the result is identical to scipy.signal.sosfiltfilt with
+    odd padding of the given length.
+    """
+    sos = np.array(sos)  # sosfilt requires a writable array
+    padlen = min(padlen, n_times - 1)
+    zi = sosfilt_zi(sos)[:, np.newaxis, :]
+    head, tail = read(0, padlen + 1), read(n_times - padlen - 1, n_times)
+    left = 2 * head[:, :1] - head[:, padlen:0:-1]
+    right = 2 * tail[:, -1:] - tail[:, -2:-padlen - 2:-1]
+
+    # forward pass (the output of the left padding is not needed)
+    if padlen:
+        _, z = _sosfilt(sos, left, zi * left[:, :1], pool, n_jobs)
+    else:  # MNE does not pad if the filter rings too long
+        z = zi * head[:, :1]
+    for start in range(0, n_times, step):
+        stop = min(start + step, n_times)
+        out[rows, start:stop], z = _sosfilt(sos, read(start, stop), z, pool,
+                                            n_jobs)
+        report_progress(stop / n_times / 2)
+    if padlen:
+        y, _ = _sosfilt(sos, right, z, pool, n_jobs)
+    else:
+        y = out[rows, -1:]
+
+    # backward pass (starts with the output of the right padding)
+    _, z = _sosfilt(sos, y[:, ::-1], zi * y[:, -1:], pool, n_jobs)
+    for stop in range(n_times, 0, -step):
+        start = max(stop - step, 0)
+        y, z = _sosfilt(sos, out[rows, start:stop][:, ::-1], z, pool,
+                        n_jobs)
+        out[rows, start:stop] = y[:, ::-1]
+        report_progress(1 - start / n_times / 2)
+
+
+def _filter_rows(x, left, right, sfreq, low, high, pool=None):
+    """Filter each row of x (padded at the edges of the recording).
+
+    Rows are filtered in parallel if a thread pool is passed.
+    """
+    def filter_row(row):
+        padded = _pad(row[np.newaxis], left, right)[0]
+        return _convolve(padded, sfreq, low, high)
+
+    return (map if pool is None else pool.map)(filter_row, x)
+
+
+def filter_data(data, sfreq, low, high, picks=None, n_jobs=1, method="fir",
+                order=4, chunk_size=CHUNK_SIZE):
+    """Filter data in place (zero-phase FIR or IIR filter).
+
+    The result is identical (up to numerical precision) to
+    mne.filter.filter_data with default parameters (FIR) or with a
+    Butterworth filter in second-order sections (IIR). Channels are filtered
+    in parallel threads, and filters (and FFTs of FIR kernels) are cached.
+
+    Parameters
+    ----------
+    data : numpy.ndarray, shape (n_channels, n_times)
+        Data (modified in place).
+    sfreq : float
+        Sampling frequency.
+    low : float | None
+        Lower cutoff frequency (None for a lowpass filter).
+    high : float | None
+        Upper cutoff frequency (None for a highpass filter).
+    picks : array of int | None
+        Channels to filter (None filters all channels).
+    n_jobs : int
+        Number of threads.
+    method : "fir" | "iir"
+        Filter type.
+    order : int
+        Filter order (IIR only).
+    chunk_size : int
+        Approximate number of bytes filtered at once (IIR only).
+    """
+    if picks is None:
+        picks = np.arange(data.shape[0])
+    if method == "iir":
+        sos, padlen = iir_sos(sfreq, low, high, order)
+        if sos is not None:
+            n_times = data.shape[1]
+            step = max(chunk_size // (8 * len(picks)), 1)
+            with ThreadPoolExecutor(n_jobs) as pool:
+                _filtfilt_chunked(lambda start, stop: data[picks, start:stop],
+                                  data, picks, n_times, sos, padlen, step,
+                                  pool, n_jobs)
+        return
+    h = fir_kernel(sfreq, low, high)
+    if h is None:
+        return
+    pad = len(h) // 2
+    rows = (data[pick] for pick in picks)  # views, not copies
+    with ThreadPoolExecutor(n_jobs) as pool:
+        filtered = _filter_rows(rows, pad, pad, sfreq, low, high, pool)
+        for i, (pick, y) in enumerate(zip(picks, filtered), 1):
+            data[pick] = y
+            report_progress(i / len(picks))
+
+
+def filter_chunked(raw, low, high, out, chunk_size=CHUNK_SIZE, n_jobs=1,
+                   method="fir", order=4, start=0, stop=None):
+    """Filter raw data in chunks (zero-phase FIR or IIR filter).
+
+    The result is identical (up to numerical precision) to raw.filter(low,
+    high) (see `filter_data` for IIR filters), but only a few chunks of data
+    are held in memory at any time. FIR filters are applied to overlapping
+    chunks, and IIR filters are applied forward and backward with the filter
+    state carried from chunk to chunk.
+    Chunks are read with raw.get_data, so the data does not need to be
+    loaded, and the filtered data is written to the output array (which can
+    be a memory-mapped file). Only samples from start to stop are filtered
+    (as if they were a separate recording), so segments delimited by "edge"
+    annotations can be filtered separately like in raw.filter.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw data (not modified).
+    low : float | None
+        Lower cutoff frequency (None for a lowpass filter).
+    high : float | None
+        Upper cutoff frequency (None for a highpass filter).
+    out : numpy.ndarray, shape (n_channels, n_times)
+        Array which receives the filtered data (non-data channels are
+        copied). Only samples from start to stop are written.
+    chunk_size : int
+        Approximate number of bytes read at once.
+    n_jobs : int
+        Number of threads (channels of each chunk are filtered in parallel).
+    method : "fir" | "iir"
+        Filter type.
+    order : int
+        Filter order (IIR only).
+    start, stop : int | None
+        First and last (exclusive) sample of the segment which is filtered
+        (None filters until the end).
+    """
+    info = raw.info
+    picks = _picks_to_idx(info, None, "data_or_ica", exclude=())
+    others = np.setdiff1d(np.arange(info["nchan"]), picks)
+    sfreq = info["sfreq"]
+    if stop is None:
+        stop = raw.n_times
+    out = out[:, start:stop]  # view, so indices are relative to start
+    offset, n_times = start, stop - start
+
+    def read(picks, start, stop):
+        return raw.get_data(picks, offset + start, offset + stop)
+
+    if method == "iir":
+        sos, padlen = iir_sos(sfreq, low, high, order)
+        step = max(chunk_size // (8 * info["nchan"]), 1)
+        for start in range(0, n_times, step):  # copy non-data channels
+            stop = min(start + step, n_times)
+            if len(others):
+                out[others, start:stop] = read(others, start, stop)
+            if sos is None:
+                out[picks, start:stop] = read(picks, start, stop)
+        if sos is not None:
+            with ThreadPoolExecutor(n_jobs) as pool:
+                _filtfilt_chunked(lambda start, stop: read(picks, start,
+                                                           stop),
+                                  out, picks, n_times, sos, padlen, step,
+                                  pool, n_jobs)
+        return
+    h = fir_kernel(sfreq, low, high)
+    pad = 0 if h is None else len(h) // 2
+    step = max(chunk_size // (8 * info["nchan"]), 2 * pad + 1)
+    with ThreadPoolExecutor(n_jobs) as pool:
+        for start in range(0, n_times, step):
+            stop = min(start + step, n_times)
+            first, last = max(start - pad, 0), min(stop + pad, n_times)
+            x = read(None, first, last)
+            inner = slice(start - first, stop - first)
+            out[others, start:stop] = x[others, inner]
+            if h is None:
+                out[picks, start:stop] = x[picks, inner]
+            else:
+                rows = _filter_rows(x[picks], pad - (start - first),
+                                    pad - (last - stop), sfreq, low, high,
+                                    pool)
+                for pick, y in zip(picks, rows):
+                    out[pick, start:stop] = y
+            report_progress(stop / n_times)
+
+
+def _pad(x, left, right):
+    """Pad signals at the edges of the recording (like MNE, odd reflection
+    limited to the signal length).
+    """
+    n_channels, n_times = x.shape
+    parts = [x]
+    if left:
+        zeros = np.zeros((n_channels, max(left - n_times + 1, 0)))
+        parts = [zeros, 2 * x[:, :1] - x[:, left:0:-1]] + parts
+    if right:
+        zeros = np.zeros((n_channels, max(right - n_times + 1, 0)))
+        parts += [2 * x[:, -1:] - x[:, -2:-right - 2:-1], zeros]
+    return np.concatenate(parts, axis=-1)
+
+
+def update_filter_info(info, low, high):
+    """Update highpass and lowpass fields of info after filtering."""
+    if high is not None and (low is None or low < high) and \
+            (info["lowpass"] is None or high < info["lowpass"]):
+        info["lowpass"] = float(high)
+    if low is not None and (high is None or low < high) and \
+            (info["highpass"] is None or low > info["highpass"]):
+        info["highpass"] = float(low)
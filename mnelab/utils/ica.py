@@ -0,0 +1,142 @@
+import os
+import multiprocessing as mp
+from tempfile import mkstemp
+import numpy as np
+
+from .memory import data_buffer, is_spilled, iter_chunks
+from .tasks import report_progress
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+
+class ICAWorker:
+    """Long-lived process which fits ICA.
+
+    The worker process is started only once (so the cost of starting Python
+    and importing MNE is paid only once). Data is passed via shared memory
+    (or the memory-mapped file of spilled data) instead of pickling the raw
+    object. If shared memory is not available (Python < 3.8), data is passed
+    via a temporary memory-mapped file.
+    """
+    def __init__(self):
+        self._process = None
+        self._conn = None
+
+    def start(self):
+        """Start worker process (if it is not running)."""
+        if self._process is not None and self._process.is_alive():
+            return
+        context = mp.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_conn,),
+                                        daemon=True)
+        self._process.start()
+
+    def stop(self):
+        """Stop worker process."""
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def fit(self, ica, raw, **kwargs):
+        """Fit ICA in the worker process.
+
+        This function reports progress (see mnelab.utils.report_progress), so
+        it can be cancelled when it is run in a background task. Cancelling
+        stops the worker process.
+
+        Parameters
+        ----------
+        ica : mne.preprocessing.ICA
+            ICA object which should be fitted.
+        raw : mne.io.Raw
+            Raw data used to fit ICA.
+        kwargs
+            Additional arguments passed to ICA.fit.
+
+        Returns
+        -------
+        ica : mne.preprocessing.ICA
+            Fitted ICA object.
+        """
+        self.start()
+        shm, fname = None, None
+        try:
+            if is_spilled(raw):  # memory-mapped file
+                source = ("file", data_buffer(raw).filename)
+            else:  # copied in chunks, so lazy data is not loaded at once
+                shape = (raw.info["nchan"], raw.n_times)
+                if shared_memory is not None:
+                    shm = shared_memory.SharedMemory(
+                        create=True, size=8 * shape[0] * shape[1])
+                    shared = np.ndarray(shape, np.float64, buffer=shm.buf)
+                    source = ("shm", shm.name, shape, shared.dtype.str)
+                else:  # temporary memory-mapped file (like spilled data)
+                    fd, fname = mkstemp(prefix="mnelab-", suffix=".npy")
+                    os.close(fd)
+                    shared = np.lib.format.open_memmap(
+                        fname, mode="w+", dtype=np.float64, shape=shape)
+                    source = ("file", fname)
+                try:
+                    for start, stop, data in iter_chunks(raw):
+                        shared[:, start:stop] = data
+                        report_progress(None)
+                finally:
+                    del shared  # shared memory cannot be closed otherwise
+
+            try:
+                self._conn.send((ica, raw.info, raw.first_samp,
+                                 raw.annotations, source, kwargs))
+                while not self._conn.poll(0.1):
+                    report_progress(None)  # raises if task has been cancelled
+                status, result = self._conn.recv()
+            except BaseException:
+                self.stop()
+                raise
+        finally:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            if fname is not None:
+                try:
+                    os.remove(fname)
+                except OSError:  # still memory-mapped (on Windows)
+                    pass
+        if status == "error":
+            raise result
+        return result
+
+
+def _serve(conn):
+    """Fit ICA for each request received via the connection."""
+    import mne
+
+    while True:
+        try:
+            ica, info, first_samp, annotations, source, kwargs = conn.recv()
+        except EOFError:  # parent process has closed the connection
+            return
+        shm, data, raw = None, None, None
+        try:
+            if source[0] == "file":
+                data = np.load(source[1], mmap_mode="r")
+            elif source[0] == "shm":
+                shm = shared_memory.SharedMemory(name=source[1])
+                data = np.ndarray(source[2], np.dtype(source[3]),
+                                  buffer=shm.buf)
+            raw = mne.io.RawArray(data, info, first_samp=first_samp,
+                                  verbose=False)
+            raw.set_annotations(annotations)
+            ica.fit(raw, **kwargs)
+        except Exception as e:
+            conn.send(("error", e))
+        else:
+            conn.send(("ok", ica))
+        finally:
+            data, raw = None, None  # release shared memory
+            if shm is not None:
+                shm.close()
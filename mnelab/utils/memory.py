@@ -0,0 +1,161 @@
+from collections import defaultdict
+from copy import deepcopy
+import numpy as np
+
+
+CHUNK_SIZE = 2 ** 24  # number of bytes processed at once by chunked functions
+
+
+def data_buffer(raw):
+    """Return the data buffer of raw (or None if data is not loaded)."""
+    if raw is None or not raw.preload:
+        return None
+    return raw._data
+
+
+def data_nbytes(raw):
+    """Return number of bytes of data held in memory (without copying)."""
+    buffer = data_buffer(raw)
+    return 0 if buffer is None else buffer.nbytes
+
+
+def share_raw(raw):
+    """Copy a raw object, but share its data buffer with the original.
+
+    The shared data buffer is marked read-only so that it cannot be modified
+    in place by accident. Use `unshare_data` before modifying the data of one
+    of the raw objects.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object to copy.
+
+    Returns
+    -------
+    copy : mne.io.Raw
+        Copy of the raw object (everything except the data buffer is copied).
+    """
+    return deepcopy(raw, _share_memo(raw))
+
+
+def share_data(dataset, exclude=()):
+    """Copy a data set, but share its data buffer with the original.
+
+    Parameters
+    ----------
+    dataset : dict
+        Data set to copy.
+    exclude : list of str
+        Keys which are not copied.
+
+    Returns
+    -------
+    copy : dict
+        Copy of the data set (everything except the data buffer is copied).
+    """
+    copy = {key: value for key, value in dataset.items() if key not in exclude}
+    return defaultdict(dataset.default_factory,
+                       deepcopy(copy, _share_memo(dataset["raw"])))
+
+
+def _share_memo(raw):
+    """Mark data buffer as shared and return memo for deepcopy."""
+    buffer = data_buffer(raw)
+    if buffer is None:  # nothing to share, but copying is cheap
+        return {}
+    buffer.flags.writeable = False
+    return {id(buffer): buffer}
+
+
+def unshare_data(raw, others):
+    """Make data buffer of raw writable (copy on write).
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object whose data will be modified in place.
+    others : list of mne.io.Raw
+        All other raw objects which might share the data buffer.
+    """
+    buffer = data_buffer(raw)
+    if buffer is None or buffer.flags.writeable:
+        return
+    if isinstance(buffer, np.memmap):  # spilled data is never modified
+        raw._data = np.array(buffer)
+        return
+    others = [other for other in others if other is not raw]
+    if any(data_buffer(other) is buffer for other in others):
+        raw._data = buffer.copy()
+    else:  # no other data set uses this buffer anymore
+        buffer.flags.writeable = True
+
+
+def is_spilled(raw):
+    """Check if data buffer of raw has been spilled to disk."""
+    return isinstance(data_buffer(raw), np.memmap)
+
+
+def spill_data(buffer, fname):
+    """Write data buffer to a file and return a read-only memory map.
+
+    Parameters
+    ----------
+    buffer : numpy.ndarray
+        Data buffer.
+    fname : str
+        Name of the file (NumPy .npy format).
+
+    Returns
+    -------
+    spilled : numpy.memmap
+        Read-only memory map of the file contents.
+    """
+    spilled = np.lib.format.open_memmap(fname, mode="w+", dtype=buffer.dtype,
+                                        shape=buffer.shape)
+    spilled[:] = buffer
+    spilled.flush()
+    del spilled
+    return np.load(fname, mmap_mode="r")
+
+
+def restore_data(buffer):
+    """Read spilled data buffer back into memory.
+
+    The restored buffer is read-only because it might be shared (see
+    `unshare_data`).
+    """
+    restored = np.array(buffer)
+    restored.flags.writeable = False
+    return restored
+
+
+def iter_chunks(raw, step=None, start=0, stop=None):
+    """Iterate over consecutive chunks of data.
+
+    Chunks are read with raw.get_data, so the data does not need to be
+    loaded into memory.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object.
+    step : int | None
+        Number of samples per chunk (None reads about CHUNK_SIZE bytes).
+    start, stop : int | None
+        First and last (exclusive) sample (None reads until the end).
+
+    Yields
+    ------
+    start, stop : int
+        First and last (exclusive) sample of the chunk.
+    data : numpy.ndarray, shape (n_channels, stop - start)
+        Data of the chunk.
+    """
+    if step is None:
+        step = max(CHUNK_SIZE // (8 * raw.info["nchan"]), 1)
+    if stop is None:
+        stop = raw.n_times
+    for first in range(start, stop, step):
+        last = min(first + step, stop)
+        yield first, last, raw.get_data(start=first, stop=last)
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+_local = threading.local()  # task running in the current thread
+
+
+class TaskCancelledError(Exception):
+    pass
+
+
+class Task:
+    """Function call running in a background thread.
+
+    Long-running functions should call `report_progress` regularly. This
+    reports the progress to the task and stops the function (by raising
+    TaskCancelledError) if the task has been cancelled.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        Executor running the function (must use threads).
+    f : callable
+        Function to run.
+    args, kwargs
+        Arguments passed to the function.
+    """
+    def __init__(self, executor, f, *args, **kwargs):
+        self.progress = None  # between 0 and 1 (None if unknown)
+        self.callbacks = []  # called with the progress whenever it changes
+        self._cancelled = threading.Event()
+        self.future = executor.submit(self._run, f, *args, **kwargs)
+
+    def _run(self, f, *args, **kwargs):
+        _local.task = self
+        try:
+            report_progress(None)  # task might have been cancelled already
+            return f(*args, **kwargs)
+        finally:
+            _local.task = None
+
+    def cancel(self):
+        """Cancel task (stops at the next progress report)."""
+        self._cancelled.set()
+        self.future.cancel()
+
+    @property
+    def cancelled(self):
+        """Check if task has been cancelled."""
+        return self._cancelled.is_set()
+
+    def result(self, timeout=None):
+        """Return result of the function (wait until the task is done)."""
+        return self.future.result(timeout)
+
+    def done(self):
+        """Check if task is done."""
+        return self.future.done()
+
+
+def report_progress(progress):
+    """Report progress of the task running in the current thread.
+
+    This function does nothing if it is not called from within a task.
+
+    Parameters
+    ----------
+    progress : float | None
+        Progress between 0 and 1 (None if unknown).
+
+    Raises
+    ------
+    TaskCancelledError
+        If the task has been cancelled.
+    """
+    task = getattr(_local, "task", None)
+    if task is None:
+        return
+    if task.cancelled:
+        raise TaskCancelledError("Task has been cancelled.")
+    if progress is not None:
+        task.progress = progress
+        for callback in task.callbacks:
+            callback(progress)
+
+
+class _Subtask:
+    """Part of a task which runs in another thread (see `map_parallel`)."""
+    def __init__(self, parent, callback):
+        self.parent = parent
+        self.progress = None
+        self.callbacks = [callback]
+
+    @property
+    def cancelled(self):
+        return self.parent is not None and self.parent.cancelled
+
+
+def map_parallel(f, items, n_jobs=None):
+    """Call function for each item in parallel threads.
+
+    Progress reported by the function calls is combined and reported to the
+    task running in the current thread (if any). If the task is cancelled,
+    all function calls are cancelled.
+
+    Parameters
+    ----------
+    f : callable
+        Function with one argument.
+    items : list
+        Items passed to the function.
+    n_jobs : int | None
+        Number of threads (None uses the number of CPUs).
+
+    Returns
+    -------
+    results : list
+        Return values of all function calls.
+    """
+    parent = getattr(_local, "task", None)
+    progress = [0] * len(items)
+    lock = threading.Lock()
+
+    def update(i, value):
+        with lock:
+            progress[i] = value
+            total = sum(progress) / len(progress)
+        if parent is not None:
+            parent.progress = total
+            for callback in parent.callbacks:
+                callback(total)
+
+    def run(i, item):
+        _local.task = _Subtask(parent, lambda value: update(i, value))
+        try:
+            result = f(item)
+        finally:
+            _local.task = None
+        update(i, 1)
+        return result
+
+    with ThreadPoolExecutor(n_jobs) as executor:
+        return list(executor.map(run, range(len(items)), items))
@@ -0,0 +1,109 @@
+from copy import deepcopy
+import numpy as np
+
+from .memory import data_buffer, share_raw
+
+
+def snapshot(dataset, fields):
+    """Save the state of selected fields of a data set.
+
+    Parameters
+    ----------
+    dataset : dict
+        Data set.
+    fields : list of str
+        Fields to save. In addition to the keys of the data set, "info" and
+        "annotations" save only the info and the annotations of the raw
+        object. Saving "raw" does not copy the data buffer (copy on write).
+
+    Returns
+    -------
+    state : dict
+        Saved state (use `restore` to restore it).
+    """
+    state = {}
+    for field in fields:
+        if field == "raw":
+            state["raw"] = share_raw(dataset["raw"])
+        elif field == "info":
+            state["info"] = deepcopy(dataset["raw"].info)
+        elif field == "annotations":
+            state["annotations"] = dataset["raw"].annotations.copy()
+        else:  # these values are replaced, but never modified in place
+            state[field] = dataset[field]
+    return state
+
+
+def snapshot_channels(dataset, drops):
+    """Save channels which are about to be dropped from a data set.
+
+    In contrast to saving the complete raw object, only the data of the
+    dropped channels is kept.
+
+    Parameters
+    ----------
+    dataset : dict
+        Data set.
+    drops : list of str
+        Names of channels which will be dropped.
+
+    Returns
+    -------
+    state : dict
+        Saved state (use `restore` to restore it).
+    """
+    raw = dataset["raw"]
+    buffer = data_buffer(raw)
+    if buffer is None:  # copying raw objects without data is cheap
+        return snapshot(dataset, ["raw"])
+    picks = np.array([ch in drops for ch in raw.info["ch_names"]])
+    shell = deepcopy(raw, {id(buffer): None})
+    shell._data = buffer[picks]  # holds only the dropped channels
+    return {"channels": (shell, picks)}
+
+
+def saved_raws(state):
+    """Return raw objects contained in a saved state."""
+    raws = []
+    if "raw" in state:
+        raws.append(state["raw"])
+    if "channels" in state:
+        raws.append(state["channels"][0])
+    return raws
+
+
+def restore(dataset, state):
+    """Restore the saved state of a data set.
+
+    Parameters
+    ----------
+    dataset : dict
+        Data set.
+    state : dict
+        State saved with `snapshot` or `snapshot_channels`.
+
+    Returns
+    -------
+    state : dict
+        The state before restoring (restoring it reverts this operation).
+    """
+    fields = ["raw" if field == "channels" else field for field in state]
+    inverse = snapshot(dataset, fields)
+    for field, value in state.items():
+        if field == "raw":
+            dataset["raw"] = value
+        elif field == "channels":
+            shell, picks = value
+            data = np.empty((len(picks), shell._data.shape[1]),
+                            dtype=shell._data.dtype)
+            data[picks] = shell._data
+            data[~picks] = data_buffer(dataset["raw"])
+            shell._data = data
+            dataset["raw"] = shell
+        elif field == "info":
+            dataset["raw"].info = value
+        elif field == "annotations":
+            dataset["raw"].set_annotations(value)
+        else:
+            dataset[field] = value
+    return inverse
@@ -1,43 +1,101 @@
+from collections import defaultdict, namedtuple
 from pathlib import Path
-import gzip
+import mmap
 import struct
 import xml.etree.ElementTree as ET
 import numpy as np
 import mne
 
+from .compression import SeekableGzip
 
-def read_raw_xdf(fname, stream_id):
+
+# NumPy data types of numeric XDF channel formats
+FORMATS = {"float32": "<f4", "double64": "<f8", "int8": "i1", "int16": "<i2",
+           "int32": "<i4", "int64": "<i8"}
+
+# chunk records yielded by scan_xdf (header contains the parsed stream header
+# of StreamHeader chunks)
+Chunk = namedtuple("Chunk", ["offset", "nbytes", "tag", "stream_id",
+                             "n_samples", "timestamp", "header"])
+
+# chunk index entries (see index_xdf)
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("nbytes", "<u8"), ("tag", "<u2"),
+                        ("stream_id", "<u4"), ("n_samples", "<u8"),
+                        ("timestamp", "<f8")])
+
+
+def read_raw_xdf(fname, stream_id, index=None, tmin=None, tmax=None):
     """Read XDF file.
 
+    The file is read in a single pass, and only samples of the requested
+    stream and of marker streams (which are added as annotations) are
+    decoded. Time stamps are synchronized with clock offsets and dejittered
+    like pyxdf does by default.
+
     Parameters
     ----------
     fname : str
         Name of the XDF file.
     stream_id : int
         ID (number) of the stream to load.
+    index : numpy.ndarray | None
+        Chunk index (see `index_xdf`). If given, only chunks which are needed
+        are read.
+    tmin, tmax : float | None
+        Time range (in seconds relative to the first sample of the stream,
+        rounded to the nearest sample) to load (None loads from the beginning
+        or until the end).
 
     Returns
     -------
     raw : mne.io.Raw
         XDF file data.
     """
-    from pyxdf import load_xdf
-
-    streams, header = load_xdf(fname)
-    for stream in streams:
-        if stream["info"]["stream_id"] == stream_id:
-            break  # stream found
-
-    n_chans = int(stream["info"]["channel_count"][0])
-    fs = float(stream["info"]["nominal_srate"][0])
+    headers, selected = {}, set()
+    timestamps, values = defaultdict(list), defaultdict(list)
+    offsets = defaultdict(list)
+    with _open_xdf(fname) as f:
+        if index is None:
+            chunks = _read_chunks(f, select=selected.__contains__)
+        else:
+            chunks = _read_indexed(f, index, selected.__contains__,
+                                   stream_id, tmin, tmax)
+        for chunk in chunks:
+            if chunk["tag"] == 2:  # stream header
+                headers[chunk["stream_id"]] = chunk
+                if (chunk["stream_id"] == stream_id or
+                        chunk.get("type") == "Markers"):
+                    selected.add(chunk["stream_id"])
+            elif chunk["tag"] == 3 and "data" in chunk:  # samples
+                header = headers[chunk["stream_id"]]
+                ts, x = _read_samples(chunk["data"],
+                                      int(header["channel_count"]),
+                                      header["channel_format"])
+                timestamps[chunk["stream_id"]].append(ts)
+                values[chunk["stream_id"]].append(x)
+            elif chunk["tag"] == 4 and "data" in chunk:  # clock offset
+                offsets[chunk["stream_id"]].append(
+                    struct.unpack("<dd", chunk["data"]))
+
+    if not timestamps[stream_id]:
+        raise ValueError(f"Stream {stream_id} contains no samples.")
+
+    def stream_timestamps(stream_id):
+        srate = float(headers[stream_id]["nominal_srate"])
+        ts = _fill_timestamps(np.concatenate(timestamps[stream_id]), srate)
+        ts = _sync_clock(ts, offsets[stream_id])
+        return _dejitter(ts, srate)
+
+    header = headers[stream_id]
+    n_chans = int(header["channel_count"])
+    fs = float(header["nominal_srate"])
     labels, types, units = [], [], []
-    if stream["info"]["desc"]:
-        for ch in stream["info"]["desc"][0]["channels"][0]["channel"]:
-            labels.append(str(ch["label"][0]))
-            if ch["type"]:
-                types.append(ch["type"][0])
-            if ch["unit"]:
-                units.append(ch["unit"][0])
+    for ch in header["channels"]:
+        labels.append(str(ch.get("label")))
+        if ch.get("type"):
+            types.append(ch["type"])
+        if ch.get("unit"):
+            units.append(ch["unit"])
     if not labels:
         labels = [str(n) for n in range(n_chans)]
     if not units:
@@ -45,21 +103,361 @@ def read_raw_xdf(fname, stream_id):
     info = mne.create_info(ch_names=labels, sfreq=fs, ch_types="eeg")
     # convert from microvolts to volts if necessary
     scale = np.array([1e-6 if u == "microvolts" else 1 for u in units])
-    raw = mne.io.RawArray((stream["time_series"] * scale).T, info)
-
-    first_samp = stream["time_stamps"][0]
-    markers = match_streaminfos(resolve_streams(fname), [{"type": "Markers"}])
-    for stream_id in markers:
-        for stream in streams:
-            if stream["info"]["stream_id"] == stream_id:
-                break
-        onsets = stream["time_stamps"] - first_samp
-        descriptions = [item for sub in stream["time_series"] for item in sub]
+    raw = mne.io.RawArray((np.concatenate(values[stream_id]) * scale).T, info)
+
+    ts = stream_timestamps(stream_id)
+    first_samp = ts[0]
+    if tmin is not None or tmax is not None:
+        if index is None:
+            start = ts[0]
+        else:  # first samples have not been read
+            start = _first_timestamp(index, stream_id, offsets[stream_id],
+                                     fs)
+        keep = np.ones(len(ts), dtype=bool)  # round to the nearest sample
+        if tmin is not None:
+            keep &= ts >= start + tmin - 0.5 / fs
+        if tmax is not None:
+            keep &= ts <= start + tmax + 0.5 / fs
+        if not keep.any():
+            raise ValueError("No samples in the requested time range.")
+        first, last = np.flatnonzero(keep)[[0, -1]]
+        raw = raw.crop(raw.times[first], raw.times[last])
+        first_samp = ts[first]
+
+    for marker_id in sorted(selected - {stream_id}):
+        if not timestamps[marker_id]:
+            continue
+        onsets = stream_timestamps(marker_id) - first_samp
+        descriptions = np.array([str(sample[0]) for chunk in values[marker_id]
+                                 for sample in chunk])
+        if tmin is not None or tmax is not None:  # only markers within range
+            keep = (onsets >= 0) & (onsets <= raw.times[-1])
+            onsets, descriptions = onsets[keep], descriptions[keep]
         raw.annotations.append(onsets, [0] * len(onsets), descriptions)
 
     return raw
 
 
+def _read_samples(data, n_chans, fmt):
+    """Decode contents of a Samples chunk.
+
+    Parameters
+    ----------
+    data : bytes
+        Chunk contents (after the stream ID).
+    n_chans : int
+        Number of channels.
+    fmt : str
+        Channel format.
+
+    Returns
+    -------
+    timestamps : numpy.ndarray
+        Time stamps of all samples (NaN if a time stamp was omitted).
+    values : numpy.ndarray | list of list of str
+        Sample values with shape (n_samples, n_chans).
+    """
+    n, pos = _unpack_varlen_int(data, 0)
+    if fmt in FORMATS:
+        dtype = np.dtype(FORMATS[fmt])
+        # fast path: all samples have (or all samples omit) time stamps
+        for ts_bytes in (8, 0):
+            fields = [("ts_bytes", "u1"), ("ts", "<f8"),
+                      ("x", dtype, (n_chans,))]
+            record = np.dtype(fields if ts_bytes else fields[::2])
+            if len(data) - pos != n * record.itemsize:
+                continue
+            samples = np.frombuffer(data, record, n, pos)
+            if (samples["ts_bytes"] == ts_bytes).all():
+                if ts_bytes:
+                    timestamps = samples["ts"].copy()
+                else:
+                    timestamps = np.full(n, np.nan)
+                return timestamps, samples["x"].copy()
+
+    timestamps, values = np.full(n, np.nan), []
+    for i in range(n):
+        if data[pos] == 8:
+            timestamps[i] = struct.unpack_from("<d", data, pos + 1)[0]
+            pos += 9
+        else:
+            pos += 1
+        if fmt in FORMATS:
+            values.append(np.frombuffer(data, dtype, n_chans, pos))
+            pos += n_chans * dtype.itemsize
+        else:  # string
+            sample = []
+            for _ in range(n_chans):
+                length, pos = _unpack_varlen_int(data, pos)
+                sample.append(data[pos:pos + length].decode())
+                pos += length
+            values.append(sample)
+    if fmt in FORMATS:
+        values = np.array(values).reshape(n, n_chans)
+    return timestamps, values
+
+
+def _fill_timestamps(timestamps, srate):
+    """Compute omitted time stamps from the previous time stamp."""
+    missing = np.isnan(timestamps)
+    if not missing.any() or srate <= 0:
+        return timestamps
+    idx = np.arange(len(timestamps))
+    last = np.maximum.accumulate(np.where(missing, 0, idx))
+    return timestamps[last] + (idx - last) / srate
+
+
+def _sync_clock(timestamps, offsets):
+    """Map time stamps to the clock of the recording computer.
+
+    Clock offsets are modeled as a linear function of time (least squares
+    fit).
+    """
+    if not offsets:
+        return timestamps
+    times, values = np.array(offsets).T
+    if np.ptp(times) > 0:
+        slope, intercept = np.polyfit(times, values, 1)
+    else:
+        slope, intercept = 0, values.mean()
+    return timestamps + intercept + slope * timestamps
+
+
+def _dejitter(timestamps, srate):
+    """Replace time stamps of a regular stream with a linear fit.
+
+    Time stamps are fitted separately for each segment between gaps larger
+    than 1 s (or 500 samples).
+    """
+    if srate <= 0 or len(timestamps) < 2:
+        return timestamps
+    gaps = np.flatnonzero(np.abs(np.diff(timestamps)) > max(1, 500 / srate))
+    bounds = [0, *(gaps + 1), len(timestamps)]
+    timestamps = timestamps.copy()
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop - start > 1:
+            idx = np.arange(start, stop)
+            slope, intercept = np.polyfit(idx, timestamps[start:stop], 1)
+            timestamps[start:stop] = intercept + slope * idx
+    return timestamps
+
+
+def index_xdf(fname):
+    """Build an index of all chunks contained in an XDF file.
+
+    The index contains the position and size of each chunk, so that chunks
+    can be read directly without scanning the file (see `read_raw_xdf` and
+    `read_streams`). Chunk contents are skipped, so building the index is
+    much faster than reading the file.
+
+    Parameters
+    ----------
+    fname : str
+        Name of the XDF file.
+
+    Returns
+    -------
+    index : numpy.ndarray
+        Structured array (INDEX_DTYPE) with one entry per chunk. Fields are
+        the offset of the chunk tag, the chunk size (including the tag), the
+        tag, the stream ID, the number of samples, and the first time stamp
+        (NaN if it was omitted).
+    """
+    chunks = scan_xdf(fname, headers=False)
+    return np.fromiter((chunk[:6] for chunk in chunks), dtype=INDEX_DTYPE)
+
+
+def scan_xdf(fname, headers=True):
+    """Scan chunks of an XDF file.
+
+    Chunks are yielded lazily, so scanning stops as soon as the caller stops
+    iterating. Uncompressed files are memory-mapped and parsed without any
+    read calls. Chunk contents are skipped except for stream headers and
+    the number of samples and first time stamp of Samples chunks.
+
+    Parameters
+    ----------
+    fname : str
+        Name of the XDF file.
+    headers : bool
+        Parse stream headers.
+
+    Yields
+    ------
+    chunk : Chunk
+        Chunk record (offset of the chunk tag, chunk size including the tag,
+        tag, stream ID, number of samples, first time stamp, and stream
+        header).
+    """
+    with _open_xdf(fname) as f:
+        if isinstance(f, SeekableGzip):  # cannot be memory-mapped
+            yield from _scan_file(f, headers)
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from _scan_buffer(buffer, f.tell(), headers)
+
+
+def _scan_buffer(buffer, pos, headers=True):
+    """Scan XDF chunks in a buffer starting at a given position."""
+    unpack = struct.unpack_from
+    end = len(buffer)
+    while pos < end:
+        nbytes, pos = _unpack_varlen_int(buffer, pos)
+        tag = unpack("<H", buffer, pos)[0]
+        stream_id, n_samples, timestamp, header = 0, 0, np.nan, None
+        if tag in [2, 3, 4, 6]:
+            stream_id = unpack("<I", buffer, pos + 2)[0]
+        if tag == 2 and headers:
+            xml = ET.fromstring(buffer[pos + 6:pos + nbytes].decode())
+            header = _parse_streamheader(xml)
+        elif tag == 3:  # number of samples and first time stamp
+            n_samples, first = _unpack_varlen_int(buffer, pos + 6)
+            if n_samples and buffer[first] == 8:
+                timestamp = unpack("<d", buffer, first + 1)[0]
+        yield Chunk(pos, nbytes, tag, stream_id, n_samples, timestamp, header)
+        pos += nbytes
+
+
+def _scan_file(f, headers=True):
+    """Scan XDF chunks in a file handle starting at the current position."""
+    while True:
+        try:
+            nbytes = _read_varlen_int(f)
+        except EOFError:
+            return
+        offset = f.tell()
+        tag = struct.unpack("<H", f.read(2))[0]
+        stream_id, n_samples, timestamp, header = 0, 0, np.nan, None
+        if tag in [2, 3, 4, 6]:
+            stream_id = struct.unpack("<I", f.read(4))[0]
+        if tag == 2 and headers:
+            xml = ET.fromstring(f.read(nbytes - 6).decode())
+            header = _parse_streamheader(xml)
+        elif tag == 3:  # number of samples and first time stamp
+            n_samples = _read_varlen_int(f)
+            if n_samples and f.read(1) == b"\x08":
+                timestamp = struct.unpack("<d", f.read(8))[0]
+        f.seek(offset + nbytes)
+        yield Chunk(offset, nbytes, tag, stream_id, n_samples, timestamp,
+                    header)
+
+
+def read_streams(fname, index):
+    """Read information on all streams using a chunk index.
+
+    Only stream header chunks are read, so the result is the same as
+    `parse_chunks(parse_xdf(fname))`, but much faster.
+
+    Parameters
+    ----------
+    fname : str
+        Name of the XDF file.
+    index : numpy.ndarray
+        Chunk index (see `index_xdf`).
+
+    Returns
+    -------
+    stream_infos : list of dicts
+        List of dicts containing information on each stream.
+    """
+    with _open_xdf(fname) as f:
+        return parse_chunks(_read_indexed(f, index))
+
+
+def _read_indexed(f, index, select=None, stream_id=None, tmin=None,
+                  tmax=None):
+    """Read and yield XDF chunks using a chunk index.
+
+    All stream header chunks are yielded first. Samples and ClockOffset
+    chunks are selected only afterwards, so `select` can depend on the
+    stream headers. Optionally, Samples chunks of one stream are restricted
+    to a time range (relative to the first time stamp of this stream).
+    """
+    for entry in index[index["tag"] == 2]:
+        yield _read_chunk_at(f, entry)
+    if select is None:
+        return
+    ids = [i for i in np.unique(index["stream_id"]) if select(int(i))]
+    entries = index[np.isin(index["stream_id"], ids) &
+                    np.isin(index["tag"], [3, 4])]
+    if stream_id is not None and (tmin is not None or tmax is not None):
+        samples = entries[(entries["tag"] == 3) &
+                          (entries["stream_id"] == stream_id)]
+        # time stamps are neither synchronized nor dejittered yet, so chunks
+        # within one second of the range are read as well
+        times = _fill_nan(samples["timestamp"])
+        times -= times[0]
+        keep = np.ones(len(samples), dtype=bool)  # chunks overlapping range
+        if tmin is not None:
+            keep[:-1] &= times[1:] >= tmin - 1
+        if tmax is not None:
+            keep &= times <= tmax + 1
+        skip = samples["offset"][~keep]
+        entries = entries[~np.isin(entries["offset"], skip)]
+    if isinstance(f, SeekableGzip):  # decompress in parallel
+        ranges = [(int(e["offset"]), int(e["nbytes"])) for e in entries]
+        for entry, data in zip(entries, f.read_ranges(ranges)):
+            yield _parse_chunk(entry, data)
+    else:
+        for entry in entries:
+            yield _read_chunk_at(f, entry)
+
+
+def _read_chunk_at(f, entry):
+    """Read chunk described by an index entry."""
+    f.seek(int(entry["offset"]))
+    return _parse_chunk(entry, f.read(int(entry["nbytes"])))
+
+
+def _parse_chunk(entry, data):
+    """Parse chunk data (starting at the tag) described by an index entry."""
+    chunk = dict(nbytes=int(entry["nbytes"]), tag=int(entry["tag"]))
+    if chunk["tag"] in [2, 3, 4, 6]:
+        chunk["stream_id"] = struct.unpack_from("<I", data, 2)[0]
+        contents = data[6:]
+        if chunk["tag"] == 2:
+            xml = ET.fromstring(contents.decode())
+            chunk = {**chunk, **_parse_streamheader(xml)}
+        elif chunk["tag"] in [3, 4]:
+            chunk["data"] = contents
+    return chunk
+
+
+def _first_timestamp(index, stream_id, offsets, srate):
+    """Estimate the first synchronized and dejittered time stamp of a stream.
+
+    The first time stamps of all Samples chunks (from the index) and their
+    sample positions are fitted like in `_dejitter`, so the result agrees
+    with the time stamp obtained from all samples within a small fraction of
+    a sample.
+    """
+    entries = index[(index["tag"] == 3) & (index["stream_id"] == stream_id) &
+                    (index["n_samples"] > 0)]
+    positions = np.cumsum(entries["n_samples"]) - entries["n_samples"]
+    valid = ~np.isnan(entries["timestamp"])
+    positions = positions[valid].astype(float)
+    times = _sync_clock(entries["timestamp"][valid], offsets)
+    if len(times) > 1:  # fit the first segment (up to the first gap)
+        gaps = np.abs(np.diff(times) - np.diff(positions) / srate)
+        gaps = np.flatnonzero(gaps > max(1, 500 / srate))
+        stop = gaps[0] + 1 if len(gaps) > 0 else len(times)
+        if stop > 1:
+            return np.polyfit(positions[:stop], times[:stop], 1)[1]
+    return times[0] - positions[0] / srate
+
+
+def _fill_nan(x):
+    """Replace NaNs with the previous (or next) valid value."""
+    valid = ~np.isnan(x)
+    if not valid.any() or valid.all():
+        return x
+    idx = np.maximum.accumulate(np.where(valid, np.arange(len(x)), 0))
+    x = x[idx]
+    if np.isnan(x[0]):  # no previous value
+        x[:np.argmax(valid)] = x[np.argmax(valid)]
+    return x
+
+
 def match_streaminfos(stream_infos, parameters):
     """Find stream IDs matching specified criteria.
 
@@ -126,9 +524,25 @@ def parse_xdf(fname):
 
 
 def parse_chunks(chunks):
-    """Parse chunks and extract information on individual streams."""
+    """Parse chunks and extract information on individual streams.
+
+    Parameters
+    ----------
+    chunks : iterable of dict or Chunk
+        Chunks (see `parse_xdf` and `scan_xdf`).
+
+    Returns
+    -------
+    stream_infos : list of dicts
+        List of dicts containing information on each stream.
+    """
     streams = []
     for chunk in chunks:
+        if isinstance(chunk, Chunk):  # record from scan_xdf
+            if chunk.tag == 2:
+                chunk = dict(tag=2, stream_id=chunk.stream_id, **chunk.header)
+            else:
+                chunk = dict(tag=chunk.tag)
         if chunk["tag"] == 2:  # stream header chunk
             streams.append(dict(stream_id=chunk["stream_id"],
                                 name=chunk.get("name"),  # optional
@@ -144,13 +558,17 @@ def parse_chunks(chunks):
     return streams
 
 
-def _read_chunks(f):
+def _read_chunks(f, select=None):
     """Read and yield XDF chunks.
 
     Parameters
     ----------
     f : file handle
         File handle of XDF file.
+    select : callable | None
+        Called with the stream ID of each Samples or ClockOffset chunk. If it
+        returns True, the chunk contents are read into chunk["data"],
+        otherwise they are skipped.
 
 
     Yields
@@ -170,6 +588,9 @@ def _read_chunks(f):
             if chunk["tag"] == 2:  # parse StreamHeader chunk
                 xml = ET.fromstring(f.read(chunk["nbytes"] - 6).decode())
                 chunk = {**chunk, **_parse_streamheader(xml)}
+            elif (chunk["tag"] in [3, 4] and select is not None and
+                    select(chunk["stream_id"])):
+                chunk["data"] = f.read(chunk["nbytes"] - 6)
             else:  # skip remaining chunk contents
                 f.seek(chunk["nbytes"] - 6, 1)
         else:
@@ -178,8 +599,13 @@ def _read_chunks(f):
 
 
 def _parse_streamheader(xml):
-    """Parse stream header XML."""
-    return {el.tag: el.text for el in xml if el.tag != "desc"}
+    """Parse stream header XML (including channel descriptions)."""
+    header = {el.tag: el.text for el in xml if el.tag != "desc"}
+    channels = xml.find("desc/channels")
+    header["channels"] = [] if channels is None else [
+        {el.tag: el.text for el in channel}
+        for channel in channels.iter("channel")]
+    return header
 
 
 def _read_varlen_int(f):
@@ -197,11 +623,24 @@ def _read_varlen_int(f):
         raise RuntimeError("Invalid variable-length integer")
 
 
+def _unpack_varlen_int(buffer, pos):
+    """Unpack variable-length integer (returns value and next position)."""
+    nbytes = buffer[pos]
+    if nbytes == 1:
+        return buffer[pos + 1], pos + 2
+    elif nbytes == 4:
+        return struct.unpack_from("<I", buffer, pos + 1)[0], pos + 5
+    elif nbytes == 8:
+        return struct.unpack_from("<Q", buffer, pos + 1)[0], pos + 9
+    else:
+        raise RuntimeError("Invalid variable-length integer")
+
+
 def _open_xdf(filename):
     """Open XDF file for reading."""
     filename = Path(filename)  # convert to pathlib object
     if filename.suffix == ".xdfz" or filename.suffixes == [".xdf", ".gz"]:
-        f = gzip.open(filename, "rb")
+        f = SeekableGzip(filename)
     else:
         f = open(filename, "rb")
     if f.read(4) != b"XDF:":  # magic bytes
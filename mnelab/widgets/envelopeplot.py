@@ -0,0 +1,186 @@
+import numpy as np
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from mne.io.pick import channel_indices_by_type
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QWidget, QGridLayout, QScrollBar
+
+
+class EnvelopePlot(QWidget):
+    """Browse raw data drawn as min/max envelopes.
+
+    Each channel is drawn as one line which alternates between the minimum and
+    the maximum of the samples in each pixel column, so redrawing depends on
+    the width of the plot and not on the duration of the window. Annotations
+    and events in the window are also reduced to pixel resolution.
+
+    Use the scroll bars or the arrow keys to scroll (page up/down scrolls
+    channels by page), home/end to decrease/increase the duration, and +/- to
+    change the amplitude.
+
+    Parameters
+    ----------
+    raw : mne.io.Raw
+        Raw object.
+    envelope : mnelab.utils.Envelope
+        Envelope of the data.
+    scalings : dict
+        Scaling of each channel type (see mnelab.utils.estimate_scalings).
+    events : numpy.ndarray, shape (n_events, 3) | None
+        Events.
+    annotations : mnelab.utils.AnnotationIndex | None
+        Index of annotations.
+    duration : float
+        Duration of the window (in seconds).
+    n_channels : int
+        Number of channels shown at once.
+    """
+    def __init__(self, raw, envelope, scalings, events=None, annotations=None,
+                 duration=10, n_channels=20, parent=None):
+        super().__init__(parent)
+        self.raw = raw
+        self.envelope = envelope
+        self.sfreq = raw.info["sfreq"]
+        self.scalings = np.ones(raw.info["nchan"])
+        for kind, picks in channel_indices_by_type(raw.info).items():
+            if kind in scalings:
+                self.scalings[picks] = scalings[kind]
+        self.scale = 1.0  # amplitude factor changed with +/-
+        if events is None or len(events) == 0:
+            self.events = np.empty(0, dtype=np.int64)
+        else:  # sorted positions (relative to the first sample)
+            self.events = np.sort(events[:, 0] - raw.first_samp)
+        self.annotations = annotations
+        if annotations is not None:  # position of each annotation in index
+            self.ranks = np.empty_like(annotations.order)
+            self.ranks[annotations.order] = np.arange(len(annotations))
+        self.n_channels = min(n_channels, raw.info["nchan"])
+        self.window = min(int(duration * self.sfreq), raw.n_times)
+
+        self.figure = Figure()
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.canvas.setFocusPolicy(Qt.NoFocus)
+        self.ax = self.figure.add_axes([0.1, 0.08, 0.88, 0.9])
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_yticks(range(self.n_channels))
+        self.lines = [self.ax.plot([], [], color="k", linewidth=0.5,
+                                   zorder=2)[0]
+                      for _ in range(self.n_channels)]
+        self.overlays = []  # annotations and events of the current window
+
+        self.time = QScrollBar(Qt.Horizontal)
+        self.channels = QScrollBar(Qt.Vertical)
+        for scrollbar in self.time, self.channels:
+            scrollbar.setFocusPolicy(Qt.NoFocus)
+            scrollbar.valueChanged.connect(self.redraw)
+        self._update_ranges()
+        grid = QGridLayout(self)
+        grid.addWidget(self.canvas, 0, 0)
+        grid.addWidget(self.channels, 0, 1)
+        grid.addWidget(self.time, 1, 0)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.canvas.mpl_connect("resize_event", self.redraw)
+        self.resize(1000, 700)
+        self.redraw()
+
+    def _update_ranges(self):
+        """Update scroll bars after changing duration or number of channels."""
+        self.time.setMaximum(self.raw.n_times - self.window)
+        self.time.setPageStep(self.window)
+        self.time.setSingleStep(max(self.window // 4, 1))
+        self.channels.setMaximum(self.raw.info["nchan"] - self.n_channels)
+        self.channels.setPageStep(self.n_channels)
+
+    def redraw(self, *args):
+        """Draw the current window."""
+        start = self.time.value()
+        stop = min(start + self.window, self.raw.n_times)
+        first = self.channels.value()
+        picks = np.arange(first, first + self.n_channels)
+        width = self.ax.bbox.width  # in pixels
+        samples, mins, maxs = self.envelope.get(start, stop, width, picks)
+        # alternate between minimum and maximum of each bin
+        times = np.repeat(samples / self.sfreq, 2)
+        scalings = 2 * self.scalings[picks, np.newaxis] / self.scale
+        data = np.stack((mins, maxs), axis=-1).reshape(len(picks), -1)
+        data /= scalings
+        for offset, (line, values) in enumerate(zip(self.lines, data)):
+            line.set_data(times, offset - values)
+
+        for artist in self.overlays:
+            artist.remove()
+        self.overlays = []
+        tmin, tmax = start / self.sfreq, stop / self.sfreq
+        ylim = (self.n_channels - 0.5, -0.5)
+        if self.annotations is not None:
+            self._draw_annotations(tmin, tmax, width, ylim)
+        first, last = np.searchsorted(self.events, [start, stop])
+        if last > first:  # at most one event per pixel
+            columns = ((self.events[first:last] - start) / (stop - start) *
+                       width).astype(int)
+            _, idx = np.unique(columns, return_index=True)
+            x = np.repeat(self.events[first:last][idx] / self.sfreq, 3)
+            y = np.tile([ylim[0], ylim[1], np.nan], len(idx))  # one line
+            self.overlays.extend(self.ax.plot(x, y, color="tab:blue",
+                                              linewidth=0.5, zorder=1))
+
+        self.ax.set_xlim(tmin, tmax)
+        self.ax.set_ylim(*ylim)
+        self.ax.set_yticklabels([self.raw.ch_names[pick] for pick in picks])
+        self.canvas.draw_idle()
+
+    def _draw_annotations(self, tmin, tmax, width, ylim):
+        """Draw annotations overlapping the window (merged per pixel)."""
+        idx = self.ranks[self.annotations.overlapping(tmin, tmax)]
+        if len(idx) == 0:
+            return
+        scale = width / (tmax - tmin)
+        onsets = np.clip((self.annotations.onset[idx] - tmin) * scale, 0,
+                         width).astype(int)
+        ends = np.clip(np.ceil((self.annotations.end[idx] - tmin) * scale),
+                       0, width).astype(int)
+        ends = np.maximum(ends, onsets + 1)  # at least one pixel wide
+        descriptions = self.annotations.description[idx]
+        for description in np.unique(descriptions):
+            match = descriptions == description
+            # number of annotations covering each pixel column
+            covered = np.zeros(int(width) + 2, dtype=int)
+            np.add.at(covered, onsets[match], 1)
+            np.add.at(covered, ends[match], -1)
+            covered = np.cumsum(covered) > 0
+            changes = np.flatnonzero(np.diff(np.r_[False, covered, False]))
+            spans = [(tmin + a / scale, (b - a) / scale)
+                     for a, b in zip(changes[::2], changes[1::2])]
+            bad = description.upper().startswith("BAD")
+            color = "tab:red" if bad else "tab:green"
+            self.overlays.append(self.ax.broken_barh(
+                spans, (ylim[1], ylim[0] - ylim[1]), color=color, alpha=0.2,
+                linewidth=0, zorder=0))
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        if key == Qt.Key_Left:
+            self.time.setValue(self.time.value() - self.time.singleStep())
+        elif key == Qt.Key_Right:
+            self.time.setValue(self.time.value() + self.time.singleStep())
+        elif key == Qt.Key_Up:
+            self.channels.setValue(self.channels.value() - 1)
+        elif key == Qt.Key_Down:
+            self.channels.setValue(self.channels.value() + 1)
+        elif key == Qt.Key_PageUp:
+            self.channels.setValue(self.channels.value() - self.n_channels)
+        elif key == Qt.Key_PageDown:
+            self.channels.setValue(self.channels.value() + self.n_channels)
+        elif key in (Qt.Key_Home, Qt.Key_End):
+            if key == Qt.Key_Home:
+                window = max(self.window // 2, 2)
+            else:
+                window = min(self.window * 2, self.raw.n_times)
+            self.window = window
+            self._update_ranges()
+            self.redraw()
+        elif key in (Qt.Key_Plus, Qt.Key_Minus):
+            self.scale *= 1.25 if key == Qt.Key_Plus else 0.8
+            self.redraw()
+        else:
+            super().keyPressEvent(event)
@@ -39,8 +39,7 @@ setup(
     install_requires=['mne', 'numpy', 'scipy', 'matplotlib', 'PyQt5'],
     extras_require={"EDF export": ["pyedflib"],
                     "PICARD": ["python-picard"],
-                    "FastICA": ["scikit-learn"],
-                    "XDF import": ["pyxdf"]},
+                    "FastICA": ["scikit-learn"]},
     license="BSD-3-Clause",
     entry_points={
         'gui_scripts': [